@@ -0,0 +1,160 @@
+"""
+Stytch session validation with local caching.
+
+Every authenticated page load used to call Stytch over the network. This
+module keeps that off the hot path:
+
+- Session JWTs are verified locally against Stytch's JWKS, which is cached
+  and refreshed every STYTCH_JWKS_REFRESH_SECONDS (and immediately when a
+  token is signed with a key we haven't seen).
+- Opaque session tokens map to the user they were validated for in a short
+  TTL cache (STYTCH_SESSION_CACHE_TTL seconds).
+- Validated users are cached by Stytch user id, since a verified JWT only
+  carries the user id and callers also need the user's emails.
+
+Stytch is still called when a token isn't cached, when a JWT fails local
+verification, when a JWT is within STYTCH_JWT_REFRESH_MARGIN seconds of
+expiring, or when the JWT's user hasn't been seen recently. A revoked
+opaque token can therefore stay valid here for up to the session cache ttl.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import hashlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+import jwt
+from stytch.shared import jwt_helpers
+
+from app.cache import TTLCache
+from app.metrics import track_external_call
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_TTL = float(os.getenv("STYTCH_SESSION_CACHE_TTL", "60"))
+USER_CACHE_TTL = float(os.getenv("STYTCH_USER_CACHE_TTL", "300"))
+SESSION_CACHE_MAX_SIZE = int(os.getenv("STYTCH_SESSION_CACHE_MAX_SIZE", "10000"))
+JWKS_REFRESH_SECONDS = float(os.getenv("STYTCH_JWKS_REFRESH_SECONDS", "300"))
+JWT_REFRESH_MARGIN = float(os.getenv("STYTCH_JWT_REFRESH_MARGIN", "30"))
+
+
+def _token_key(token: str) -> str:
+    # Don't keep raw session tokens around in memory as dict keys
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def looks_like_jwt(token: str) -> bool:
+    return token.count(".") == 2
+
+
+class SessionValidator:
+    """
+    Validates Stytch session tokens and JWTs, preferring local checks.
+
+    Args:
+        stytch_client: Configured Stytch client, used for JWKS and remote calls
+        clock: Wall-clock time source, replaceable in tests
+    """
+
+    def __init__(self, stytch_client: Any, clock=time.time):
+        self.stytch_client = stytch_client
+        self._clock = clock
+        self.sessions = TTLCache(max_size=SESSION_CACHE_MAX_SIZE, ttl=SESSION_CACHE_TTL)
+        self.users = TTLCache(max_size=SESSION_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL)
+        self.remote_calls = 0
+
+        sessions_api = stytch_client.sessions
+        self.project_id = sessions_api.project_id
+        self.jwks_client = jwt.PyJWKClient(
+            sessions_api.api_base.url_for("/v1/sessions/jwks/{project_id}", {"project_id": self.project_id}),
+            cache_jwk_set=True,
+            lifespan=JWKS_REFRESH_SECONDS
+        )
+
+    async def authenticate(self, token: str) -> Any:
+        """
+        Return the Stytch user for a session token or JWT.
+
+        Raises StytchError if Stytch rejects the token.
+        """
+        if looks_like_jwt(token):
+            user = await self._authenticate_jwt_locally(token)
+            if user is not None:
+                return user
+            return await self._authenticate_remote(session_jwt=token)
+
+        cached = self.sessions.get(_token_key(token))
+        if cached is not None:
+            return cached
+
+        return await self._authenticate_remote(session_token=token)
+
+    def forget(self, token: str) -> None:
+        """Drop a token from the cache, e.g. on logout."""
+        self.sessions.delete(_token_key(token))
+
+    def clear(self) -> None:
+        self.sessions.clear()
+        self.users.clear()
+        self.remote_calls = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": self.sessions.stats(),
+            "users": self.users.stats(),
+            "remote_calls": self.remote_calls
+        }
+
+    async def _authenticate_jwt_locally(self, token: str) -> Optional[Any]:
+        """Verify a JWT against the cached JWKS; None means ask Stytch instead."""
+        try:
+            # In a worker thread, since a stale JWKS is fetched synchronously
+            claims = await asyncio.to_thread(
+                jwt_helpers.authenticate_jwt_local,
+                jwks_client=self.jwks_client,
+                project_id=self.project_id,
+                jwt=token
+            )
+        except jwt.PyJWTError as e:
+            # Malformed token or no matching signing key
+            logger.debug("Local JWT verification failed: %s", e)
+            return None
+
+        if claims is None:
+            return None
+
+        # Near expiry, let Stytch confirm the session is still alive
+        if claims.reserved_claims["exp"] - self._clock() < JWT_REFRESH_MARGIN:
+            return None
+
+        return self.users.get(claims.reserved_claims["sub"])
+
+    async def _authenticate_remote(self, session_token: Optional[str] = None, session_jwt: Optional[str] = None) -> Any:
+        self.remote_calls += 1
+        with track_external_call("stytch", "sessions.authenticate"):
+            if session_jwt:
+                resp = await self.stytch_client.sessions.authenticate_async(session_jwt=session_jwt)
+            else:
+                resp = await self.stytch_client.sessions.authenticate_async(session_token=session_token)
+
+        self.remember(resp, session_token)
+        return resp.user
+
+    def remember(self, resp: Any, session_token: Optional[str] = None) -> None:
+        """Cache the user (and session token) from any Stytch response that carries them."""
+        user = resp.user
+        self.users.set(user.user_id, user)
+
+        if session_token:
+            ttl = SESSION_CACHE_TTL
+            # Never cache a session past its own expiry
+            expires_at = getattr(resp.session, "expires_at", None)
+            if isinstance(expires_at, datetime):
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                ttl = min(ttl, expires_at.timestamp() - self._clock())
+            if ttl > 0:
+                self.sessions.set(_token_key(session_token), user, ttl=ttl)
@@ -0,0 +1,292 @@
+"""
+Structured, non-blocking application logging.
+
+``configure_logging`` routes every logger through a ``QueueHandler``: the
+calling coroutine or thread only filters the record and puts it on a bounded
+queue, and a ``QueueListener`` thread formats it as one JSON object per line
+and writes it to stdout. Request handlers never wait on stdout.
+
+Records made while a request is being handled carry its ``request_id``,
+``method`` and ``path`` (see ``request_context``). What gets through is
+controlled by:
+
+- LOG_LEVEL (INFO): root log level
+- LOG_ROUTE_LEVELS ("/static=WARNING,/assets=WARNING"): minimum level per
+  path prefix, longest prefix wins
+- LOG_ROUTE_SAMPLE_RATES (""): fraction of requests per path prefix whose
+  INFO and DEBUG records are kept, e.g. "/api/results=0.1"; the decision is
+  made once per request so a sampled request logs completely
+- LOG_MAX_RECORDS_PER_SECOND (200): records below WARNING beyond this rate
+  are dropped, so log volume levels off under load; the next record that
+  gets through reports how many were dropped
+- LOG_QUEUE_SIZE (10000): records waiting for the writer; when it is full
+  new records are dropped and counted instead of blocking
+- LOG_FORMAT (json): "text" for plain lines in local development
+
+WARNING and above bypass route levels, sampling and the rate limit.
+Tokens, cookies, secrets and passwords are redacted from messages and
+structured fields before anything is written.
+"""
+
+import os
+import re
+import sys
+import json
+import copy
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_MAX_RECORDS_PER_SECOND = float(os.getenv("LOG_MAX_RECORDS_PER_SECOND", "200"))
+LOG_ROUTE_LEVELS = os.getenv("LOG_ROUTE_LEVELS", "/static=WARNING,/assets=WARNING")
+LOG_ROUTE_SAMPLE_RATES = os.getenv("LOG_ROUTE_SAMPLE_RATES", "")
+
+REDACTED = "[REDACTED]"
+
+# Field names whose values are never logged (auth_token, cookie, set-cookie, ...)
+SENSITIVE_KEYS = re.compile(
+    r"^(.*[_-])?(token|secret|password|authorization|cookie|cookies|api[_-]?key)$", re.IGNORECASE
+)
+
+# Credentials that can turn up inside free-form messages
+SENSITIVE_PATTERNS = [
+    (re.compile(r"(?i)(bearer\s+)[\w\-.~+/]+=*"), r"\1" + REDACTED),
+    (re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]+"), REDACTED),  # JWTs
+    (re.compile(r"\b(sk|rk|pk|whsec)_(live|test)?_?[\w]{8,}"), REDACTED),  # Stripe keys
+    (re.compile(r"(?i)((?:token|secret|password|session_token|api_key)[\"']?\s*[=:]\s*[\"']?)[^\s,;&\"'}]+"), r"\1" + REDACTED),
+]
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_request_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_context", default=None)
+
+
+def parse_route_setting(setting: str) -> List[Tuple[str, str]]:
+    """Parse "prefix=value,prefix=value" into (prefix, value) pairs, longest prefix first."""
+    pairs = []
+    for item in setting.split(","):
+        if "=" in item:
+            prefix, value = item.split("=", 1)
+            pairs.append((prefix.strip(), value.strip()))
+    return sorted(pairs, key=lambda pair: len(pair[0]), reverse=True)
+
+
+def _match_route(path: str, settings: List[Tuple[str, Any]]) -> Optional[Any]:
+    for prefix, value in settings:
+        if path.startswith(prefix):
+            return value
+    return None
+
+
+ROUTE_LEVELS = [(prefix, logging.getLevelName(level.upper())) for prefix, level in parse_route_setting(LOG_ROUTE_LEVELS)]
+ROUTE_SAMPLE_RATES = [(prefix, float(rate)) for prefix, rate in parse_route_setting(LOG_ROUTE_SAMPLE_RATES)]
+
+
+@contextmanager
+def request_context(method: str, path: str, request_id: Optional[str] = None):
+    """
+    Tag records logged while handling a request, and decide its sampling.
+
+    Yields the context dict, so the caller can read ``request_id``.
+    """
+    rate = _match_route(path, ROUTE_SAMPLE_RATES)
+    context = {
+        "request_id": request_id or uuid.uuid4().hex[:16],
+        "method": method,
+        "path": path,
+        "level": _match_route(path, ROUTE_LEVELS) or logging.NOTSET,
+        "sampled": rate is None or random.random() < rate
+    }
+    token = _request_context.set(context)
+    try:
+        yield context
+    finally:
+        _request_context.reset(token)
+
+
+def redact(value: Any, depth: int = 0) -> Any:
+    """Strip credentials from a message or structured field."""
+    if isinstance(value, str):
+        for pattern, replacement in SENSITIVE_PATTERNS:
+            value = pattern.sub(replacement, value)
+        return value
+    if depth > 4:
+        return value
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if isinstance(key, str) and SENSITIVE_KEYS.search(key) else redact(item, depth + 1)
+            for key, item in value.items()
+        }
+    if isinstance(value, (list, tuple, set)):
+        return [redact(item, depth + 1) for item in value]
+    return value
+
+
+class RequestFilter(logging.Filter):
+    """
+    Attach the request context and drop records the route doesn't want.
+
+    Runs in the caller before the record is queued, so dropped records cost
+    almost nothing.
+    """
+
+    def __init__(self, max_per_second: float = LOG_MAX_RECORDS_PER_SECOND, clock=time.monotonic):
+        super().__init__()
+        self.max_per_second = max_per_second
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._window = 0
+        self._count = 0
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _request_context.get()
+        if context is not None:
+            record.request_id = context["request_id"]
+            record.method = context["method"]
+            record.path = context["path"]
+
+        if record.levelno >= logging.WARNING:
+            return self._passed(record)
+
+        if context is not None and (record.levelno < context["level"] or not context["sampled"]):
+            return False
+
+        with self._lock:
+            window = int(self._clock())
+            if window != self._window:
+                self._window = window
+                self._count = 0
+            self._count += 1
+            if self.max_per_second and self._count > self.max_per_second:
+                self.dropped += 1
+                return False
+        return self._passed(record)
+
+    def _passed(self, record: logging.LogRecord) -> bool:
+        if self.dropped:
+            with self._lock:
+                record.dropped_records, self.dropped = self.dropped, 0
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or erroring."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args here, since they may change after the call returns, but
+        # leave JSON formatting and redaction to the listener thread
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with ``extra`` fields included and credentials redacted."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact(record.getMessage())
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = REDACTED if SENSITIVE_KEYS.search(key) else redact(value)
+        if record.exc_text:
+            entry["exc"] = redact(record.exc_text)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable single lines for local development, still redacted."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def configure_logging(level: str = LOG_LEVEL, stream=None, log_format: str = LOG_FORMAT) -> NonBlockingQueueHandler:
+    """
+    Send all logging through the background queue. Safe to call more than once.
+
+    Returns the queue handler, which exposes the dropped-record count.
+    """
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        return _queue_handler
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JSONFormatter() if log_format == "json" else TextFormatter())
+
+    log_queue: queue.Queue = queue.Queue(LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(RequestFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_queue_handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _queue_handler
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+
+
+def logging_stats() -> Dict[str, Any]:
+    """Queue depth and records dropped by the queue and the rate limit."""
+    if _queue_handler is None:
+        return {"configured": False}
+    request_filter = next(f for f in _queue_handler.filters if isinstance(f, RequestFilter))
+    return {
+        "configured": True,
+        "queued": _queue_handler.queue.qsize(),
+        "dropped_queue_full": _queue_handler.dropped,
+        "dropped_rate_limited_pending": request_filter.dropped
+    }
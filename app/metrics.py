@@ -0,0 +1,361 @@
+"""
+In-process metrics in the Prometheus text format, served at /metrics.
+
+A small registry of counters, gauges and histograms, enough to find hot
+paths without another dependency:
+
+- HTTP requests: latency histogram and count per route template, and
+  in-flight requests (recorded by RequestContextMiddleware)
+- database: query latency by statement type, plus queries and query time
+  per request (SQLAlchemy engine events, see ``instrument_engine``; the
+  same events feed app.query_profiler)
+- LLM calls: latency and token usage per model (``LLMMetricsHandler``,
+  attached to the chat model in ai_chains)
+- Stripe and Stytch: call latency and errors per operation
+  (``track_external_call``)
+
+Values are kept per worker process, like /internal/metrics, so scrape each
+worker or run a single one per instance.
+"""
+
+import re
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from sqlalchemy import event
+
+from app.query_profiler import record_query
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+LLM_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 90.0, 120.0, 180.0)
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, "Metric"] = {}
+
+    def register(self, metric: "Metric") -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def get(self, **labels) -> Tuple[int, float]:
+        """Count and sum of the observations for these labels."""
+        state = self._values.get(self._key(labels))
+        return (state[2], state[1]) if state else (0, 0.0)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        names = self.labelnames + ("le",)
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ("method", "route"))
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled.", ("method",))
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "Database queries run per HTTP request.", ("method", "route"), buckets=COUNT_BUCKETS
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Time spent in database queries per HTTP request.", ("method", "route"), buckets=DB_BUCKETS
+)
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Database query latency by statement type.", ("operation",), buckets=DB_BUCKETS)
+DB_POOL_CONNECTIONS = Gauge("db_pool_connections", "Database pool connections by engine and state.", ("engine", "state"))
+LLM_CALL_SECONDS = Histogram("llm_call_duration_seconds", "LLM call latency by model.", ("model",), buckets=LLM_BUCKETS)
+LLM_CALL_ERRORS = Counter("llm_call_errors_total", "Failed LLM calls by model.", ("model",))
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "LLM tokens used by model and kind (prompt, cached_prompt or completion).", ("model", "kind")
+)
+EXTERNAL_CALL_SECONDS = Histogram(
+    "external_call_duration_seconds", "Stripe and Stytch call latency by operation.", ("service", "operation")
+)
+EXTERNAL_CALL_ERRORS = Counter("external_call_errors_total", "Failed Stripe and Stytch calls by operation.", ("service", "operation"))
+
+
+class RequestMetrics:
+    """Per-request measurements, filled in while the request is handled."""
+
+    __slots__ = ("method", "start", "duration", "queries", "db_seconds")
+
+    def __init__(self, method: str):
+        self.method = method
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    @property
+    def duration_ms(self) -> float:
+        return round(self.duration * 1000, 2)
+
+    def finish(self, route: str, status: int) -> None:
+        """Record the request under its route template."""
+        self.duration = time.perf_counter() - self.start
+        HTTP_REQUESTS.inc(method=self.method, route=route, status=status)
+        HTTP_REQUEST_SECONDS.observe(self.duration, method=self.method, route=route)
+        HTTP_REQUEST_DB_QUERIES.observe(self.queries, method=self.method, route=route)
+        HTTP_REQUEST_DB_SECONDS.observe(self.db_seconds, method=self.method, route=route)
+
+
+_request_metrics: ContextVar[Optional[RequestMetrics]] = ContextVar("request_metrics", default=None)
+
+
+@contextmanager
+def track_request(method: str):
+    """Count the request as in flight and collect its database queries."""
+    tracked = RequestMetrics(method)
+    token = _request_metrics.set(tracked)
+    HTTP_IN_FLIGHT.inc(method=method)
+    try:
+        yield tracked
+    finally:
+        HTTP_IN_FLIGHT.dec(method=method)
+        _request_metrics.reset(token)
+
+
+def current_request_metrics() -> Optional[RequestMetrics]:
+    return _request_metrics.get()
+
+
+def route_label(scope: Dict[str, Any], status: int) -> str:
+    """
+    The route template a request matched, e.g. /api/results/{user_id}/summary.
+
+    Requests served by a mount (static files) are grouped under the mount's
+    first path segment; other unmatched requests share one label, so
+    scanners can't create unbounded series.
+    """
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    if status == 404:
+        return "unmatched"
+    return "/" + scope["path"].split("/", 2)[1]
+
+
+_OPERATION = re.compile(r"\s*(\w+)")
+_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_start
+    match = _OPERATION.match(statement)
+    operation = match.group(1).upper() if match else ""
+    DB_QUERY_SECONDS.observe(elapsed, operation=operation if operation in _OPERATIONS else "OTHER")
+
+    tracked = _request_metrics.get()
+    if tracked is not None:
+        tracked.queries += 1
+        tracked.db_seconds += elapsed
+    record_query(statement, parameters, elapsed)
+
+
+def instrument_engine(engine):
+    """Record query latency for a sync or async engine. Returns the engine."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
+
+
+def record_pool_stats(engine_name: str, stats: Optional[Dict[str, Any]]) -> None:
+    """Copy pool_stats() connection counts into the pool gauge. None (no engine yet) is skipped."""
+    for state in ("checked_out", "checked_in", "overflow"):
+        if stats and state in stats:
+            DB_POOL_CONNECTIONS.set(stats[state], engine=engine_name, state=state)
+
+
+@contextmanager
+def track_external_call(service: str, operation: str):
+    """Time a Stripe or Stytch call; works around sync calls and awaits alike."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        EXTERNAL_CALL_ERRORS.inc(service=service, operation=operation)
+        raise
+    finally:
+        EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - start, service=service, operation=operation)
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """LangChain callback recording chat model latency and token usage."""
+
+    # Only updates counters, so there's no need to hop to a thread in async runs
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self._started: Dict[Any, float] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        start = self._started.pop(run_id, None)
+        if start is not None:
+            LLM_CALL_SECONDS.observe(time.perf_counter() - start, model=self.model)
+
+        prompt_tokens, cached_prompt_tokens, completion_tokens = token_usage(response)
+        if prompt_tokens:
+            LLM_TOKENS.inc(prompt_tokens, model=self.model, kind="prompt")
+        if cached_prompt_tokens:
+            LLM_TOKENS.inc(cached_prompt_tokens, model=self.model, kind="cached_prompt")
+        if completion_tokens:
+            LLM_TOKENS.inc(completion_tokens, model=self.model, kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._started.pop(run_id, None)
+        LLM_CALL_ERRORS.inc(model=self.model)
+
+
+def token_usage(response) -> Tuple[int, int, int]:
+    """
+    Prompt, cached prompt and completion tokens from an LLMResult, streamed or not.
+
+    Cached prompt tokens are the part of the prompt OpenAI served from its
+    prompt cache; they are included in the prompt tokens.
+    """
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+        return usage.get("prompt_tokens", 0), cached, usage.get("completion_tokens", 0)
+
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                cached = (metadata.get("input_token_details") or {}).get("cache_read") or 0
+                return metadata.get("input_tokens", 0), cached, metadata.get("output_tokens", 0)
+    return 0, 0, 0
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
@@ -1,30 +1,88 @@
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+import logging
+from contextlib import nullcontext
+from starlette.datastructures import Headers
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-class AuthHeaderMiddleware(BaseHTTPMiddleware):
+from app.logging_config import request_context
+from app.metrics import route_label, track_request
+from app.query_profiler import PROFILE_HEADER, log_profile, profile_queries, profiling_requested
+
+logger = logging.getLogger("pathlight.requests")
+
+class RequestContextMiddleware:
     """
-    Middleware to check for Authorization header and set the appropriate cookie.
-    
-    This helps bridge the gap between localStorage token storage and cookie-based authentication.
+    Pure ASGI middleware handling the per-request work for every HTTP request.
+
+    - Copies a bearer token from the Authorization header to
+      ``request.state.auth_token``. This helps bridge the gap between
+      localStorage token storage and cookie-based authentication.
+    - Tags everything logged while handling the request with its id, method
+      and path, and logs one record per request with the status and
+      duration. Cookie and Authorization values are never logged, only which
+      ones were sent.
+    - Records the request's latency, status and database queries under its
+      route template in app.metrics, and counts it as in flight meanwhile.
+    - When QUERY_PROFILING asks for it, profiles the request's SQL (see
+      app.query_profiler), adding a summary header and logging the profile.
+      The header covers the queries run before the response started.
+
+    Unlike BaseHTTPMiddleware this doesn't run the app in a separate task or
+    re-stream the response body, so it costs little per request and
+    streaming responses pass straight through.
     """
-    
+
     def __init__(self, app: ASGIApp):
-        super().__init__(app)
-    
-    async def dispatch(self, request: Request, call_next):
-        # Check if there's an Authorization header
-        auth_header = request.headers.get('Authorization')
-        if auth_header and auth_header.startswith('Bearer '):
-            # Extract the token
-            token = auth_header.replace('Bearer ', '')
-            print(f"[DEBUG] Found token in Authorization header: {token[:10]}...")
-            
-            # Store it in the request state for use in get_authenticated_user
-            request.state.auth_token = token
-        else:
-            request.state.auth_token = None
-        
-        # Continue processing the request
-        response = await call_next(request)
-        return response
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        auth_header = headers.get("authorization")
+        bearer = bool(auth_header and auth_header.startswith("Bearer "))
+        # Store it in the request state for use in get_authenticated_user
+        scope.setdefault("state", {})["auth_token"] = auth_header[len("Bearer "):] if bearer else None
+
+        method = scope["method"]
+        path = scope["path"]
+        response = {"status": 500, "cookie_set": False}
+        profiled = profiling_requested(headers)
+
+        async def send_with_status(message: Message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["cookie_set"] = any(name == b"set-cookie" for name, _ in message.get("headers", ()))
+                if profiled:
+                    message["headers"] = list(message.get("headers", ())) + [
+                        (PROFILE_HEADER.lower().encode(), profile.header_value().encode())
+                    ]
+            await send(message)
+
+        with request_context(method, path, headers.get("x-request-id")), track_request(method) as tracked, \
+                (profile_queries() if profiled else nullcontext()) as profile:
+            try:
+                await self.app(scope, receive, send_with_status)
+            except Exception:
+                tracked.finish(route_label(scope, 500), 500)
+                logger.exception("%s %s failed", method, path, extra={"duration_ms": tracked.duration_ms})
+                raise
+            finally:
+                if profiled:
+                    log_profile(method, path, profile)
+
+            tracked.finish(route_label(scope, response["status"]), response["status"])
+            logger.info(
+                "%s %s %s", method, path, response["status"],
+                extra={
+                    "status": response["status"],
+                    "duration_ms": tracked.duration_ms,
+                    "db_queries": tracked.queries,
+                    "db_ms": round(tracked.db_seconds * 1000, 2),
+                    "cookie_names": sorted(cookie_parser(headers.get("cookie", ""))),
+                    "bearer_auth": bearer,
+                    "cookie_set": response["cookie_set"]
+                }
+            )
@@ -1,4 +1,24 @@
-from app.models.models import User, FormResponse, Result
-from app.models.database import create_db_and_tables, get_session, engine
+from app.models.models import User, FormResponse, Result, ResultHistory, GenerationJob, GenerationUsage, GenerationCacheEntry
+from app.models.database import (
+    create_db_and_tables, get_session, get_session_factory, engine, build_engine, pool_stats,
+    get_async_session, get_async_engine, build_async_engine
+)
 
-__all__ = ["User", "FormResponse", "Result", "create_db_and_tables", "get_session", "engine"]
+__all__ = [
+    "User",
+    "FormResponse",
+    "Result",
+    "ResultHistory",
+    "GenerationJob",
+    "GenerationUsage",
+    "GenerationCacheEntry",
+    "create_db_and_tables",
+    "get_session",
+    "get_session_factory",
+    "engine",
+    "build_engine",
+    "pool_stats",
+    "get_async_session",
+    "get_async_engine",
+    "build_async_engine"
+]
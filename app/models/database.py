@@ -1,7 +1,41 @@
+"""
+Database engine and session helpers.
+
+The engine is configured from the environment so pool sizing can follow the
+deployment (number of uvicorn workers, PostgreSQL's max_connections):
+
+- DB_POOL_SIZE (5) and DB_MAX_OVERFLOW (10): persistent and burst
+  connections per worker
+- DB_POOL_TIMEOUT (30): seconds to wait for a free connection
+- DB_POOL_RECYCLE (1800): seconds before a connection is replaced
+- DB_STATEMENT_TIMEOUT_MS (0 = none): server-side limit per statement
+- DB_SSLMODE (prefer): libpq sslmode
+- DB_PGBOUNCER (false): settings that work behind PgBouncer in transaction
+  pooling mode
+
+Pool statistics are available from ``pool_stats``.
+
+Async routes use ``get_async_session`` instead, backed by an asyncpg engine
+(aiosqlite for SQLite) built from the same URL and settings, so their queries
+await the database instead of holding a threadpool thread.
+"""
+
+import logging
 import os
+import time
+import threading
+from typing import Any, Dict, Optional
 from sqlmodel import SQLModel, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from dotenv import load_dotenv
-from sqlalchemy.pool import QueuePool
+from sqlalchemy import exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import NullPool, QueuePool
+
+from app.metrics import instrument_engine
+
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
@@ -9,18 +43,207 @@ load_dotenv()
 # Use PostgreSQL database
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-# Create engine with PostgreSQL and connection pooling
-engine = create_engine(
-    DATABASE_URL,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_recycle=1800,
-    pool_pre_ping=True,
-    poolclass=QueuePool,
-    connect_args={"sslmode": "prefer"}  # Use SSL but don't require it
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+DB_SSLMODE = os.getenv("DB_SSLMODE", "prefer")
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() in ("1", "true", "yes")
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self._checkout_state = threading.local()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        # QueuePool._do_get retries by calling itself; only time the outer call
+        if getattr(self._checkout_state, "timing", False):
+            return super()._do_get()
+
+        self._checkout_state.timing = True
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            self._checkout_state.timing = False
+            waited = time.perf_counter() - start
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+
+def build_engine(
+    url: str,
+    pool_size: int = DB_POOL_SIZE,
+    max_overflow: int = DB_MAX_OVERFLOW,
+    pool_timeout: float = DB_POOL_TIMEOUT,
+    pool_recycle: int = DB_POOL_RECYCLE,
+    statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS,
+    pgbouncer: bool = DB_PGBOUNCER,
+    sslmode: Optional[str] = DB_SSLMODE,
+    pooled: bool = True
+) -> Engine:
+    """
+    Create an engine for ``url`` with the pool and connection settings above.
+
+    PostgreSQL URLs get a TimedQueuePool, sslmode and the statement timeout.
+    With ``pgbouncer`` the driver's prepared statements are disabled, since a
+    transaction-mode PgBouncer may run each statement on a different server
+    connection, and the statement timeout is left to the database role
+    (``ALTER ROLE ... SET statement_timeout``) because PgBouncer rejects
+    startup options. Other databases (SQLite in development and tests) only
+    get the pool settings that apply to them.
+
+    ``pooled=False`` opens a fresh connection per checkout instead, for
+    connections held for a long time that shouldn't take a pool slot.
+    """
+    parsed = make_url(url)
+
+    if parsed.get_backend_name() != "postgresql":
+        if parsed.get_backend_name() == "sqlite":
+            return create_engine(url, connect_args={"check_same_thread": False})
+        return create_engine(url, pool_pre_ping=True)
+
+    connect_args: Dict[str, Any] = {}
+    if sslmode:
+        connect_args["sslmode"] = sslmode
+
+    if pgbouncer:
+        if parsed.get_driver_name() == "psycopg":
+            # psycopg 3 prepares repeated statements; psycopg2 never does
+            connect_args["prepare_threshold"] = None
+        if statement_timeout_ms:
+            logger.warning("DB_STATEMENT_TIMEOUT_MS is ignored behind PgBouncer; set statement_timeout on the database role instead")
+    elif statement_timeout_ms:
+        connect_args["options"] = f"-c statement_timeout={statement_timeout_ms}"
+
+    if not pooled:
+        return create_engine(url, poolclass=NullPool, connect_args=connect_args)
+
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=True,
+        poolclass=TimedQueuePool,
+        connect_args=connect_args
+    )
+
+
+# libpq connection parameters that asyncpg.connect() doesn't accept; the
+# async engine would pass them straight through and fail every connect.
+# sslmode is mapped to asyncpg's ssl argument by build_async_engine.
+LIBPQ_ONLY_PARAMS = (
+    "sslmode", "sslrootcert", "sslcert", "sslkey", "sslcrl", "sslpassword",
+    "channel_binding", "gssencmode", "connect_timeout", "application_name", "options",
+    "keepalives", "keepalives_idle", "keepalives_interval", "keepalives_count"
 )
 
+
+def async_database_url(url: str) -> str:
+    """Point ``url`` at the async driver for its database, dropping query parameters it doesn't take."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend == "postgresql":
+        parsed = parsed.difference_update_query(LIBPQ_ONLY_PARAMS)
+        return parsed.set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+    if backend == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    return url
+
+
+def build_async_engine(
+    url: str,
+    pool_size: int = DB_POOL_SIZE,
+    max_overflow: int = DB_MAX_OVERFLOW,
+    pool_timeout: float = DB_POOL_TIMEOUT,
+    pool_recycle: int = DB_POOL_RECYCLE,
+    statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS,
+    pgbouncer: bool = DB_PGBOUNCER,
+    sslmode: Optional[str] = DB_SSLMODE
+) -> AsyncEngine:
+    """
+    Create an async engine for ``url``, see build_engine for the settings.
+    
+    asyncpg takes the statement timeout as a server setting and caches
+    prepared statements itself, so behind PgBouncer both of its statement
+    caches are turned off. An sslmode in the URL's query takes precedence
+    over the ``sslmode`` argument, as it does for libpq.
+    """
+    async_url = make_url(async_database_url(url))
+    
+    if async_url.get_backend_name() != "postgresql":
+        return create_async_engine(async_url)
+    
+    sslmode = make_url(url).query.get("sslmode", sslmode)
+    connect_args: Dict[str, Any] = {}
+    if sslmode:
+        connect_args["ssl"] = sslmode
+    
+    if pgbouncer:
+        connect_args["statement_cache_size"] = 0
+        async_url = async_url.update_query_dict({"prepared_statement_cache_size": "0"})
+    elif statement_timeout_ms:
+        connect_args["server_settings"] = {"statement_timeout": str(statement_timeout_ms)}
+    
+    return create_async_engine(
+        async_url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=True,
+        connect_args=connect_args
+    )
+
+
+def pool_stats(bind: Engine) -> Dict[str, Any]:
+    """Report the engine pool's current usage and checkout wait times."""
+    if isinstance(bind, AsyncEngine):
+        bind = bind.sync_engine
+    pool = bind.pool
+    stats: Dict[str, Any] = {"pool_class": type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "pool_size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow()
+        })
+
+    if isinstance(pool, TimedQueuePool):
+        stats.update({
+            "checkouts": pool.checkouts,
+            "timeouts": pool.timeouts,
+            "wait_seconds_total": pool.wait_seconds_total,
+            "wait_seconds_max": pool.wait_seconds_max,
+            "wait_seconds_avg": pool.wait_seconds_total / pool.checkouts if pool.checkouts else 0.0
+        })
+
+    return stats
+
+
+# Create engine with PostgreSQL and connection pooling
+engine = instrument_engine(build_engine(DATABASE_URL))
+
 # Function to create tables
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
@@ -32,5 +255,34 @@ def get_session():
             yield session
         except Exception as e:
             session.rollback()
-            print(f"Database session error: {str(e)}")
+            logger.error("Database session error: %s", e)
+            raise
+
+# Function to get a session factory for work that outlives the request,
+# such as background generation jobs. Each call opens a new session.
+def get_session_factory():
+    return lambda: Session(engine)
+
+# The async engine is created on first use, so processes that never serve an
+# async route don't open a second pool
+_async_engine: Optional[AsyncEngine] = None
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = instrument_engine(build_async_engine(DATABASE_URL))
+    return _async_engine
+
+def async_pool_stats() -> Optional[Dict[str, Any]]:
+    """Pool stats for the async engine, or None if it hasn't been created yet."""
+    return pool_stats(_async_engine) if _async_engine is not None else None
+
+# Function to get an async database session
+async def get_async_session():
+    async with AsyncSession(get_async_engine(), expire_on_commit=False) as session:
+        try:
+            yield session
+        except Exception as e:
+            await session.rollback()
+            logger.error("Database session error: %s", e)
             raise
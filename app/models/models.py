@@ -1,12 +1,20 @@
-from typing import Optional, List, Union
+from typing import Any, Optional, List, Union
 from datetime import datetime
 from sqlmodel import Field, SQLModel, Relationship
+from sqlalchemy import JSON, Column, Index, LargeBinary, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
+import json
 import uuid
 from pydantic import validator
 
 
 class User(SQLModel, table=True):
     __tablename__ = "users"
+    __table_args__ = (
+        # The subscription cleanup task scans on all three columns
+        Index("ix_users_subscription_cleanup", "payment_tier", "subscription_status", "subscription_end_date"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     name: str
     email: str = Field(unique=True)
@@ -15,7 +23,7 @@ class User(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     payment_tier: str = Field(default="none")  # none, purpose, plan, pursuit
-    subscription_id: Optional[str] = Field(default=None)  # Stripe subscription ID
+    subscription_id: Optional[str] = Field(default=None, index=True)  # Stripe subscription ID, looked up by webhooks
     subscription_status: Optional[str] = Field(default=None)  # active, canceled, past_due
     subscription_end_date: Optional[datetime] = Field(default=None)  # When subscription ends
     
@@ -58,6 +66,11 @@ class User(SQLModel, table=True):
 
 class FormResponse(SQLModel, table=True):
     __tablename__ = "form_responses"
+    __table_args__ = (
+        # One answer per question; its index also serves lookups by user_id
+        # and ordering by question_number
+        UniqueConstraint("user_id", "question_number", name="uq_form_responses_user_question"),
+    )
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="users.id")
     question_number: int
@@ -78,15 +91,103 @@ class FormResponse(SQLModel, table=True):
         return value
 
 
+class PlanJSON(TypeDecorator):
+    """
+    JSON document column that reads and writes serialized JSON strings.
+    
+    Plans are stored as JSONB on PostgreSQL (JSON on SQLite) so queries can
+    pull individual keys out of them, while the application keeps passing
+    plans around as JSON text. An empty string is stored as NULL and read
+    back as an empty string; text that isn't valid JSON is stored as a JSON
+    string.
+    """
+    impl = JSON
+    cache_ok = True
+    
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "postgresql":
+            return dialect.type_descriptor(JSONB(none_as_null=True))
+        return dialect.type_descriptor(JSON(none_as_null=True))
+    
+    def process_bind_param(self, value: Any, dialect) -> Any:
+        if value is None or value == "":
+            return None
+        if isinstance(value, str):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+        return value
+    
+    def process_result_value(self, value: Any, dialect) -> Optional[str]:
+        if value is None:
+            return ""
+        if isinstance(value, str):
+            return value
+        return json.dumps(value)
+
+
 class Result(SQLModel, table=True):
     __tablename__ = "results"
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     user_id: uuid.UUID = Field(foreign_key="users.id", unique=True)
-    basic_plan: str  # Stores SummaryOutput as JSON
-    full_plan: str
+    basic_plan: str = Field(sa_column=Column(PlanJSON))  # SummaryOutput
+    full_plan: str = Field(sa_column=Column(PlanJSON))  # FullPlanOutput, empty until premium generation
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_generated_at: datetime = Field(default_factory=datetime.utcnow)
     regeneration_count: int = Field(default=0)  # Track number of regenerations
     
     # Relationships
     user: User = Relationship(back_populates="result")
+
+
+class ResultHistory(SQLModel, table=True):
+    __tablename__ = "result_history"
+    __table_args__ = (
+        # A user's history is read newest first
+        Index("ix_result_history_user_generated", "user_id", "generated_at"),
+    )
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    user_id: uuid.UUID = Field(foreign_key="users.id")
+    plan_field: str  # basic_plan, full_plan
+    payload: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # Plan JSON encoded with app.plan_codec
+    generated_at: datetime  # When the replaced plan was generated
+    created_at: datetime = Field(default_factory=datetime.utcnow)  # When it was replaced
+
+
+class GenerationJob(SQLModel, table=True):
+    __tablename__ = "generation_jobs"
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    user_id: uuid.UUID = Field(foreign_key="users.id", index=True)
+    tier: str  # basic, premium
+    status: str = Field(default="queued")  # queued, running, succeeded, failed
+    error: Optional[str] = Field(default=None)  # Failure detail for failed jobs
+    created_at: datetime = Field(default_factory=datetime.utcnow)  # When the job was enqueued
+    started_at: Optional[datetime] = Field(default=None)  # When a worker picked it up
+    finished_at: Optional[datetime] = Field(default=None)  # When it succeeded or failed
+
+class GenerationUsage(SQLModel, table=True):
+    __tablename__ = "generation_usage"
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    user_id: uuid.UUID = Field(foreign_key="users.id", index=True)
+    result_id: uuid.UUID = Field(foreign_key="results.id")
+    generation: int  # Result.regeneration_count once this generation was saved
+    payment_tier: str  # User's tier at generation time
+    chain: str  # summary, full_plan
+    model: str
+    cache_hit: bool = Field(default=False)  # Served from the generation cache, no LLM call
+    prompt_tokens: int = Field(default=0)
+    cached_prompt_tokens: int = Field(default=0)  # Part of prompt_tokens served from OpenAI's prompt cache
+    completion_tokens: int = Field(default=0)
+    latency_ms: float = Field(default=0)  # Wall time of the chain invocation, including retries
+    retries: int = Field(default=0)
+    cost_usd: float = Field(default=0)  # Estimated with the prices in effect at generation time
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+class GenerationCacheEntry(SQLModel, table=True):
+    __tablename__ = "generation_cache"
+    key: str = Field(primary_key=True)  # sha256 of prompt version, model config, chain and formatted responses
+    chain: str  # summary, full_plan
+    value: str  # JSON of the structured output
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+    expires_at: datetime = Field(index=True)
@@ -0,0 +1,128 @@
+"""
+Compact binary encoding for stored plan payloads.
+
+Full plans run to tens of KB of JSON per generation, and every regeneration
+keeps the previous plans in ``ResultHistory``. Those snapshots are written
+once and rarely read, so they are stored compressed:
+
+    b"PL" | format version (1 byte) | codec id (1 byte) | body
+
+Codecs are ``raw`` (no compression), ``zlib`` and ``zstd``. zstd needs the
+optional ``zstandard`` package and falls back to zlib without it. PLAN_CODEC
+picks the codec for new payloads (default zstd); PLAN_COMPRESSION_LEVEL
+overrides the codec's default level. Payloads smaller than
+PLAN_COMPRESSION_MIN_BYTES, or that don't shrink, are stored raw.
+
+``decode_plan`` reads every codec regardless of the current setting, and
+bytes without the header are treated as plain UTF-8 text, so the codec can
+be changed without rewriting existing rows first.
+"""
+
+import os
+import zlib
+from typing import Optional, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+PLAN_CODEC = os.getenv("PLAN_CODEC", "zstd")
+PLAN_COMPRESSION_LEVEL = os.getenv("PLAN_COMPRESSION_LEVEL")
+PLAN_COMPRESSION_MIN_BYTES = int(os.getenv("PLAN_COMPRESSION_MIN_BYTES", "256"))
+
+MAGIC = b"PL"
+FORMAT_VERSION = 1
+HEADER_SIZE = len(MAGIC) + 2
+
+CODEC_IDS = {"raw": 0, "zlib": 1, "zstd": 2}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+DEFAULT_LEVELS = {"zlib": 6, "zstd": 3}
+
+
+class PlanCodecError(ValueError):
+    """Raised for payloads with an unknown version or codec."""
+
+
+def available_codec(codec: str) -> str:
+    """The codec that will actually be used for ``codec`` in this environment."""
+    if codec not in CODEC_IDS:
+        raise PlanCodecError(f"Unknown plan codec: {codec}")
+    if codec == "zstd" and zstandard is None:
+        return "zlib"
+    return codec
+
+
+def _compress(codec: str, data: bytes, level: int) -> bytes:
+    if codec == "zlib":
+        return zlib.compress(data, level)
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return data
+
+
+def _decompress(codec: str, body: bytes) -> bytes:
+    if codec == "zlib":
+        return zlib.decompress(body)
+    if codec == "zstd":
+        if zstandard is None:
+            raise PlanCodecError("Plan payload is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(body)
+    return body
+
+
+def encode_plan(plan: Union[str, bytes], codec: Optional[str] = None, level: Optional[int] = None) -> bytes:
+    """
+    Encode a plan (JSON text) with a version header.
+
+    Args:
+        plan: Plan JSON
+        codec: "raw", "zlib" or "zstd"; defaults to PLAN_CODEC
+        level: Compression level; defaults to PLAN_COMPRESSION_LEVEL or the
+            codec's default
+
+    Returns:
+        Header followed by the (possibly compressed) UTF-8 body
+    """
+    data = plan.encode("utf-8") if isinstance(plan, str) else plan
+    codec = available_codec(codec or PLAN_CODEC)
+
+    if codec != "raw" and len(data) >= PLAN_COMPRESSION_MIN_BYTES:
+        if level is None:
+            level = int(PLAN_COMPRESSION_LEVEL) if PLAN_COMPRESSION_LEVEL else DEFAULT_LEVELS[codec]
+        body = _compress(codec, data, level)
+        if len(body) < len(data):
+            return MAGIC + bytes([FORMAT_VERSION, CODEC_IDS[codec]]) + body
+
+    return MAGIC + bytes([FORMAT_VERSION, CODEC_IDS["raw"]]) + data
+
+
+def is_encoded(payload: bytes) -> bool:
+    return payload[:len(MAGIC)] == MAGIC and len(payload) >= HEADER_SIZE
+
+
+def payload_codec(payload: bytes) -> Optional[str]:
+    """Name of the codec a payload was encoded with, or None for headerless text."""
+    if not is_encoded(payload):
+        return None
+    return CODEC_NAMES.get(payload[3])
+
+
+def decode_plan(payload: Union[bytes, memoryview, str, None]) -> str:
+    """Decode a payload from ``encode_plan`` (or legacy plain text) back to plan JSON."""
+    if payload is None:
+        return ""
+    if isinstance(payload, str):
+        return payload
+    payload = bytes(payload)
+
+    if not is_encoded(payload):
+        return payload.decode("utf-8")
+
+    version, codec_id = payload[2], payload[3]
+    if version != FORMAT_VERSION:
+        raise PlanCodecError(f"Unsupported plan payload version: {version}")
+    if codec_id not in CODEC_NAMES:
+        raise PlanCodecError(f"Unknown plan codec id: {codec_id}")
+
+    return _decompress(CODEC_NAMES[codec_id], payload[HEADER_SIZE:]).decode("utf-8")
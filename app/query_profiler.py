@@ -0,0 +1,182 @@
+"""
+Opt-in per-request SQL profiling with repeated-query and N+1 detection.
+
+QUERY_PROFILING controls which requests are profiled:
+
+- off (default): none
+- header: requests sent with ``X-Query-Profile: 1``
+- all: every request
+
+A profiled request records each statement with its duration and the line
+of application code that issued it (see ``instrument_engine`` in
+app.metrics, which feeds ``record_query``). RequestContextMiddleware adds
+a summary header to the response:
+
+    X-Query-Profile: queries=4; db_ms=3.12; repeated=1; n_plus_one=0
+
+and logs the profile, at WARNING when it flagged anything:
+
+- repeated: the same statement with the same parameters more than once
+- N+1: the same statement shape (placeholders and IN lists collapsed) run
+  QUERY_PROFILING_N_PLUS_ONE times or more from one call site
+
+``profile_queries`` can also be used directly, e.g. by the ``query_budget``
+test fixture.
+"""
+
+import os
+import re
+import sys
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+try:
+    import greenlet
+except ImportError:
+    greenlet = None
+
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "off").lower()
+QUERY_PROFILING_N_PLUS_ONE = int(os.getenv("QUERY_PROFILING_N_PLUS_ONE", "3"))
+PROFILE_HEADER = "X-Query-Profile"
+
+logger = logging.getLogger("pathlight.queries")
+
+# Call sites are the innermost frame in the project, outside these modules
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_SKIP_FILES = {os.path.abspath(__file__), os.path.join(PROJECT_ROOT, "app", "metrics.py")}
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|\$\d+|\?")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def statement_shape(statement: str) -> str:
+    """The statement with placeholders unified and IN lists collapsed, for N+1 grouping."""
+    shape = _PLACEHOLDER.sub("?", statement)
+    return " ".join(_PLACEHOLDER_LIST.sub("?...", shape).split())
+
+
+@dataclass
+class QueryRecord:
+    statement: str
+    parameters: str
+    duration: float
+    call_site: str
+
+
+@dataclass
+class QueryProfile:
+    """Statements run while the profile was active."""
+
+    records: List[QueryRecord] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.records)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(record.duration for record in self.records)
+
+    def repeated(self) -> List[Dict[str, Any]]:
+        """Statements run more than once with identical parameters."""
+        counts = Counter((record.statement, record.parameters) for record in self.records)
+        return [
+            {"statement": statement, "count": count, "call_sites": self._call_sites(statement, parameters)}
+            for (statement, parameters), count in counts.items() if count > 1
+        ]
+
+    def n_plus_one(self, threshold: int = QUERY_PROFILING_N_PLUS_ONE) -> List[Dict[str, Any]]:
+        """Statement shapes run ``threshold`` or more times from the same call site."""
+        counts = Counter((statement_shape(record.statement), record.call_site) for record in self.records)
+        return [
+            {"statement": shape, "count": count, "call_site": call_site}
+            for (shape, call_site), count in counts.items() if count >= threshold
+        ]
+
+    def _call_sites(self, statement: str, parameters: str) -> List[str]:
+        sites = [r.call_site for r in self.records if r.statement == statement and r.parameters == parameters]
+        return sorted(set(sites))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "queries": self.count,
+            "db_ms": round(self.total_seconds * 1000, 2),
+            "repeated": len(self.repeated()),
+            "n_plus_one": len(self.n_plus_one())
+        }
+
+    def header_value(self) -> str:
+        return "; ".join(f"{key}={value}" for key, value in self.summary().items())
+
+    def report(self) -> str:
+        """Readable listing of every statement, for logs and failed test assertions."""
+        lines = [self.header_value()]
+        for i, record in enumerate(self.records, 1):
+            lines.append(f"{i}. {record.duration * 1000:.2f} ms at {record.call_site}: {' '.join(record.statement.split())}")
+        for group in self.repeated():
+            lines.append(f"repeated {group['count']}x: {' '.join(group['statement'].split())}")
+        for group in self.n_plus_one():
+            lines.append(f"N+1 {group['count']}x at {group['call_site']}: {group['statement']}")
+        return "\n".join(lines)
+
+
+_profile: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+
+
+def profiling_requested(headers) -> bool:
+    """Whether QUERY_PROFILING asks for this request to be profiled."""
+    if QUERY_PROFILING == "all":
+        return True
+    return QUERY_PROFILING == "header" and headers.get(PROFILE_HEADER.lower()) == "1"
+
+
+@contextmanager
+def profile_queries():
+    """Record every statement run in this context (including threadpool work started from it)."""
+    profile = QueryProfile()
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+
+def _call_site() -> str:
+    frame = sys._getframe(2)
+    current = greenlet.getcurrent() if greenlet is not None else None
+    while frame is not None:
+        site = _project_site(frame)
+        if site:
+            return site
+        frame = frame.f_back
+        # Async sessions run queries in a greenlet whose stack ends inside
+        # SQLAlchemy; the awaiting route is on the suspended parent's stack
+        if frame is None and current is not None and current.parent is not None:
+            current = current.parent
+            frame = current.gr_frame
+    return "unknown"
+
+
+def _project_site(frame) -> Optional[str]:
+    filename = os.path.abspath(frame.f_code.co_filename)
+    if filename.startswith(PROJECT_ROOT) and filename not in _SKIP_FILES and "site-packages" not in filename:
+        return f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+    return None
+
+
+def record_query(statement: str, parameters: Any, duration: float) -> None:
+    """Add a statement to the active profile, if any. Called for every query, so it returns fast when idle."""
+    profile = _profile.get()
+    if profile is None:
+        return
+    profile.records.append(QueryRecord(statement, repr(parameters), duration, _call_site()))
+
+
+def log_profile(method: str, path: str, profile: QueryProfile) -> None:
+    summary = profile.summary()
+    level = logging.WARNING if summary["repeated"] or summary["n_plus_one"] else logging.INFO
+    logger.log(level, "Query profile for %s %s\n%s", method, path, profile.report(), extra=summary)
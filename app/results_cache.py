@@ -0,0 +1,76 @@
+"""
+Cache of parsed, tier-shaped payloads for the results endpoints.
+
+The results page polls ``/api/results/{user_id}/summary`` and ``/full``.
+Both used to ``json.loads`` the stored plan blobs and rebuild the response
+on every call. The built payload is now cached per user and view, along with
+a version made from what the payload depends on:
+
+- the result's ``last_generated_at``, which every plan write bumps
+- the user's ``payment_tier``
+- whether the user currently has premium access
+
+A request whose version differs from the cached one (a regeneration, an
+upgrade, a lapsed subscription) rebuilds the payload, so entries never need
+to be found and evicted across workers. Writers in this process also call
+``invalidate_results`` so superseded payloads don't linger until they
+expire.
+
+The version doubles as the response's ETag, so a client sending a matching
+``If-None-Match`` gets a 304 without the plans being loaded at all.
+"""
+
+import os
+import hashlib
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.cache import TTLCache
+
+RESULTS_CACHE_TTL = float(os.getenv("RESULTS_CACHE_TTL", "300"))
+RESULTS_CACHE_MAX_SIZE = int(os.getenv("RESULTS_CACHE_MAX_SIZE", "5000"))
+
+# Views cached per user, one per results endpoint
+RESULT_VIEWS = ("summary", "full")
+
+results_cache = TTLCache(max_size=RESULTS_CACHE_MAX_SIZE, ttl=RESULTS_CACHE_TTL)
+
+
+def result_etag(
+    user_id: uuid.UUID,
+    view: str,
+    last_generated_at: Optional[datetime],
+    payment_tier: str,
+    premium: bool
+) -> str:
+    """Strong ETag for a view of the user's result at this version."""
+    version = f"{user_id}:{view}:{last_generated_at.isoformat() if last_generated_at else ''}:{payment_tier}:{int(premium)}"
+    return f'"{hashlib.sha256(version.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header value covers ``etag``."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+def get_cached_payload(user_id: uuid.UUID, view: str, etag: str) -> Optional[Dict[str, Any]]:
+    """Return the cached payload if it was built for this version."""
+    entry = results_cache.get((user_id, view))
+    if entry is not None and entry[0] == etag:
+        return entry[1]
+    return None
+
+
+def set_cached_payload(user_id: uuid.UUID, view: str, etag: str, payload: Dict[str, Any]) -> None:
+    results_cache.set((user_id, view), (etag, payload))
+
+
+def invalidate_results(user_id: uuid.UUID) -> None:
+    """Drop a user's cached payloads after their result or tier changes."""
+    for view in RESULT_VIEWS:
+        results_cache.delete((user_id, view))
@@ -5,6 +5,7 @@ from app.routers.ai import router as ai_router
 from app.routers.payments import router as payments_router
 from app.routers.web import router as web_router
 from app.routers.auth import router as auth_router
+from app.routers.internal import router as internal_router, metrics_router
 
 __all__ = [
     "users_router",
@@ -13,5 +14,7 @@ __all__ = [
     "ai_router",
     "payments_router",
     "web_router",
-    "auth_router"
+    "auth_router",
+    "internal_router",
+    "metrics_router"
 ]
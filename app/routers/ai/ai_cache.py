@@ -0,0 +1,265 @@
+"""
+Content-addressed cache for LLM generations.
+
+``format_responses`` turns a user's name, zodiac info and answers into a
+deterministic prompt input, so a generation can be keyed on a hash of that
+input together with the prompt version, model configuration and chain name.
+Repeat submissions of the same answers (double clicks, retries, background
+and foreground requests racing) then reuse the stored output instead of
+paying for another OpenAI call.
+
+The backend is chosen with GENERATION_CACHE_BACKEND:
+- "memory" (default): in-process LRU, per worker
+- "sql": the generation_cache table, shared by all workers
+- "none": caching disabled
+
+Entries expire after GENERATION_CACHE_TTL seconds and each backend keeps at
+most GENERATION_CACHE_MAX_SIZE entries.
+"""
+
+import logging
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Type, TypeVar
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import Session, select, delete, func
+
+from app.cache import TTLCache
+from app.models import GenerationCacheEntry
+
+from .ai_prompts import PROMPT_VERSION
+from .ai_chains import MODEL_CONFIG
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("GENERATION_CACHE_BACKEND", "memory")
+CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", "86400"))
+CACHE_MAX_SIZE = int(os.getenv("GENERATION_CACHE_MAX_SIZE", "1000"))
+
+OutputT = TypeVar("OutputT", bound=BaseModel)
+
+
+def generation_cache_key(chain_name: str, formatted_responses: str) -> str:
+    """Hash everything that determines a generation's output."""
+    payload = json.dumps({
+        "prompt_version": PROMPT_VERSION,
+        "model": MODEL_CONFIG,
+        "chain": chain_name,
+        "responses": formatted_responses,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU backend. Cheap enough to call on the event loop."""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE, ttl: float = CACHE_TTL):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._cache.get(key)
+
+    def set(self, key: str, chain_name: str, value: str) -> None:
+        self._cache.set(key, value)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def size(self) -> int:
+        return len(self._cache)
+
+
+class SQLCacheBackend:
+    """
+    Database backend, shared across workers.
+
+    Calls hit the database, so async callers run them in the threadpool.
+    """
+
+    name = "sql"
+    blocking = True
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_size: int = CACHE_MAX_SIZE,
+        ttl: float = CACHE_TTL
+    ):
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[str]:
+        with self.session_factory() as session:
+            entry = session.get(GenerationCacheEntry, key)
+            if entry and entry.expires_at > datetime.utcnow():
+                return entry.value
+            return None
+
+    def set(self, key: str, chain_name: str, value: str) -> None:
+        now = datetime.utcnow()
+        with self.session_factory() as session:
+            entry = session.get(GenerationCacheEntry, key) or GenerationCacheEntry(key=key, chain=chain_name, value=value, expires_at=now)
+            entry.value = value
+            entry.created_at = now
+            entry.expires_at = now + timedelta(seconds=self.ttl)
+            session.add(entry)
+
+            # Evict expired entries, then the oldest ones beyond the size cap
+            session.exec(delete(GenerationCacheEntry).where(GenerationCacheEntry.expires_at <= now))
+            count = session.exec(select(func.count()).select_from(GenerationCacheEntry)).one()
+            if count > self.max_size:
+                oldest = select(GenerationCacheEntry.key).order_by(GenerationCacheEntry.created_at).limit(count - self.max_size)
+                session.exec(delete(GenerationCacheEntry).where(GenerationCacheEntry.key.in_(oldest)))
+
+            session.commit()
+
+    def clear(self) -> None:
+        with self.session_factory() as session:
+            session.exec(delete(GenerationCacheEntry))
+            session.commit()
+
+    def size(self) -> int:
+        with self.session_factory() as session:
+            return session.exec(select(func.count()).select_from(GenerationCacheEntry)).one()
+
+
+class GenerationCache:
+    """Front end over a backend that counts hits and misses for this worker."""
+
+    def __init__(self, backend: Optional[Any]):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    # A broken cache must never fail a generation, so backend errors are
+    # logged and treated as misses (reads) or skipped (writes)
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logger.warning("Generation cache read failed: %s", e)
+            value = None
+        self._count(value is not None)
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        try:
+            if self.backend.blocking:
+                value = await run_in_threadpool(self.backend.get, key)
+            else:
+                value = self.backend.get(key)
+        except Exception as e:
+            logger.warning("Generation cache read failed: %s", e)
+            value = None
+        self._count(value is not None)
+        return value
+
+    def set(self, key: str, chain_name: str, value: str) -> None:
+        try:
+            self.backend.set(key, chain_name, value)
+        except Exception as e:
+            logger.warning("Generation cache write failed: %s", e)
+
+    async def aset(self, key: str, chain_name: str, value: str) -> None:
+        try:
+            if self.backend.blocking:
+                await run_in_threadpool(self.backend.set, key, chain_name, value)
+            else:
+                self.backend.set(key, chain_name, value)
+        except Exception as e:
+            logger.warning("Generation cache write failed: %s", e)
+
+    def clear(self) -> None:
+        """Drop all entries and reset the counters."""
+        if self.backend:
+            self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this worker and the backend's current size."""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.enabled else "none",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": self.backend.size() if self.enabled else 0
+        }
+
+
+def _build_backend(name: str) -> Optional[Any]:
+    if name == "memory":
+        return MemoryCacheBackend()
+    if name == "sql":
+        from app.models import get_session_factory
+        return SQLCacheBackend(get_session_factory())
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown GENERATION_CACHE_BACKEND: {name}")
+
+
+generation_cache = GenerationCache(_build_backend(CACHE_BACKEND))
+
+
+def _decode(output_model: Type[OutputT], value: Optional[str]) -> Optional[OutputT]:
+    if value is None:
+        return None
+    try:
+        return output_model.model_validate_json(value)
+    except ValueError:
+        # Stale entry from an older output schema; treat it as a miss
+        return None
+
+
+def get_cached_generation(chain_name: str, formatted_responses: str, output_model: Type[OutputT]) -> Optional[OutputT]:
+    """Return a cached generation for this input, or None."""
+    if not generation_cache.enabled:
+        return None
+    key = generation_cache_key(chain_name, formatted_responses)
+    return _decode(output_model, generation_cache.get(key))
+
+
+async def aget_cached_generation(chain_name: str, formatted_responses: str, output_model: Type[OutputT]) -> Optional[OutputT]:
+    """Async version of get_cached_generation."""
+    if not generation_cache.enabled:
+        return None
+    key = generation_cache_key(chain_name, formatted_responses)
+    return _decode(output_model, await generation_cache.aget(key))
+
+
+def store_generation(chain_name: str, formatted_responses: str, output: BaseModel) -> None:
+    """Cache a generation's output for this input."""
+    if not generation_cache.enabled:
+        return
+    key = generation_cache_key(chain_name, formatted_responses)
+    generation_cache.set(key, chain_name, output.model_dump_json())
+
+
+async def astore_generation(chain_name: str, formatted_responses: str, output: BaseModel) -> None:
+    """Async version of store_generation."""
+    if not generation_cache.enabled:
+        return
+    key = generation_cache_key(chain_name, formatted_responses)
+    await generation_cache.aset(key, chain_name, output.model_dump_json())
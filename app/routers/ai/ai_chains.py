@@ -2,18 +2,35 @@
 
 import os
 from langchain_openai import ChatOpenAI
+from app.metrics import LLMMetricsHandler
 from .ai_prompts import summary_prompt, full_plan_prompt
 from .ai_models import SummaryOutput, FullPlanOutput
 
-# Initialize OpenAI model with configuration
+# Model configuration, also part of the generation cache key
+MODEL_CONFIG = {
+    "temperature": 0.2,
+    "model": "gpt-4.1",
+    "max_tokens": 5000,
+}
+
+# Initialize OpenAI model with configuration. The metrics handler records
+# call latency and token usage; stream_usage asks for usage on streamed calls too.
 openai_api_key = os.getenv("OPENAI_API_KEY")
 model = ChatOpenAI(
-    temperature=0.2,
-    model="gpt-4.1",
-    max_tokens=5000,
-    api_key=openai_api_key
+    **MODEL_CONFIG,
+    api_key=openai_api_key,
+    stream_usage=True,
+    callbacks=[LLMMetricsHandler(MODEL_CONFIG["model"])]
 )
 
 # Create complete chains with structured output using Pydantic models
 summary_chain = summary_prompt | model.with_structured_output(SummaryOutput)
 full_plan_chain = full_plan_prompt | model.with_structured_output(FullPlanOutput)
+
+# Streaming variant of the full plan chain. Binding the JSON schema (rather than
+# the Pydantic class) parses with a JsonOutputParser, which yields the partially
+# built plan dict as tokens arrive instead of one object at the end.
+full_plan_stream_chain = full_plan_prompt | model.with_structured_output(
+    FullPlanOutput.model_json_schema(),
+    method="json_schema"
+)
@@ -1,11 +1,22 @@
-from typing import List, Dict, Optional, Tuple
+import logging
+from typing import Any, AsyncIterator, List, Dict, Optional, Tuple, Union
+import os
 import json
+import asyncio
 from langsmith import traceable
 from app.models import User, FormResponse
 from app.prompts import get_question_text, get_zodiac_sign
 
 from .ai_models import SummaryOutput, FullPlanOutput
-from .ai_chains import summary_chain, full_plan_chain
+from .ai_chains import summary_chain, full_plan_chain, full_plan_stream_chain
+from .ai_cache import get_cached_generation, aget_cached_generation, store_generation, astore_generation
+from .ai_usage import ChainUsage, record_cache_hit, track_chain_call
+
+logger = logging.getLogger(__name__)
+
+# Per-branch timeouts (seconds) for the summary / full plan fan-out in agenerate_plan
+SUMMARY_TIMEOUT = float(os.getenv("SUMMARY_GENERATION_TIMEOUT", "60"))
+FULL_PLAN_TIMEOUT = float(os.getenv("FULL_PLAN_GENERATION_TIMEOUT", "120"))
 
 def format_responses(user: User, zodiac_info: Dict[str, str], responses: List[FormResponse]) -> str:
     """
@@ -29,8 +40,44 @@ def format_responses(user: User, zodiac_info: Dict[str, str], responses: List[Fo
     
     return formatted_responses
 
+def _invoke_cached(chain, chain_name: str, output_model, formatted_responses: str, refresh: bool = False):
+    """
+    Invoke a chain unless the generation cache already has its output, recording its usage.
+    
+    With ``refresh`` (an explicit regeneration) the cache isn't read, only
+    updated with the new output.
+    """
+    if not refresh:
+        cached = get_cached_generation(chain_name, formatted_responses, output_model)
+        if cached is not None:
+            record_cache_hit(chain_name)
+            return cached
+    
+    with track_chain_call(chain_name) as config:
+        output = chain.invoke({"responses": formatted_responses}, config=config)
+    store_generation(chain_name, formatted_responses, output)
+    return output
+
+async def _ainvoke_cached(chain, chain_name: str, output_model, formatted_responses: str, refresh: bool = False):
+    """Async version of _invoke_cached."""
+    if not refresh:
+        cached = await aget_cached_generation(chain_name, formatted_responses, output_model)
+        if cached is not None:
+            record_cache_hit(chain_name)
+            return cached
+    
+    with track_chain_call(chain_name) as config:
+        output = await chain.ainvoke({"responses": formatted_responses}, config=config)
+    await astore_generation(chain_name, formatted_responses, output)
+    return output
+
 @traceable
-def generate_purpose(user: User, zodiac_info: Dict[str, str], responses: List[FormResponse]) -> SummaryOutput:
+def generate_purpose(
+    user: User, 
+    zodiac_info: Dict[str, str], 
+    responses: List[FormResponse], 
+    refresh: bool = False
+) -> SummaryOutput:
     """
     Generate basic results (purpose and mantra) based on user responses.
     This function is traced in LangSmith for observability.
@@ -39,6 +86,7 @@ def generate_purpose(user: User, zodiac_info: Dict[str, str], responses: List[Fo
         user: User object containing name and other user data
         zodiac_info: Dictionary containing zodiac sign information
         responses: List of FormResponse objects for the first 5 questions
+        refresh: Regenerating an existing plan, so don't reuse a cached one
         
     Returns:
         SummaryOutput object containing purpose and mantra
@@ -47,7 +95,7 @@ def generate_purpose(user: User, zodiac_info: Dict[str, str], responses: List[Fo
     formatted_responses = format_responses(user, zodiac_info, responses)
     
     # Use the pre-built chain from ai_chains module
-    summary_output = summary_chain.invoke({"responses": formatted_responses})
+    summary_output = _invoke_cached(summary_chain, "summary", SummaryOutput, formatted_responses, refresh)
     
     return summary_output
 
@@ -56,34 +104,176 @@ def generate_plan(
     user: User, 
     zodiac_info: Dict[str, str], 
     responses: List[FormResponse], 
-    existing_basic_plan: Optional[str] = None
+    existing_basic_plan: Optional[str] = None,
+    refresh: bool = False
 ) -> Tuple[str, FullPlanOutput]:
     """
     Generate premium results (full plan) based on user responses.
-    This function is traced in LangSmith for observability.
+    Sync wrapper around agenerate_plan, so it can't be called from a running event loop.
     
     Args:
         user: User object containing name and other user data
         zodiac_info: Dictionary containing zodiac sign information
         responses: List of FormResponse objects for all 25 questions
         existing_basic_plan: Optional existing basic plan JSON string
+        refresh: Regenerating an existing full plan, so don't reuse a cached one
         
     Returns:
         Tuple of (basic_plan_json, full_plan_output) where:
             - basic_plan_json is the JSON string of the basic plan
             - full_plan_output is the FullPlanOutput object
     """
-    # Format responses for the prompt
+    return asyncio.run(agenerate_plan(user, zodiac_info, responses, existing_basic_plan, refresh))
+
+def _combine_plan_branches(
+    summary_result: Union[SummaryOutput, BaseException],
+    full_plan_result: Union[FullPlanOutput, BaseException]
+) -> Tuple[str, FullPlanOutput]:
+    """
+    Combine the outcomes of the summary and full plan branches.
+    
+    The full plan is required, so its failure is raised. A failed summary is
+    not fatal: the full plan carries its own mantra and purpose, which are
+    used as the basic plan instead.
+    
+    Returns:
+        Tuple of (basic_plan_json, full_plan_output)
+    """
+    if isinstance(full_plan_result, BaseException):
+        if isinstance(full_plan_result, asyncio.TimeoutError):
+            raise TimeoutError(f"Full plan generation timed out after {FULL_PLAN_TIMEOUT:.0f}s") from full_plan_result
+        raise full_plan_result
+    
+    if isinstance(summary_result, BaseException):
+        logger.warning("Summary generation failed, using mantra and purpose from the full plan: %r", summary_result)
+        summary_result = SummaryOutput(mantra=full_plan_result.mantra, purpose=full_plan_result.purpose)
+    
+    return json.dumps(summary_result.model_dump()), full_plan_result
+
+@traceable
+async def agenerate_purpose(
+    user: User, 
+    zodiac_info: Dict[str, str], 
+    responses: List[FormResponse], 
+    refresh: bool = False
+) -> SummaryOutput:
+    """
+    Async version of generate_purpose.
+    
+    Uses ``ainvoke`` so the OpenAI call does not block the event loop while
+    the model is generating.
+    
+    Args:
+        user: User object containing name and other user data
+        zodiac_info: Dictionary containing zodiac sign information
+        responses: List of FormResponse objects for the first 5 questions
+        refresh: Regenerating an existing plan, so don't reuse a cached one
+        
+    Returns:
+        SummaryOutput object containing purpose and mantra
+    """
     formatted_responses = format_responses(user, zodiac_info, responses)
     
-    # If no existing basic plan, generate one using the pre-built chain
-    if not existing_basic_plan:
-        summary_output = summary_chain.invoke({"responses": formatted_responses})
-        basic_plan_json = json.dumps(summary_output.model_dump())
-    else:
-        basic_plan_json = existing_basic_plan
+    return await _ainvoke_cached(summary_chain, "summary", SummaryOutput, formatted_responses, refresh)
 
-    # Generate full plan using the pre-built chain
-    full_plan_output = full_plan_chain.invoke({"responses": formatted_responses})
+@traceable
+async def agenerate_plan(
+    user: User, 
+    zodiac_info: Dict[str, str], 
+    responses: List[FormResponse], 
+    existing_basic_plan: Optional[str] = None,
+    refresh: bool = False
+) -> Tuple[str, FullPlanOutput]:
+    """
+    Generate premium results (full plan) based on user responses.
+    
+    Args:
+        user: User object containing name and other user data
+        zodiac_info: Dictionary containing zodiac sign information
+        responses: List of FormResponse objects for all 25 questions
+        existing_basic_plan: Optional existing basic plan JSON string
+        refresh: Regenerating an existing full plan, so don't reuse a cached one
+        
+    Returns:
+        Tuple of (basic_plan_json, full_plan_output)
+    """
+    formatted_responses = format_responses(user, zodiac_info, responses)
+    
+    full_plan_call = _ainvoke_cached(full_plan_chain, "full_plan", FullPlanOutput, formatted_responses, refresh)
+    
+    if existing_basic_plan:
+        full_plan_output = await asyncio.wait_for(full_plan_call, FULL_PLAN_TIMEOUT)
+        return existing_basic_plan, full_plan_output
+    
+    # Fan out: latency is that of the slower chain rather than the sum of both
+    summary_result, full_plan_result = await asyncio.gather(
+        asyncio.wait_for(_ainvoke_cached(summary_chain, "summary", SummaryOutput, formatted_responses), SUMMARY_TIMEOUT),
+        asyncio.wait_for(full_plan_call, FULL_PLAN_TIMEOUT),
+        return_exceptions=True
+    )
+    
+    return _combine_plan_branches(summary_result, full_plan_result)
+
+async def astream_plan_sections(
+    user: User, 
+    zodiac_info: Dict[str, str], 
+    responses: List[FormResponse],
+    usage: Optional[List[ChainUsage]] = None,
+    refresh: bool = False
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Stream the full plan one top-level section at a time.
+    
+    The model writes the plan's JSON object key by key, so a section is
+    complete as soon as the next key appears. Each section is yielded once,
+    as ``(section_name, value)``, in the order the model produced them.
+    
+    Args:
+        user: User object containing name and other user data
+        zodiac_info: Dictionary containing zodiac sign information
+        responses: List of FormResponse objects for all 25 questions
+        usage: List to record the stream's token usage into. A generator
+            runs in its consumer's context, so collect_usage can't be relied on.
+        refresh: Regenerating an existing full plan, so don't reuse a cached one
+        
+    Yields:
+        Tuples of (section name, section value)
+    """
+    formatted_responses = format_responses(user, zodiac_info, responses)
+    
+    # A cached plan is already complete, so every section can go out at once
+    cached = None if refresh else await aget_cached_generation("full_plan", formatted_responses, FullPlanOutput)
+    if cached is not None:
+        record_cache_hit("full_plan", usage)
+        for section, value in cached.model_dump().items():
+            yield section, value
+        return
+    
+    emitted = set()
+    latest: Dict[str, Any] = {}
+    
+    # Usage is only recorded if the stream runs to the end
+    with track_chain_call("full_plan", usage) as config:
+        async for partial in full_plan_stream_chain.astream({"responses": formatted_responses}, config=config):
+            if not isinstance(partial, dict):
+                continue
+            latest = partial
+            
+            # Every key before the last one is finished
+            for section in list(partial)[:-1]:
+                if section not in emitted:
+                    emitted.add(section)
+                    yield section, partial[section]
+    
+    # The stream has ended, so whatever is left is finished too
+    for section, value in latest.items():
+        if section not in emitted:
+            emitted.add(section)
+            yield section, value
     
-    return basic_plan_json, full_plan_output
+    try:
+        full_plan_output = FullPlanOutput.model_validate(latest)
+    except ValueError:
+        # Leave validation errors to the caller, which has the full context
+        return
+    await astore_generation("full_plan", formatted_responses, full_plan_output)
@@ -0,0 +1,117 @@
+"""
+Background worker for result generation jobs.
+
+Jobs are enqueued by the HTTP layer, which returns the job id immediately.
+Each job runs as an asyncio task on the worker's event loop, and a semaphore
+caps how many LLM generations a single worker runs at once. A restart or
+deploy loses those tasks, so on startup ``fail_orphaned_jobs`` marks jobs
+that can no longer be live as failed, instead of leaving pollers waiting.
+"""
+
+import logging
+import os
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Set
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import Session
+
+from .ai_service import run_basic_generation, run_premium_generation
+from .ai_storage import create_generation_job, fail_stale_jobs, mark_job_running, mark_job_finished
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of generations running at once on this worker
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("MAX_CONCURRENT_GENERATIONS", "4"))
+
+# Age past which a queued or running job can't still belong to a live worker.
+# Other instances may be running jobs while this one starts, so the startup
+# sweep leaves anything younger alone.
+STALE_JOB_SECONDS = float(os.getenv("GENERATION_JOB_STALE_SECONDS", "900"))
+
+GENERATORS = {
+    "basic": run_basic_generation,
+    "premium": run_premium_generation,
+}
+
+# Semaphores are bound to the event loop they are first used on
+_slots: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+
+# Keep references to running tasks so they aren't garbage collected mid-flight
+_tasks: Set[asyncio.Task] = set()
+
+
+def _generation_slots() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    if loop not in _slots:
+        _slots[loop] = asyncio.Semaphore(MAX_CONCURRENT_GENERATIONS)
+    return _slots[loop]
+
+
+async def enqueue_generation(
+    session_factory: Callable[[], Session],
+    user_id: uuid.UUID,
+    tier: str
+) -> uuid.UUID:
+    """
+    Record a queued job and schedule it on the worker pool.
+
+    Args:
+        session_factory: Callable returning a new database session
+        user_id: ID of the user to generate results for
+        tier: "basic" or "premium"
+
+    Returns:
+        The id of the new job
+    """
+    def create_job():
+        with session_factory() as session:
+            return create_generation_job(session, user_id, tier).id
+
+    job_id = await run_in_threadpool(create_job)
+
+    task = asyncio.create_task(run_generation_job(session_factory, job_id, user_id, tier))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+    return job_id
+
+
+async def run_generation_job(
+    session_factory: Callable[[], Session],
+    job_id: uuid.UUID,
+    user_id: uuid.UUID,
+    tier: str
+) -> None:
+    """Run a queued job once a generation slot is free, recording its outcome."""
+    async with _generation_slots():
+        # Each step uses its own short session so no connection is held
+        # while the generation waits on the LLM
+        def run_step(step, *args):
+            with session_factory() as session:
+                step(session, *args)
+
+        await run_in_threadpool(run_step, mark_job_running, job_id)
+
+        error = None
+        try:
+            await GENERATORS[tier](session_factory, user_id)
+        except HTTPException as e:
+            error = str(e.detail)
+        except Exception as e:
+            error = f"Error generating {tier} results: {str(e)}"
+            logger.warning("Generation job %s failed: %s", job_id, error)
+
+        await run_in_threadpool(run_step, mark_job_finished, job_id, error)
+
+
+def fail_orphaned_jobs(session_factory: Callable[[], Session]) -> int:
+    """Mark queued or running jobs older than STALE_JOB_SECONDS as failed; called on startup."""
+    cutoff = datetime.utcnow() - timedelta(seconds=STALE_JOB_SECONDS)
+    with session_factory() as session:
+        failed = fail_stale_jobs(session, cutoff, "Generation was interrupted by a server restart, please try again")
+    if failed:
+        logger.warning("Marked %d interrupted generation job(s) as failed", failed)
+    return failed
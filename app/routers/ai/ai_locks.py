@@ -0,0 +1,111 @@
+"""
+Coalescing for concurrent generations of the same user.
+
+The frontend can ask for the same generation twice at once (background and
+foreground requests, double clicks). Two layers make sure only one LLM call
+runs for a given (tier, user):
+
+- ``single_flight`` shares one in-flight task between concurrent callers in
+  the same worker, so every caller gets the same result.
+- ``generation_lock`` takes a PostgreSQL advisory lock so generations in
+  other uvicorn workers wait for the current one instead of racing it. On
+  other databases it is a no-op. The lock's connection is opened outside
+  the request pool, so generations in progress don't use up pool slots.
+"""
+
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from starlette.concurrency import run_in_threadpool
+from app.models import build_engine
+
+# Seconds between attempts to take a lock held by another worker
+LOCK_POLL_INTERVAL = 0.5
+
+_inflight: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Task] = {}
+
+# Unpooled engines for lock connections, by database URL
+_lock_engines: Dict[str, Engine] = {}
+
+
+async def single_flight(key: Hashable, make_call: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Run ``make_call()`` once per key, sharing the result with concurrent callers.
+
+    A caller that is cancelled (e.g. its client disconnected) stops waiting
+    but does not cancel the shared call for everyone else.
+    """
+    flight_key = (asyncio.get_running_loop(), key)
+
+    task = _inflight.get(flight_key)
+    if task is None:
+        task = asyncio.ensure_future(make_call())
+        _inflight[flight_key] = task
+        task.add_done_callback(lambda _: _inflight.pop(flight_key, None))
+
+    return await asyncio.shield(task)
+
+
+def in_flight(key: Hashable) -> Optional[asyncio.Task]:
+    """The shared call running for ``key`` in this worker, if any."""
+    return _inflight.get((asyncio.get_running_loop(), key))
+
+
+def advisory_lock_id(key: str) -> int:
+    """Map a lock name onto PostgreSQL's signed 64-bit advisory lock space."""
+    digest = hashlib.sha256(key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def _lock_engine(bind: Engine) -> Engine:
+    url = bind.url.render_as_string(hide_password=False)
+    if url not in _lock_engines:
+        _lock_engines[url] = build_engine(url, pooled=False)
+    return _lock_engines[url]
+
+
+def _try_lock(conn: Connection, lock_id: int) -> bool:
+    acquired = conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": lock_id}).scalar()
+    # Session-level locks outlive the transaction; don't sit idle in one
+    conn.commit()
+    return bool(acquired)
+
+
+def _unlock(conn: Connection, lock_id: int) -> None:
+    conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": lock_id})
+    conn.commit()
+
+
+@asynccontextmanager
+async def generation_lock(bind: Engine, key: str) -> AsyncIterator[bool]:
+    """
+    Hold a cross-worker lock for ``key`` while the block runs.
+
+    Yields True if another worker held the lock when we asked for it, in which
+    case the caller should check whether that worker already did the work.
+    """
+    if bind.dialect.name != "postgresql":
+        yield False
+        return
+
+    lock_id = advisory_lock_id(key)
+
+    # The lock belongs to this connection, which is held for the whole
+    # generation, so it comes from an unpooled engine rather than the request
+    # pool. If the worker dies, PostgreSQL drops the lock with the connection.
+    conn = await run_in_threadpool(_lock_engine(bind).connect)
+    try:
+        waited = False
+        while not await run_in_threadpool(_try_lock, conn, lock_id):
+            waited = True
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+        try:
+            yield waited
+        finally:
+            await run_in_threadpool(_unlock, conn, lock_id)
+    finally:
+        await run_in_threadpool(conn.close)
@@ -2,6 +2,9 @@
 
 from langchain_core.prompts import ChatPromptTemplate
 
+# Bump whenever the prompts below change so cached generations are not reused
+PROMPT_VERSION = "1"
+
 # Define the system prompt
 system_prompt = """You are here to listen to the user's story, think deeply about it, and then give them purpose and agency and an empirical path to follow.
 
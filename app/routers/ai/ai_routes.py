@@ -1,192 +1,187 @@
-from typing import Dict
+import logging
+from typing import Callable, Dict
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlmodel import Session, select
-from app.models import User, FormResponse, Result, get_session
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlmodel import Session
+from app.models import GenerationJob, get_session, get_session_factory
 import uuid
 import json
-from datetime import datetime
-from app.prompts import get_zodiac_sign
 
-from .ai_generation import generate_purpose, generate_plan
+from .ai_service import run_basic_generation, run_premium_generation, stream_premium_generation
+from .ai_storage import load_generation_inputs
+from .ai_jobs import enqueue_generation
+from .ai_cache import generation_cache
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 @router.post("/{user_id}/generate-basic", response_model=Dict)
 async def generate_basic_results(
-    user_id: uuid.UUID, 
+    user_id: uuid.UUID,
     request: Request,
-    session: Session = Depends(get_session)
+    session_factory: Callable[[], Session] = Depends(get_session_factory)
 ):
     """Generate basic results (summary and mantra) after answering the first 5 questions"""
-    # Check if user exists
-    user = session.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Get responses for this user
-    statement = select(FormResponse).where(FormResponse.user_id == user_id).order_by(FormResponse.question_number)
-    responses = session.exec(statement).all()
-    
-    # Check if user has answered at least 5 questions
-    if not responses or len(responses) < 5:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Incomplete responses. {len(responses)}/5 questions answered for basic results."
-        )
-    
-    # Only use the first 5 questions for basic results
-    first_five_responses = [r for r in responses if r.question_number <= 5]
-    
-    # Get user's zodiac sign
-    zodiac_info = get_zodiac_sign(user.dob)
-    
     try:
-        # Generate purpose using the traceable function
-        summary_output = generate_purpose(user, zodiac_info, first_five_responses)
-        
-        # Convert to JSON string for storage
-        basic_plan_json = json.dumps(summary_output.model_dump())
-        
-        # Create or update result in database
-        existing_result = session.exec(select(Result).where(Result.user_id == user_id)).first()
-        
-        if existing_result:
-            # Update existing result
-            existing_result.basic_plan = basic_plan_json
-            existing_result.last_generated_at = datetime.utcnow()
-            # Increment regeneration count if this is not the first generation
-            if existing_result.basic_plan:
-                existing_result.regeneration_count += 1
-            session.add(existing_result)
-        else:
-            # Create new result with empty full_plan
-            new_result = Result(
-                user_id=user_id,
-                basic_plan=basic_plan_json,
-                full_plan="",  # Empty full plan until premium tier
-                last_generated_at=datetime.utcnow()
-            )
-            session.add(new_result)
-        
-        session.commit()
-        
-        # Update user payment tier if not already set
-        if user.payment_tier == "none":
-            user.payment_tier = "basic"
-            session.add(user)
-            session.commit()
-        
-        # Check if this is a background request and pass the header back in the response
-        is_background = request.headers.get('X-Background-Request') == 'true'
-        
-        response_data = {
-            "success": True,
-            "summary": summary_output.model_dump(),
-            "message": "Basic results generated successfully"
-        }
-        
-        # Create a Response object to be able to set headers
-        from fastapi.responses import JSONResponse
-        response = JSONResponse(content=response_data)
-        
-        # If this is a background request, set the header in the response
-        if is_background:
-            response.headers['X-Background-Request'] = 'true'
-        
-        return response
-    
+        summary_output = await run_basic_generation(session_factory, user_id)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error generating basic results: {str(e)}"
         )
 
+    response_data = {
+        "success": True,
+        "summary": summary_output.model_dump(),
+        "message": "Basic results generated successfully"
+    }
+
+    response = JSONResponse(content=response_data)
+
+    # If this is a background request, pass the header back in the response
+    if request.headers.get('X-Background-Request') == 'true':
+        response.headers['X-Background-Request'] = 'true'
+
+    return response
+
 @router.post("/{user_id}/generate-premium", response_model=Dict)
 async def generate_premium_results(
-    user_id: uuid.UUID, 
+    user_id: uuid.UUID,
     request: Request,
-    session: Session = Depends(get_session)
+    session_factory: Callable[[], Session] = Depends(get_session_factory)
 ):
     """Generate premium results (full path and plan) after answering all 25 questions"""
-    # Check if user exists
-    user = session.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Check if user has premium access (handles canceled subscriptions properly)
-    from app.routers.payments.payment_utils import has_premium_access
-    if not has_premium_access(user):
-        raise HTTPException(
-            status_code=403,
-            detail="Premium or Pursuit tier required to generate full results"
-        )
-    
-    # Get all responses for this user
-    statement = select(FormResponse).where(FormResponse.user_id == user_id).order_by(FormResponse.question_number)
-    responses = session.exec(statement).all()
-    
-    # Check if user has answered all 25 questions
-    if not responses or len(responses) < 25:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Incomplete responses. {len(responses)}/25 questions answered for premium results."
-        )
-    
-    # Get user's zodiac sign
-    zodiac_info = get_zodiac_sign(user.dob)
-    
     try:
-        # Get existing result to preserve basic plan
-        existing_result = session.exec(select(Result).where(Result.user_id == user_id)).first()
-        existing_basic_plan = existing_result.basic_plan if existing_result else None
-        
-        # Generate plan using the traceable function
-        basic_plan_json, full_plan_output = generate_plan(user, zodiac_info, responses, existing_basic_plan)
-        
-        # Convert to JSON string for storage
-        full_plan_json = json.dumps(full_plan_output.model_dump())
-        
-        # Create or update result in database
-        if existing_result:
-            # Update existing result
-            existing_result.full_plan = full_plan_json
-            existing_result.last_generated_at = datetime.utcnow()
-            # Increment regeneration count if this is not the first generation
-            if existing_result.full_plan:
-                existing_result.regeneration_count += 1
-            session.add(existing_result)
-        else:
-            # Create new result
-            new_result = Result(
-                user_id=user_id,
-                basic_plan=basic_plan_json,
-                full_plan=full_plan_json,
-                last_generated_at=datetime.utcnow()
-            )
-            session.add(new_result)
-        
-        session.commit()
-        
-        # Check if this is a background request and pass the header back in the response
-        is_background = request.headers.get('X-Background-Request') == 'true'
-        
-        response_data = {
-            "success": True,
-            "message": "Premium results generated successfully"
-        }
-        
-        # Create a Response object to be able to set headers
-        from fastapi.responses import JSONResponse
-        response = JSONResponse(content=response_data)
-        
-        # If this is a background request, set the header in the response
-        if is_background:
-            response.headers['X-Background-Request'] = 'true'
-        
-        return response
-    
+        await run_premium_generation(session_factory, user_id)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error generating premium results: {str(e)}"
         )
+
+    response_data = {
+        "success": True,
+        "message": "Premium results generated successfully"
+    }
+
+    response = JSONResponse(content=response_data)
+
+    # If this is a background request, pass the header back in the response
+    if request.headers.get('X-Background-Request') == 'true':
+        response.headers['X-Background-Request'] = 'true'
+
+    return response
+
+@router.post("/{user_id}/generate-premium/stream")
+async def stream_premium_results(
+    user_id: uuid.UUID,
+    session_factory: Callable[[], Session] = Depends(get_session_factory)
+):
+    """
+    Generate premium results as a Server-Sent Events stream.
+
+    Emits a ``section`` event as each part of the plan (mantra, purpose,
+    next_steps, ...) is finished, then ``done`` once the plan is saved, or
+    ``error`` if generation fails part way through.
+    """
+    # Validate before the stream starts so errors still get a proper status code
+    def load():
+        with session_factory() as session:
+            user, responses, existing_result = load_generation_inputs(session, user_id, 25, "premium", True)
+            if not existing_result:
+                return user, responses, None, False
+            return user, responses, existing_result.basic_plan, bool(existing_result.full_plan)
+
+    user, responses, existing_basic_plan, refresh = await run_in_threadpool(load)
+
+    def sse(event: str, data: Dict) -> str:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    async def event_stream():
+        try:
+            async for event, data in stream_premium_generation(session_factory, user, responses, existing_basic_plan, refresh):
+                yield sse(event, data)
+        except Exception as e:
+            logger.error("Error streaming premium results for user %s: %s", user_id, e)
+            yield sse("error", {"detail": f"Error generating premium results: {str(e)}"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop nginx-style proxies from buffering the stream
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@router.post("/{user_id}/generation-jobs", status_code=202, response_model=Dict)
+async def create_generation_job(
+    user_id: uuid.UUID,
+    tier: str = "premium",
+    session_factory: Callable[[], Session] = Depends(get_session_factory)
+):
+    """
+    Enqueue a basic or premium generation and return the job id right away.
+
+    Poll GET /api/ai/jobs/{job_id} for the outcome.
+    """
+    if tier not in ("basic", "premium"):
+        raise HTTPException(status_code=400, detail="Invalid tier. Must be 'basic' or 'premium'")
+
+    # Reject users that can't be generated for yet before queueing anything
+    def validate():
+        with session_factory() as session:
+            if tier == "basic":
+                load_generation_inputs(session, user_id, 5, "basic")
+            else:
+                load_generation_inputs(session, user_id, 25, "premium", True)
+
+    await run_in_threadpool(validate)
+
+    job_id = await enqueue_generation(session_factory, user_id, tier)
+
+    return {
+        "job_id": str(job_id),
+        "status": "queued",
+        "status_url": f"/api/ai/jobs/{job_id}"
+    }
+
+@router.get("/jobs/{job_id}", response_model=Dict)
+def get_generation_job(job_id: uuid.UUID, session: Session = Depends(get_session)):
+    """Report the state and timings of a generation job"""
+    job = session.get(GenerationJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    queued_seconds = None
+    if job.started_at:
+        queued_seconds = (job.started_at - job.created_at).total_seconds()
+
+    run_seconds = None
+    if job.started_at and job.finished_at:
+        run_seconds = (job.finished_at - job.started_at).total_seconds()
+
+    return {
+        "job_id": str(job.id),
+        "user_id": str(job.user_id),
+        "tier": job.tier,
+        "status": job.status,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "queued_seconds": queued_seconds,
+        "run_seconds": run_seconds
+    }
+
+@router.get("/cache/stats", response_model=Dict)
+def get_generation_cache_stats():
+    """Report generation cache hits and misses for this worker"""
+    return generation_cache.stats()
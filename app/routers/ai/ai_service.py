@@ -0,0 +1,245 @@
+"""Generation workflows shared by the HTTP routes and the background job worker."""
+
+import uuid
+import json
+import asyncio
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+from app.models import User, FormResponse
+from app.prompts import get_zodiac_sign
+
+from .ai_models import SummaryOutput, FullPlanOutput
+from .ai_generation import (
+    agenerate_purpose,
+    agenerate_plan,
+    astream_plan_sections,
+    _combine_plan_branches,
+    SUMMARY_TIMEOUT,
+)
+from .ai_storage import load_generation_inputs, load_plan_generated_since, save_basic_plan, save_full_plan
+from .ai_usage import ChainUsage, collect_usage
+from .ai_locks import single_flight, generation_lock, in_flight
+
+
+# Generations run in three phases so no pooled connection is held while the
+# LLM is working (10-40 s): a read phase and a write phase, each with its own
+# short-lived session, around an LLM phase that doesn't touch the database.
+# The token usage collected in the LLM phase is stored with the plan.
+
+
+async def _run_with_session(session_factory: Callable[[], Session], fn: Callable[..., Any], *args: Any) -> Any:
+    """Run a storage helper in the threadpool with a session that closes straight after."""
+    def run():
+        with session_factory() as session:
+            return fn(session, *args)
+
+    return await run_in_threadpool(run)
+
+
+def _bind(session_factory: Callable[[], Session]) -> Engine:
+    # Creating a session doesn't check out a connection until it's used
+    with session_factory() as session:
+        return session.get_bind()
+
+
+async def run_basic_generation(session_factory: Callable[[], Session], user_id: uuid.UUID) -> SummaryOutput:
+    """
+    Load the user's first 5 answers, generate the basic plan and store it.
+
+    Concurrent calls for the same user share a single generation.
+
+    Raises HTTPException (404/400) if the user can't be generated for yet;
+    any other exception comes from the LLM call or the write.
+    """
+    return await single_flight(("basic", user_id), lambda: _generate_basic(session_factory, user_id))
+
+
+async def _generate_basic(session_factory: Callable[[], Session], user_id: uuid.UUID) -> SummaryOutput:
+    requested_at = datetime.utcnow()
+
+    async with generation_lock(_bind(session_factory), f"basic:{user_id}") as waited:
+        # Another worker generated while we waited for the lock; reuse its plan
+        if waited:
+            recent_plan = await _run_with_session(session_factory, load_plan_generated_since, user_id, "basic_plan", requested_at)
+            if recent_plan:
+                return SummaryOutput.model_validate_json(recent_plan)
+
+        return await _generate_basic_unlocked(session_factory, user_id)
+
+
+async def _generate_basic_unlocked(session_factory: Callable[[], Session], user_id: uuid.UUID) -> SummaryOutput:
+    # Read phase
+    user, responses, existing_result = await _run_with_session(session_factory, load_generation_inputs, user_id, 5, "basic")
+
+    # Only use the first 5 questions for basic results
+    first_five_responses = [r for r in responses if r.question_number <= 5]
+
+    # Get user's zodiac sign
+    zodiac_info = get_zodiac_sign(user.dob)
+
+    # Regenerating, so a cached plan would just be the one the user has
+    refresh = bool(existing_result and existing_result.basic_plan)
+
+    # LLM phase, no connection held
+    with collect_usage() as usage:
+        summary_output = await agenerate_purpose(user, zodiac_info, first_five_responses, refresh)
+
+    # Write phase; convert to JSON string for storage
+    basic_plan_json = json.dumps(summary_output.model_dump())
+    await _run_with_session(session_factory, save_basic_plan, user, basic_plan_json, usage)
+
+    return summary_output
+
+
+async def run_premium_generation(session_factory: Callable[[], Session], user_id: uuid.UUID) -> FullPlanOutput:
+    """
+    Load all 25 answers, generate the full plan (and basic plan if missing) and store it.
+
+    Concurrent calls for the same user share a single generation.
+
+    Raises HTTPException (404/403/400) if the user can't be generated for yet;
+    any other exception comes from the LLM call or the write.
+    """
+    return await single_flight(("premium", user_id), lambda: _generate_premium(session_factory, user_id))
+
+
+async def _generate_premium(session_factory: Callable[[], Session], user_id: uuid.UUID) -> FullPlanOutput:
+    requested_at = datetime.utcnow()
+
+    async with generation_lock(_bind(session_factory), f"premium:{user_id}") as waited:
+        # Another worker generated while we waited for the lock; reuse its plan
+        if waited:
+            recent_plan = await _run_with_session(session_factory, load_plan_generated_since, user_id, "full_plan", requested_at)
+            if recent_plan:
+                return FullPlanOutput.model_validate_json(recent_plan)
+
+        return await _generate_premium_unlocked(session_factory, user_id)
+
+
+async def _generate_premium_unlocked(session_factory: Callable[[], Session], user_id: uuid.UUID) -> FullPlanOutput:
+    # Read phase
+    user, responses, existing_result = await _run_with_session(
+        session_factory, load_generation_inputs, user_id, 25, "premium", True
+    )
+
+    # Get user's zodiac sign
+    zodiac_info = get_zodiac_sign(user.dob)
+
+    # Preserve the existing basic plan if there is one
+    existing_basic_plan = existing_result.basic_plan if existing_result else None
+    refresh = bool(existing_result and existing_result.full_plan)
+
+    # LLM phase, no connection held
+    with collect_usage() as usage:
+        basic_plan_json, full_plan_output = await agenerate_plan(user, zodiac_info, responses, existing_basic_plan, refresh)
+
+    # Write phase; convert to JSON string for storage
+    full_plan_json = json.dumps(full_plan_output.model_dump())
+    await _run_with_session(session_factory, save_full_plan, user_id, basic_plan_json, full_plan_json, usage)
+
+    return full_plan_output
+
+
+async def stream_premium_generation(
+    session_factory: Callable[[], Session],
+    user: User,
+    responses: List[FormResponse],
+    existing_basic_plan: Optional[str],
+    refresh: bool = False
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Generate the full plan section by section, then store it.
+
+    Yields ``("section", {"section": name, "value": value})`` for each finished
+    section and ``("done", {...})`` once the plan has been validated and saved.
+    Inputs must already be loaded and checked with ``load_generation_inputs``;
+    ``refresh`` says the user already has a full plan, so none is reused from
+    the generation cache.
+
+    Holds the same lock as ``run_premium_generation``; if another premium
+    generation for the user finishes first, its plan is streamed instead.
+    """
+    requested_at = datetime.utcnow()
+
+    # A premium generation already running in this worker: share its plan
+    shared = in_flight(("premium", user.id))
+    if shared is not None:
+        async for event in _stream_existing_plan(await asyncio.shield(shared)):
+            yield event
+        return
+
+    async with generation_lock(_bind(session_factory), f"premium:{user.id}") as waited:
+        # Another worker generated while we waited for the lock; reuse its plan
+        if waited:
+            recent_plan = await _run_with_session(session_factory, load_plan_generated_since, user.id, "full_plan", requested_at)
+            if recent_plan:
+                async for event in _stream_existing_plan(FullPlanOutput.model_validate_json(recent_plan)):
+                    yield event
+                return
+
+        async for event in _stream_premium_unlocked(session_factory, user, responses, existing_basic_plan, refresh):
+            yield event
+
+
+async def _stream_existing_plan(full_plan_output: FullPlanOutput) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    for section, value in full_plan_output.model_dump().items():
+        yield "section", {"section": section, "value": value}
+
+    yield "done", {
+        "success": True,
+        "message": "Premium results generated successfully"
+    }
+
+
+async def _stream_premium_unlocked(
+    session_factory: Callable[[], Session],
+    user: User,
+    responses: List[FormResponse],
+    existing_basic_plan: Optional[str],
+    refresh: bool
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    zodiac_info = get_zodiac_sign(user.dob)
+    usage: List[ChainUsage] = []
+
+    # Generate the basic plan alongside the stream when there isn't one yet
+    summary_task = None
+    if not existing_basic_plan:
+        summary_task = asyncio.create_task(
+            _collecting_usage(usage, asyncio.wait_for(agenerate_purpose(user, zodiac_info, responses), SUMMARY_TIMEOUT))
+        )
+
+    try:
+        sections = {}
+        async for section, value in astream_plan_sections(user, zodiac_info, responses, usage, refresh):
+            sections[section] = value
+            yield "section", {"section": section, "value": value}
+
+        full_plan_output = FullPlanOutput.model_validate(sections)
+
+        if summary_task:
+            summary_result = (await asyncio.gather(summary_task, return_exceptions=True))[0]
+            basic_plan_json, full_plan_output = _combine_plan_branches(summary_result, full_plan_output)
+        else:
+            basic_plan_json = existing_basic_plan
+
+        full_plan_json = json.dumps(full_plan_output.model_dump())
+
+        await _run_with_session(session_factory, save_full_plan, user.id, basic_plan_json, full_plan_json, usage)
+
+        yield "done", {
+            "success": True,
+            "message": "Premium results generated successfully"
+        }
+    finally:
+        # The client may disconnect mid-stream; don't leave the summary running
+        if summary_task and not summary_task.done():
+            summary_task.cancel()
+
+
+async def _collecting_usage(usage: List[ChainUsage], awaitable: Awaitable[Any]) -> Any:
+    """Await inside collect_usage, for tasks whose usage goes into an existing list."""
+    with collect_usage(usage):
+        return await awaitable
@@ -0,0 +1,250 @@
+"""Database access for AI generation.
+
+These helpers are plain synchronous functions so the async routes can hand them
+to the threadpool (``run_in_threadpool``) instead of blocking the event loop on
+database round trips.
+"""
+
+from typing import Iterable, List, Optional, Tuple
+import uuid
+from datetime import datetime
+from fastapi import HTTPException
+from sqlmodel import Session, select
+from app.models import User, FormResponse, Result, ResultHistory, GenerationJob, GenerationUsage
+from app.plan_codec import encode_plan
+from app.results_cache import invalidate_results
+
+from .ai_usage import ChainUsage
+
+
+def load_generation_inputs(
+    session: Session,
+    user_id: uuid.UUID,
+    required_responses: int,
+    tier_label: str,
+    require_premium: bool = False
+) -> Tuple[User, List[FormResponse], Optional[Result]]:
+    """
+    Load everything a generation needs before the LLM call.
+
+    Args:
+        session: Database session
+        user_id: ID of the user to generate results for
+        required_responses: Minimum number of answered questions
+        tier_label: "basic" or "premium", used in the error message
+        require_premium: Whether the user must have premium access
+
+    Returns:
+        Tuple of (user, responses ordered by question number, existing result or None)
+    """
+    # Check if user exists
+    user = session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Check if user has premium access (handles canceled subscriptions properly)
+    if require_premium:
+        from app.routers.payments.payment_utils import has_premium_access
+        if not has_premium_access(user):
+            raise HTTPException(
+                status_code=403,
+                detail="Premium or Pursuit tier required to generate full results"
+            )
+
+    # Get responses for this user
+    statement = select(FormResponse).where(FormResponse.user_id == user_id).order_by(FormResponse.question_number)
+    responses = session.exec(statement).all()
+
+    # Check if user has answered enough questions
+    if not responses or len(responses) < required_responses:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Incomplete responses. {len(responses)}/{required_responses} questions answered for {tier_label} results."
+        )
+
+    existing_result = session.exec(select(Result).where(Result.user_id == user_id)).first()
+
+    return user, responses, existing_result
+
+
+def archive_plan(session: Session, result: Result, plan_field: str) -> None:
+    """Keep the plan about to be replaced in the user's result history, compressed."""
+    plan = getattr(result, plan_field)
+    if not plan:
+        return
+    session.add(ResultHistory(
+        user_id=result.user_id,
+        plan_field=plan_field,
+        payload=encode_plan(plan),
+        generated_at=result.last_generated_at
+    ))
+
+
+def add_generation_usage(session: Session, result: Result, payment_tier: str, usage: Iterable[ChainUsage]) -> None:
+    """Store the usage of the chain calls behind a generation, tagged with the result's regeneration count."""
+    for call in usage:
+        session.add(GenerationUsage(
+            user_id=result.user_id,
+            result_id=result.id,
+            generation=result.regeneration_count,
+            payment_tier=payment_tier,
+            chain=call.chain,
+            model=call.model,
+            cache_hit=call.cache_hit,
+            prompt_tokens=call.prompt_tokens,
+            cached_prompt_tokens=call.cached_prompt_tokens,
+            completion_tokens=call.completion_tokens,
+            latency_ms=call.latency_ms,
+            retries=call.retries,
+            cost_usd=call.cost_usd
+        ))
+
+
+def save_basic_plan(session: Session, user: User, basic_plan_json: str, usage: Iterable[ChainUsage] = ()) -> None:
+    """Create or update the user's result with a freshly generated basic plan, and the usage behind it."""
+    existing_result = session.exec(select(Result).where(Result.user_id == user.id)).first()
+
+    if existing_result:
+        # Update existing result
+        archive_plan(session, existing_result, "basic_plan")
+        existing_result.basic_plan = basic_plan_json
+        existing_result.last_generated_at = datetime.utcnow()
+        # Increment regeneration count if this is not the first generation
+        if existing_result.basic_plan:
+            existing_result.regeneration_count += 1
+        session.add(existing_result)
+        result = existing_result
+    else:
+        # Create new result with empty full_plan
+        result = Result(
+            user_id=user.id,
+            basic_plan=basic_plan_json,
+            full_plan="",  # Empty full plan until premium tier
+            last_generated_at=datetime.utcnow()
+        )
+        session.add(result)
+
+    # Update user payment tier if not already set
+    if user.payment_tier == "none":
+        user.payment_tier = "basic"
+        session.add(user)
+
+    add_generation_usage(session, result, user.payment_tier, usage)
+    session.commit()
+
+    invalidate_results(user.id)
+
+
+def save_full_plan(
+    session: Session,
+    user_id: uuid.UUID,
+    basic_plan_json: str,
+    full_plan_json: str,
+    usage: Iterable[ChainUsage] = ()
+) -> None:
+    """Create or update the user's result with a freshly generated full plan, and the usage behind it."""
+    existing_result = session.exec(select(Result).where(Result.user_id == user_id)).first()
+
+    if existing_result:
+        # Update existing result
+        archive_plan(session, existing_result, "full_plan")
+        existing_result.full_plan = full_plan_json
+        existing_result.last_generated_at = datetime.utcnow()
+        # Increment regeneration count if this is not the first generation
+        if existing_result.full_plan:
+            existing_result.regeneration_count += 1
+        session.add(existing_result)
+        result = existing_result
+    else:
+        # Create new result
+        result = Result(
+            user_id=user_id,
+            basic_plan=basic_plan_json,
+            full_plan=full_plan_json,
+            last_generated_at=datetime.utcnow()
+        )
+        session.add(result)
+
+    usage = list(usage)
+    if usage:
+        add_generation_usage(session, result, session.get(User, user_id).payment_tier, usage)
+    session.commit()
+    invalidate_results(user_id)
+
+
+def load_plan_generated_since(
+    session: Session,
+    user_id: uuid.UUID,
+    plan_field: str,
+    since: datetime
+) -> Optional[str]:
+    """
+    Return the stored plan if it was (re)generated at or after ``since``.
+
+    Args:
+        session: Database session
+        user_id: ID of the user
+        plan_field: "basic_plan" or "full_plan"
+        since: Earliest acceptable generation time
+
+    Returns:
+        The plan JSON, or None if there is no plan that recent
+    """
+    result = session.exec(select(Result).where(Result.user_id == user_id)).first()
+    if not result or not result.last_generated_at or result.last_generated_at < since:
+        return None
+    return getattr(result, plan_field) or None
+
+
+def load_generation_usage(session: Session, since: datetime) -> List[GenerationUsage]:
+    """Usage rows recorded at or after ``since``."""
+    return session.exec(select(GenerationUsage).where(GenerationUsage.created_at >= since)).all()
+
+
+def create_generation_job(session: Session, user_id: uuid.UUID, tier: str) -> GenerationJob:
+    """Record a new queued generation job."""
+    job = GenerationJob(user_id=user_id, tier=tier)
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    return job
+
+
+def mark_job_running(session: Session, job_id: uuid.UUID) -> None:
+    """Flag a job as picked up by a worker."""
+    job = session.get(GenerationJob, job_id)
+    job.status = "running"
+    job.started_at = datetime.utcnow()
+    session.add(job)
+    session.commit()
+
+
+def fail_stale_jobs(session: Session, cutoff: datetime, error: str) -> int:
+    """
+    Mark jobs that were queued, or started running, before ``cutoff`` as failed.
+
+    Returns:
+        The number of jobs marked failed
+    """
+    stale = session.exec(select(GenerationJob).where(
+        ((GenerationJob.status == "queued") & (GenerationJob.created_at < cutoff))
+        | ((GenerationJob.status == "running") & (GenerationJob.started_at < cutoff))
+    )).all()
+    now = datetime.utcnow()
+    for job in stale:
+        job.status = "failed"
+        job.error = error
+        job.finished_at = now
+        session.add(job)
+    session.commit()
+    return len(stale)
+
+
+def mark_job_finished(session: Session, job_id: uuid.UUID, error: Optional[str] = None) -> None:
+    """Flag a job as succeeded, or failed with the given error detail."""
+    job = session.get(GenerationJob, job_id)
+    job.status = "failed" if error else "succeeded"
+    job.error = error
+    job.finished_at = datetime.utcnow()
+    session.add(job)
+    session.commit()
@@ -0,0 +1,201 @@
+"""
+Token, latency, retry and cost accounting for each LLM generation.
+
+Every chain invocation in ai_generation runs inside ``track_chain_call``,
+which passes a ``UsageCallback`` in the chain's config and times the call.
+The usage OpenAI reports is collected into the list opened by
+``collect_usage`` (or the list passed in explicitly, for streams), and the
+write phase stores it as GenerationUsage rows next to the plan it produced
+(see ``add_generation_usage`` in ai_storage). Generation cache hits are
+recorded too, with no tokens, so cost per tier reflects what was paid.
+
+Prices are USD per million tokens as (prompt, cached prompt, completion).
+LLM_PRICES can override or extend them with a JSON object such as
+``{"gpt-4.1": [2.0, 0.5, 8.0]}``.
+"""
+
+import os
+import json
+import math
+import time
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.metrics import token_usage
+from .ai_chains import MODEL_CONFIG
+
+logger = logging.getLogger(__name__)
+
+MODEL_PRICES: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+MODEL_PRICES.update({model: tuple(prices) for model, prices in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+
+def estimate_cost(model: str, prompt_tokens: int, cached_prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated USD cost of a call; 0 for models without a price."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    prompt_price, cached_price, completion_price = prices
+    uncached = prompt_tokens - cached_prompt_tokens
+    return (uncached * prompt_price + cached_prompt_tokens * cached_price + completion_tokens * completion_price) / 1_000_000
+
+
+@dataclass
+class ChainUsage:
+    """What one chain invocation used."""
+
+    chain: str
+    model: str
+    prompt_tokens: int = 0
+    cached_prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: float = 0.0
+    retries: int = 0
+    cache_hit: bool = False
+
+    @property
+    def cost_usd(self) -> float:
+        return estimate_cost(self.model, self.prompt_tokens, self.cached_prompt_tokens, self.completion_tokens)
+
+
+class UsageCallback(BaseCallbackHandler):
+    """
+    Per-invocation LangChain callback adding up the token usage of a chain's model calls.
+
+    Retries are the model calls beyond the first plus any ``on_retry`` events.
+    Retries made inside the OpenAI client itself don't reach LangChain, so
+    they show up only in the latency.
+    """
+
+    # Only adds numbers up, so there's no need to hop to a thread in async runs
+    run_inline = True
+
+    def __init__(self):
+        self.model_calls = 0
+        self.retry_events = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self.model_calls += 1
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self.model_calls += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        prompt_tokens, cached_prompt_tokens, completion_tokens = token_usage(response)
+        self.prompt_tokens += prompt_tokens
+        self.cached_prompt_tokens += cached_prompt_tokens
+        self.completion_tokens += completion_tokens
+
+    def on_retry(self, retry_state, *, run_id, **kwargs) -> None:
+        self.retry_events += 1
+
+    def usage(self, chain: str, model: str, seconds: float) -> ChainUsage:
+        return ChainUsage(
+            chain=chain,
+            model=model,
+            prompt_tokens=self.prompt_tokens,
+            cached_prompt_tokens=self.cached_prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            latency_ms=round(seconds * 1000, 1),
+            retries=max(self.model_calls - 1, 0) + self.retry_events
+        )
+
+
+_usage: ContextVar[Optional[List[ChainUsage]]] = ContextVar("generation_usage", default=None)
+
+
+@contextmanager
+def collect_usage(calls: Optional[List[ChainUsage]] = None) -> Iterator[List[ChainUsage]]:
+    """Gather the usage of every chain invoked in this context, including tasks and threads started from it."""
+    calls = [] if calls is None else calls
+    token = _usage.set(calls)
+    try:
+        yield calls
+    finally:
+        _usage.reset(token)
+
+
+def _record(usage: ChainUsage, calls: Optional[List[ChainUsage]]) -> None:
+    calls = _usage.get() if calls is None else calls
+    if calls is not None:
+        calls.append(usage)
+
+
+@contextmanager
+def track_chain_call(chain: str, calls: Optional[List[ChainUsage]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the config to invoke a chain with, and record its usage once it succeeds.
+
+    Args:
+        chain: Chain name, "summary" or "full_plan"
+        calls: List to record into, instead of the one opened by collect_usage
+    """
+    callback = UsageCallback()
+    start = time.perf_counter()
+    yield {"callbacks": [callback]}
+    usage = callback.usage(chain, MODEL_CONFIG["model"], time.perf_counter() - start)
+    logger.debug(
+        "%s chain used %d prompt (%d cached) and %d completion tokens in %.0f ms",
+        chain, usage.prompt_tokens, usage.cached_prompt_tokens, usage.completion_tokens, usage.latency_ms
+    )
+    _record(usage, calls)
+
+
+def record_cache_hit(chain: str, calls: Optional[List[ChainUsage]] = None) -> None:
+    """Record a generation served from the generation cache."""
+    _record(ChainUsage(chain=chain, model=MODEL_CONFIG["model"], cache_hit=True), calls)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values``; 0 when there are none."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize_usage(rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    Aggregate GenerationUsage rows per payment tier and chain.
+
+    Latency and token figures only count calls that reached the model;
+    cache hits are counted separately and cost nothing.
+    """
+    groups: Dict[Tuple[str, str], List[Any]] = {}
+    for row in rows:
+        groups.setdefault((row.payment_tier, row.chain), []).append(row)
+
+    summary = []
+    for (tier, chain), group in sorted(groups.items()):
+        calls = [row for row in group if not row.cache_hit]
+        latencies = [row.latency_ms for row in calls]
+        prompt_tokens = [row.prompt_tokens for row in calls]
+        completion_tokens = [row.completion_tokens for row in calls]
+        cached_prompt_tokens = sum(row.cached_prompt_tokens for row in calls)
+        cost = sum(row.cost_usd for row in group)
+        summary.append({
+            "payment_tier": tier,
+            "chain": chain,
+            "generations": len(group),
+            "cache_hits": len(group) - len(calls),
+            "retries": sum(row.retries for row in calls),
+            "latency_ms": {"p50": percentile(latencies, 50), "p95": percentile(latencies, 95)},
+            "prompt_tokens": {"p50": percentile(prompt_tokens, 50), "p95": percentile(prompt_tokens, 95), "total": sum(prompt_tokens)},
+            "completion_tokens": {"p50": percentile(completion_tokens, 50), "p95": percentile(completion_tokens, 95), "total": sum(completion_tokens)},
+            "cached_prompt_share": round(cached_prompt_tokens / sum(prompt_tokens), 3) if sum(prompt_tokens) else 0.0,
+            "cost_usd": {"total": round(cost, 4), "per_generation": round(cost / len(group), 6)}
+        })
+    return summary
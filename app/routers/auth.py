@@ -1,4 +1,6 @@
-from typing import Dict, Any, Optional
+import logging
+from typing import Dict, Any, Optional, Tuple
+from dataclasses import dataclass
 from datetime import datetime
 
 from fastapi import APIRouter, Request, Response, Depends, HTTPException, status, Form
@@ -7,16 +9,24 @@ from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, EmailStr
 from stytch.core.response_base import StytchError
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.models.database import get_session
+from app.models.database import get_session, get_async_engine, get_async_session
 from app.models.models import User, Result
+from app.auth_cache import SessionValidator
+from app.metrics import track_external_call
 
 # Import the Stytch client from clients.py
 from clients import get_stytch_client, is_production
 
+logger = logging.getLogger(__name__)
+
 # Initialize the Stytch client
 stytch_client = get_stytch_client()
 
+# Local validation and caching of session tokens in front of the Stytch client
+session_validator = SessionValidator(stytch_client)
+
 # Initialize templates
 templates = Jinja2Templates(directory="app/templates")
 
@@ -37,13 +47,9 @@ STYTCH_SESSION_JS_COOKIE_NAME = 'stytch_session_js'  # Non-HTTP-only cookie for
 # Debug function to log cookie operations
 def log_cookie_operation(operation, settings):
     """Log cookie operations with detailed settings for debugging"""
-    print(f"[DEBUG] Cookie {operation} operation with settings:")
-    for key, value in settings.items():
-        if key == 'value' and value and isinstance(value, str):
-            # Truncate token value for security
-            print(f"[DEBUG]   {key}: {value[:10]}...")
-        else:
-            print(f"[DEBUG]   {key}: {value}")
+    # The cookie value is a session token, so it is left out
+    logged_settings = {key: value for key, value in settings.items() if key != 'value'}
+    logger.debug("Cookie %s operation with settings: %s", operation, logged_settings)
 
 # Dependency to get the session cookie
 async def get_cookie_session(request: Request):
@@ -55,12 +61,12 @@ async def get_authenticated_user(request: Request):
     
     Checks multiple sources for the authentication token:
     1. Cookies
-    2. Request state (set by AuthHeaderMiddleware from Authorization header)
+    2. Request state (set by RequestContextMiddleware from Authorization header)
     
     Returns None if the user is not authenticated.
     """
-    print("[DEBUG] Checking authentication...")
-    print(f"[DEBUG] Available cookies: {list(request.cookies.keys())}")
+    logger.debug("Checking authentication...")
+    logger.debug("Available cookies: %s", list(request.cookies.keys()))
     
     # Track the source of the token for debugging
     token_source = None
@@ -68,73 +74,58 @@ async def get_authenticated_user(request: Request):
     # First check if we have a token in the cookies
     stytch_session = request.cookies.get(STYTCH_COOKIE_NAME)
     if stytch_session:
-        print(f"[DEBUG] Found session token in cookies: {stytch_session[:10]}...")
+        logger.debug("Found session token in cookies")
         token_source = "cookie"
     else:
-        print(f"[DEBUG] No session token in cookies with name '{STYTCH_COOKIE_NAME}'")
+        logger.debug("No session token in cookies with name '%s'", STYTCH_COOKIE_NAME)
         
-        # Check if token is in request state (set by AuthHeaderMiddleware)
+        # Check if token is in request state (set by RequestContextMiddleware)
         if hasattr(request.state, 'auth_token') and request.state.auth_token:
             stytch_session = request.state.auth_token
-            print(f"[DEBUG] Found session token in request state (Authorization header): {stytch_session[:10]}...")
+            logger.debug("Found session token in request state (Authorization header)")
             token_source = "auth_header"
         else:
-            print("[DEBUG] No session token in request state")
+            logger.debug("No session token in request state")
     
     if not stytch_session:
-        print("[DEBUG] No valid session token found")
+        logger.debug("No valid session token found")
         return None
 
     try:
-        print(f"[DEBUG] Authenticating with Stytch using token from {token_source}: {stytch_session[:10]}...")
+        logger.debug("Authenticating with Stytch using token from %s", token_source)
         
-        # Use the appropriate Stytch method based on the token format
-        # If the token starts with 'session-', it's a session token
-        # Otherwise, it might be a JWT
-        if stytch_session.startswith('session-'):
-            resp = stytch_client.sessions.authenticate(session_token=stytch_session)
-        else:
-            # Try JWT authentication as a fallback
-            try:
-                resp = stytch_client.sessions.authenticate_jwt(session_jwt=stytch_session)
-                print("[DEBUG] Successfully authenticated with JWT")
-            except Exception as jwt_error:
-                print(f"[DEBUG] JWT authentication failed, falling back to session token: {str(jwt_error)}")
-                resp = stytch_client.sessions.authenticate(session_token=stytch_session)
+        # JWTs are verified locally and session tokens come from a short-lived
+        # cache where possible; Stytch is only called when neither can answer
+        user = await session_validator.authenticate(stytch_session)
         
-        print("[DEBUG] Authentication successful")
-        return resp.user
+        logger.debug("Authentication successful")
+        return user
     except StytchError as e:
-        print(f"[ERROR] Stytch authentication error with token from {token_source}: {str(e)}")
+        logger.error("Stytch authentication error with token from %s: %s", token_source, e)
         
         # If the token was from an Authorization header and failed, try to recreate a session
         if token_source == "auth_header":
-            print("[DEBUG] Session not found for Authorization header token, attempting to recreate session")
+            logger.debug("Session not found for Authorization header token, attempting to recreate session")
             
             # Check if this is a temporary token we created for anonymous users
             if stytch_session.startswith('temp-token-'):
                 try:
                     # Extract the user ID from the token
                     user_id = stytch_session.replace('temp-token-', '')
-                    print(f"[DEBUG] Found temporary token with user ID: {user_id}")
+                    logger.debug("Found temporary token with user ID: %s", user_id)
                     
                     # Verify this is a valid UUID
                     import uuid
                     try:
                         user_uuid = uuid.UUID(user_id)
-                        print(f"[DEBUG] Valid UUID: {user_uuid}")
+                        logger.debug("Valid UUID: %s", user_uuid)
                         
                         # Check if this user exists in the database
-                        from sqlmodel import Session, select
-                        from app.models.database import get_session
-                        from app.models.models import User
-                        
-                        db = next(get_session())
-                        statement = select(User).where(User.id == user_uuid)
-                        db_user = db.exec(statement).first()
+                        async with AsyncSession(get_async_engine(), expire_on_commit=False) as db:
+                            db_user = await db.get(User, user_uuid)
                         
                         if db_user:
-                            print(f"[DEBUG] Found user in database: {db_user.email}")
+                            logger.debug("Found user in database: %s", db_user.email)
                             
                             # Create a minimal user object with the ID and email
                             from types import SimpleNamespace
@@ -144,9 +135,9 @@ async def get_authenticated_user(request: Request):
                             
                             return minimal_user
                     except ValueError:
-                        print(f"[DEBUG] Invalid UUID in temporary token: {user_id}")
+                        logger.debug("Invalid UUID in temporary token: %s", user_id)
                 except Exception as temp_token_error:
-                    print(f"[DEBUG] Error processing temporary token: {str(temp_token_error)}")
+                    logger.debug("Error processing temporary token: %s", temp_token_error)
             
             # Try to extract user information from the token
             try:
@@ -163,12 +154,12 @@ async def get_authenticated_user(request: Request):
                     payload = base64.b64decode(padded)
                     data = json.loads(payload)
                     
-                    print(f"[DEBUG] Extracted token payload: {data}")
+                    logger.debug("Extracted token payload with keys: %s", sorted(data))
                     
                     # Check if we have user data
                     if 'sub' in data:
                         user_id = data['sub']
-                        print(f"[DEBUG] Extracted user ID from token: {user_id}")
+                        logger.debug("Extracted user ID from token: %s", user_id)
                         
                         # Create a minimal user object with just the ID
                         from types import SimpleNamespace
@@ -178,34 +169,107 @@ async def get_authenticated_user(request: Request):
                         # If we have email info, add it
                         if 'email' in data:
                             minimal_user.emails = [SimpleNamespace(email=data['email'])]
-                            print(f"[DEBUG] Extracted email from token: {data['email']}")
+                            logger.debug("Extracted email from token: %s", data['email'])
                         
                         return minimal_user
             except Exception as token_error:
-                print(f"[DEBUG] Could not extract user info from token: {str(token_error)}")
+                logger.debug("Could not extract user info from token: %s", token_error)
         
         return None
 
 
+@dataclass
+class CurrentUser:
+    """
+    Who is making the request, resolved once per request.
+    
+    Attributes:
+        stytch_user: The Stytch user, or None if not authenticated
+        user: Our User with the Stytch user's email, or None if there isn't one
+        has_results: Whether that user has a Result row
+    """
+    stytch_user: Optional[Any] = None
+    user: Optional[User] = None
+    has_results: bool = False
+    
+    @property
+    def authenticated(self) -> bool:
+        return self.stytch_user is not None
+    
+    @property
+    def email(self) -> Optional[str]:
+        if self.stytch_user is not None and getattr(self.stytch_user, 'emails', None):
+            return self.stytch_user.emails[0].email
+        return None
+
+
+def _user_with_results_statement(email: str):
+    return (
+        select(User, Result.id)
+        .outerjoin(Result, Result.user_id == User.id)
+        .where(User.email == email)
+    )
+
+
+def _user_and_has_results(row) -> Tuple[Optional[User], bool]:
+    if not row:
+        return None, False
+    user, result_id = row
+    return user, result_id is not None
+
+
+def find_user_with_results(session: Session, email: str) -> Tuple[Optional[User], bool]:
+    """Look up a user by email and whether they have results, in one query."""
+    return _user_and_has_results(session.exec(_user_with_results_statement(email)).first())
+
+
+async def afind_user_with_results(session: AsyncSession, email: str) -> Tuple[Optional[User], bool]:
+    """Async version of find_user_with_results for an AsyncSession."""
+    return _user_and_has_results((await session.exec(_user_with_results_statement(email))).first())
+
+
+async def get_current_user(request: Request, session: AsyncSession = Depends(get_async_session)) -> CurrentUser:
+    """
+    Dependency resolving the Stytch identity, DB user and results flag.
+    
+    The outcome is cached on ``request.state.current_user``, so middleware
+    and handlers in the same request share one lookup.
+    """
+    current_user = getattr(request.state, "current_user", None)
+    if isinstance(current_user, CurrentUser):
+        return current_user
+    
+    current_user = CurrentUser(stytch_user=await get_authenticated_user(request))
+    
+    if current_user.email:
+        current_user.user, current_user.has_results = await afind_user_with_results(
+            session, current_user.email
+        )
+    
+    request.state.current_user = current_user
+    return current_user
+
+
 @router.post("/login_or_create_user")
 async def login_or_create_user(email_request: EmailRequest, request: Request) -> Dict[str, str]:
     try:
         # Create the magic link URL with the proper base URL
         login_magic_link_url = f"{request.base_url}auth/authenticate"
         
-        print(f"[DEBUG] Magic link URL: {login_magic_link_url}")
+        logger.debug("Magic link URL: %s", login_magic_link_url)
         
         # Send the magic link with explicit URLs
-        resp = stytch_client.magic_links.email.login_or_create(
-            email=email_request.email,
-            login_magic_link_url=login_magic_link_url,
-            signup_magic_link_url=login_magic_link_url
-        )
+        with track_external_call("stytch", "magic_links.email.login_or_create"):
+            resp = await stytch_client.magic_links.email.login_or_create_async(
+                email=email_request.email,
+                login_magic_link_url=login_magic_link_url,
+                signup_magic_link_url=login_magic_link_url
+            )
         
-        print(f"[DEBUG] Magic link email sent to: {email_request.email}")
+        logger.debug("Magic link email sent to: %s", email_request.email)
         return {"message": "Email sent! Check your inbox!"}
     except StytchError as e:
-        print(f"[ERROR] Stytch error: {str(e)}")
+        logger.error("Stytch error: %s", e)
         try:
             return JSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -224,52 +288,51 @@ async def authenticate(
     request: Request,
     response: Response,
     redirect: str = None,
-    stytch_token_type: str = "magic_links"  # Default to magic_links
+    stytch_token_type: str = "magic_links",  # Default to magic_links
+    db: AsyncSession = Depends(get_async_session)
 ):
-    print(f"[DEBUG] Authenticate endpoint called with token_type: {stytch_token_type}")
+    logger.debug("Authenticate endpoint called with token_type: %s", stytch_token_type)
     
     # First check if the user is already authenticated
     # If they are, redirect to the form or the specified redirect URL
     existing_user = await get_authenticated_user(request)
     if existing_user:
-        print("[DEBUG] User is already authenticated")
+        logger.debug("User is already authenticated")
         
         # If redirect URL is provided, use it
         if redirect:
-            print(f"[DEBUG] Redirecting to: {redirect}")
+            logger.debug("Redirecting to: %s", redirect)
             return RedirectResponse(url=redirect, status_code=303)
         else:
-            print("[DEBUG] No redirect URL provided, redirecting to form")
+            logger.debug("No redirect URL provided, redirecting to form")
             return RedirectResponse(url="/form", status_code=303)
     
     # We only support magic links for now
     if stytch_token_type != 'magic_links':
-        print(f"[ERROR] Unsupported token type: {stytch_token_type}")
+        logger.error("Unsupported token type: %s", stytch_token_type)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"token_type: {stytch_token_type} not supported"
         )
 
     try:
-        print("[DEBUG] Authenticating with Stytch magic link...")
+        logger.debug("Authenticating with Stytch magic link...")
         # 43200 minutes = 30 days
-        resp = stytch_client.magic_links.authenticate(
-            token=token,
-            session_duration_minutes=43200
-        )
-        print(f"[DEBUG] Authentication successful, got session token: {resp.session_token[:10]}...")
-        
-        # Get the session JWT as well, which might be more compatible with some browsers
-        session_jwt = None
-        try:
-            # Try to get the JWT from the session
-            jwt_resp = stytch_client.sessions.exchange_session_token(
-                session_token=resp.session_token
+        with track_external_call("stytch", "magic_links.authenticate"):
+            resp = await stytch_client.magic_links.authenticate_async(
+                token=token,
+                session_duration_minutes=43200
             )
-            session_jwt = jwt_resp.session_jwt
-            print(f"[DEBUG] Got session JWT: {session_jwt[:10]}...")
-        except Exception as jwt_error:
-            print(f"[DEBUG] Failed to get session JWT: {str(jwt_error)}")
+        logger.debug("Authentication successful, got session token")
+        
+        # The next page load will present this token; no need to ask Stytch again
+        session_validator.remember(resp, resp.session_token)
+        
+        # The magic link response carries the session JWT as well, which might be
+        # more compatible with some browsers
+        session_jwt = resp.session_jwt
+        if session_jwt:
+            logger.debug("Got session JWT")
         
         # Store session token in a HTTP-only cookie with appropriate security settings
         cookie_settings = {
@@ -297,7 +360,7 @@ async def authenticate(
         if is_production():
             cookie_settings["secure"] = True
             js_cookie_settings["secure"] = True
-            print("[DEBUG] Setting production cookies with secure=True")
+            logger.debug("Setting production cookies with secure=True")
         
         # Log the cookie operations
         log_cookie_operation("set (http-only)", cookie_settings)
@@ -317,29 +380,21 @@ async def authenticate(
         if hasattr(resp.user, 'emails') and resp.user.emails:
             user_email = resp.user.emails[0].email
         
-        # Get user from database or create if not exists
-        db = next(get_session())
-        
         # Determine the redirect URL based on user state
         redirect_url = "/form"  # Default redirect
         
         if hasattr(resp.user, 'emails') and resp.user.emails:
             user_email = resp.user.emails[0].email
             
-            # Check if user exists
-            statement = select(User).where(User.email == user_email)
-            db_user = db.exec(statement).first()
+            # Check if user exists and has results
+            db_user, has_results = await afind_user_with_results(db, user_email)
             
             if db_user:
-                print(f"[DEBUG] Found existing user with email: {user_email}")
+                logger.debug("Found existing user with email: %s", user_email)
                 
-                # Check if user has results
-                results_statement = select(Result).where(Result.user_id == db_user.id)
-                user_results = db.exec(results_statement).first()
-                
-                if user_results:
+                if has_results:
                     # If user has results, redirect to results page
-                    print(f"[DEBUG] User has results, redirecting to results page")
+                    logger.debug("User has results, redirecting to results page")
                     redirect_url = f"/results/{db_user.id}"
                 else:
                     # Get progress state
@@ -347,16 +402,16 @@ async def authenticate(
                     
                     if progress_state > 0:
                         # If user has progress, redirect to form with user ID
-                        print(f"[DEBUG] User has progress state {progress_state}, redirecting to form")
+                        logger.debug("User has progress state %s, redirecting to form", progress_state)
                         redirect_url = f"/form/{db_user.id}"
                     else:
                         # If user has no progress, redirect to form with user ID
-                        print(f"[DEBUG] User has no progress, redirecting to form")
+                        logger.debug("User has no progress, redirecting to form")
                         redirect_url = f"/form/{db_user.id}"
             else:
-                print(f"[DEBUG] User with email {user_email} not found, redirecting to form")
+                logger.debug("User with email %s not found, redirecting to form", user_email)
         else:
-            print("[DEBUG] No email found in Stytch user data, redirecting to form")
+            logger.debug("No email found in Stytch user data, redirecting to form")
         
         # Render the authentication template with the token and redirect URL
         # This will store the token in localStorage and then redirect
@@ -373,12 +428,12 @@ async def authenticate(
         )
         
     except StytchError as e:
-        print(f"[ERROR] Stytch authentication error: {str(e)}")
+        logger.error("Stytch authentication error: %s", e)
         error_message = str(e)
         
         # Check if this is a "magic link already used" error
         if "already used or expired" in error_message:
-            print("[DEBUG] Magic link already used")
+            logger.debug("Magic link already used")
             
             # Redirect to form or the specified redirect URL with a message
             error_message = "Magic+link+expired+or+already+used.+Please+request+a+new+one."
@@ -402,6 +457,11 @@ async def authenticate(
 
 @router.get("/logout")
 async def logout(request: Request):
+    # Stop trusting the cached session for this token
+    token = request.cookies.get(STYTCH_COOKIE_NAME) or getattr(request.state, "auth_token", None)
+    if token:
+        session_validator.forget(token)
+    
     # Create a response with the logout template
     response = templates.TemplateResponse("logout.html", {"request": request})
     
@@ -424,7 +484,7 @@ async def logout(request: Request):
     if is_production():
         cookie_clear_settings["secure"] = True
         js_cookie_clear_settings["secure"] = True
-        print("[DEBUG] Clearing production cookies with secure=True")
+        logger.debug("Clearing production cookies with secure=True")
     
     # Log the cookie operations
     log_cookie_operation("delete (http-only)", cookie_clear_settings)
@@ -435,7 +495,7 @@ async def logout(request: Request):
     response.delete_cookie(**js_cookie_clear_settings)
     
     # Add a debug message to verify cookie deletion
-    print("[DEBUG] Cookies should be deleted now")
+    logger.debug("Cookies should be deleted now")
     
     return response
 
@@ -451,9 +511,9 @@ async def check_session(request: Request, response: Response):
     # Log the request headers for debugging
     auth_header = request.headers.get('Authorization')
     if auth_header:
-        print(f"[DEBUG] Authorization header present: {auth_header[:20]}...")
+        logger.debug("Authorization header present")
     else:
-        print("[DEBUG] No Authorization header present")
+        logger.debug("No Authorization header present")
     
     user = await get_authenticated_user(request)
     if user:
@@ -471,7 +531,7 @@ async def check_session(request: Request, response: Response):
         # try to set the cookie from the token in the header
         if auth_header and auth_header.startswith('Bearer ') and not request.cookies.get(STYTCH_COOKIE_NAME):
             token = auth_header.replace('Bearer ', '')
-            print(f"[DEBUG] Setting cookie from Authorization header token: {token[:10]}...")
+            logger.debug("Setting cookie from Authorization header token")
             
             # Set the HTTP-only cookie
             cookie_settings = {
@@ -511,4 +571,4 @@ async def check_session(request: Request, response: Response):
         return {"authenticated": False}
 
 # Export the get_authenticated_user function so it can be used in other modules
-__all__ = ["router", "get_authenticated_user"]
+__all__ = ["router", "get_authenticated_user", "get_current_user", "CurrentUser"]
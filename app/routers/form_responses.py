@@ -1,15 +1,26 @@
-from typing import List, Union, Dict
+import logging
+from typing import Any, Iterable, List, Optional, Tuple, Union, Dict
+from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import Integer, String, cast, column, func, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlmodel import Session, select
-from app.models import FormResponse, User, get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models import FormResponse, User, get_session, get_async_session
 import uuid
 from pydantic import validator, BaseModel
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/api/form-responses",
     tags=["form-responses"],
 )
 
+# Number of questions in the form
+QUESTION_COUNT = 25
+
 # Helper function to convert string to UUID if needed
 def parse_uuid(user_id):
     if isinstance(user_id, str):
@@ -19,56 +30,160 @@ def parse_uuid(user_id):
             raise HTTPException(status_code=400, detail="Invalid UUID format")
     return user_id
 
+def _upsert_statements(dialect: str, user_id: uuid.UUID, answers: Dict[int, str]):
+    """
+    Build the statements that save ``answers`` and bump the user's progress.
+    
+    Returns (progress update to run first or None, upsert statement, ids of
+    the rows the upsert would create).
+    """
+    table = FormResponse.__table__
+    now = datetime.utcnow()
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "user_id": user_id,
+            "question_number": question_number,
+            "response": response,
+            "created_at": now
+        }
+        for question_number, response in sorted(answers.items())
+    ]
+    # A conflicting row keeps its original id, which tells updates from inserts
+    new_ids = {row["id"] for row in rows}
+    
+    greatest = func.greatest if dialect == "postgresql" else func.max
+    bump_progress = update(User).where(User.id == user_id).values(
+        progress_state=cast(greatest(cast(User.progress_state, Integer), max(answers)), String)
+    )
+    
+    if dialect == "postgresql":
+        # Only insert when the progress update found the user
+        bump = bump_progress.returning(User.id).cte("bump")
+        answer_columns = ["id", "question_number", "response", "created_at"]
+        answer_rows = values(
+            *(column(name, table.c[name].type) for name in answer_columns),
+            name="answers"
+        ).data([tuple(row[name] for name in answer_columns) for row in rows])
+        source = select(
+            answer_rows.c.id,
+            bump.c.id,
+            answer_rows.c.question_number,
+            answer_rows.c.response,
+            answer_rows.c.created_at
+        ).select_from(answer_rows, bump)
+        statement = pg_insert(table).from_select(["id", "user_id", "question_number", "response", "created_at"], source).add_cte(bump)
+        bump_progress = None
+    else:
+        statement = sqlite_insert(table).values(rows)
+    
+    statement = statement.on_conflict_do_update(
+        index_elements=["user_id", "question_number"],
+        set_={"response": statement.excluded.response}
+    ).returning(*table.c)
+    
+    return bump_progress, statement, new_ids
+
+def _saved_outcomes(saved, new_ids) -> Optional[List[Tuple[FormResponse, bool]]]:
+    """Turn the upsert's returned rows into (FormResponse, created) in question order."""
+    if not saved:
+        return None
+    
+    return sorted(
+        ((FormResponse(**row._mapping), row.id in new_ids) for row in saved),
+        key=lambda outcome: outcome[0].question_number
+    )
+
+def upsert_form_responses(
+    session: Session,
+    user_id: uuid.UUID,
+    answers: Dict[int, str]
+) -> Optional[List[Tuple[FormResponse, bool]]]:
+    """
+    Save a user's answers and raise their progress_state to at least the highest question.
+    
+    Everything happens atomically: on PostgreSQL as a single statement (the
+    progress update runs in a CTE feeding a multi-row INSERT ... ON CONFLICT),
+    on SQLite as an UPDATE and an INSERT ... ON CONFLICT in the session's
+    transaction. The caller commits.
+    
+    Args:
+        answers: Response text by question number
+    
+    Returns:
+        (saved FormResponse, whether it was newly created) for each answer in
+        question order, or None if the user doesn't exist
+    """
+    if not answers:
+        return [] if session.get(User, user_id) else None
+    
+    bump_progress, statement, new_ids = _upsert_statements(session.get_bind().dialect.name, user_id, answers)
+    if bump_progress is not None and session.exec(bump_progress).rowcount == 0:
+        return None
+    
+    return _saved_outcomes(session.exec(statement).all(), new_ids)
+
+async def aupsert_form_responses(
+    session: AsyncSession,
+    user_id: uuid.UUID,
+    answers: Dict[int, str]
+) -> Optional[List[Tuple[FormResponse, bool]]]:
+    """Async version of upsert_form_responses for an AsyncSession."""
+    if not answers:
+        return [] if await session.get(User, user_id) else None
+    
+    bump_progress, statement, new_ids = _upsert_statements(session.bind.dialect.name, user_id, answers)
+    if bump_progress is not None and (await session.exec(bump_progress)).rowcount == 0:
+        return None
+    
+    return _saved_outcomes((await session.exec(statement)).all(), new_ids)
+
+def upsert_form_response(
+    session: Session,
+    user_id: uuid.UUID,
+    question_number: int,
+    response: str
+) -> Optional[FormResponse]:
+    """
+    Save a single answer, see upsert_form_responses.
+    
+    Returns:
+        The saved FormResponse, or None if the user doesn't exist
+    """
+    saved = upsert_form_responses(session, user_id, {question_number: response})
+    return saved[0][0] if saved else None
+
 @router.post("/", response_model=FormResponse)
-def create_form_response(form_response: FormResponse, session: Session = Depends(get_session)):
+async def create_form_response(form_response: FormResponse, session: AsyncSession = Depends(get_async_session)):
     try:
-        # Print form response data for debugging
-        print(f"Creating form response with data: {form_response.dict()}")
+        # Log which answer is being saved, without its text
+        logger.info(
+            "Saving form response for user %s: question %s", form_response.user_id, form_response.question_number,
+            extra={"response_length": len(form_response.response or "")}
+        )
         
         # Convert user_id to UUID if it's a string
         if isinstance(form_response.user_id, str):
             form_response.user_id = parse_uuid(form_response.user_id)
         
-        # Check if user exists
-        user = session.get(User, form_response.user_id)
-        if not user:
-            print(f"User not found with ID: {form_response.user_id}")
+        # Insert or update the answer and bump the user's progress together
+        saved = await aupsert_form_responses(
+            session,
+            form_response.user_id,
+            {form_response.question_number: form_response.response}
+        )
+        if not saved:
+            logger.warning("User not found with ID: %s", form_response.user_id)
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Check if response for this question already exists
-        statement = select(FormResponse).where(
-            FormResponse.user_id == form_response.user_id,
-            FormResponse.question_number == form_response.question_number
-        )
-        existing_response = session.exec(statement).first()
-        
-        # If response exists, update it
-        if existing_response:
-            print(f"Updating existing response for question {form_response.question_number}")
-            existing_response.response = form_response.response
-            session.add(existing_response)
-            session.commit()
-            session.refresh(existing_response)
-            return existing_response
-        
-        # Otherwise create new response
-        print(f"Creating new response for question {form_response.question_number}")
-        session.add(form_response)
-        session.commit()
-        session.refresh(form_response)
-        
-        # Update user progress if this is a new highest question
-        current_progress = int(user.progress_state)
-        if form_response.question_number > current_progress:
-            print(f"Updating user progress from {current_progress} to {form_response.question_number}")
-            user.progress_state = str(form_response.question_number)
-            session.add(user)
-            session.commit()
-        
-        return form_response
+        await session.commit()
+        return saved[0][0]
+    except HTTPException:
+        await session.rollback()
+        raise
     except Exception as e:
-        session.rollback()
-        print(f"Error saving form response: {str(e)}")
+        await session.rollback()
+        logger.error("Error saving form response: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error saving form response: {str(e)}"
@@ -127,74 +242,121 @@ def get_specific_response(
             detail=f"Error retrieving specific response: {str(e)}"
         )
 
+def validate_answers(answers: Iterable[Tuple[Any, str]]) -> Dict[int, str]:
+    """
+    Check (question number, response) pairs and key them by question number.
+    
+    Raises a 400 listing every question number that isn't an integer between
+    1 and QUESTION_COUNT. A later answer to the same question replaces an
+    earlier one.
+    """
+    valid = {}
+    invalid_questions = []
+    for question, response_text in answers:
+        try:
+            question_number = int(question)
+        except (TypeError, ValueError):
+            invalid_questions.append(str(question))
+            continue
+        if not 1 <= question_number <= QUESTION_COUNT:
+            invalid_questions.append(str(question))
+            continue
+        valid[question_number] = response_text
+    
+    if invalid_questions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid question numbers: {', '.join(invalid_questions)}"
+        )
+    return valid
+
+def describe_outcomes(saved: List[Tuple[FormResponse, bool]]) -> Dict[str, str]:
+    """Map each saved question number to "created" or "updated"."""
+    return {
+        str(form_response.question_number): "created" if created else "updated"
+        for form_response, created in saved
+    }
+
+class BatchResponseItem(BaseModel):
+    question_number: int
+    response: str
+
+class BatchResponsesRequest(BaseModel):
+    user_id: uuid.UUID
+    responses: List[BatchResponseItem]
+
+@router.post("/batch")
+async def save_form_responses_batch(batch: BatchResponsesRequest, session: AsyncSession = Depends(get_async_session)):
+    """
+    Save several answers in one transaction.
+    
+    The questionnaire debounces saves and sends whatever changed since the
+    last batch, so a user's answers cost one request and one commit instead
+    of one each.
+    """
+    try:
+        answers = validate_answers((item.question_number, item.response) for item in batch.responses)
+        logger.info("Saving %s form responses for user %s: questions %s", len(answers), batch.user_id, sorted(answers))
+        
+        saved = await aupsert_form_responses(session, batch.user_id, answers)
+        if saved is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        await session.commit()
+        
+        return {
+            "success": True,
+            "saved_count": len(saved),
+            "results": describe_outcomes(saved)
+        }
+    except HTTPException:
+        await session.rollback()
+        raise
+    except Exception as e:
+        await session.rollback()
+        logger.error("Error saving form responses: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error saving form responses: {str(e)}"
+        )
+
 class AnonymousResponsesRequest(BaseModel):
     responses: Dict[str, str]  # Question number (as string) to response text
 
 @router.post("/transfer-anonymous")
-def transfer_anonymous_responses(
+async def transfer_anonymous_responses(
     user_id: uuid.UUID,
     anonymous_session_id: str,
     responses: AnonymousResponsesRequest,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session)
 ):
     """Transfer anonymous responses from localStorage to the database for a new user"""
     try:
-        # Check if user exists
-        user = session.get(User, user_id)
-        if not user:
+        logger.info("Transferring anonymous responses from session %s to user %s", anonymous_session_id, user_id)
+        
+        # Validate the whole payload before writing anything
+        answers = validate_answers(responses.responses.items())
+        
+        # Write every response and bump progress in one upsert
+        saved = await aupsert_form_responses(session, user_id, answers)
+        if saved is None:
             raise HTTPException(status_code=404, detail="User not found")
         
-        print(f"Transferring anonymous responses from session {anonymous_session_id} to user {user_id}")
-        print(f"Responses: {responses.responses}")
-        
-        # Create form responses for each question
-        created_responses = []
-        
-        for question_str, response_text in responses.responses.items():
-            try:
-                # Convert question number to int
-                question_number = int(question_str)
-                
-                # Create form response
-                form_response = FormResponse(
-                    user_id=user_id,
-                    question_number=question_number,
-                    response=response_text
-                )
-                
-                # Check if response already exists
-                statement = select(FormResponse).where(
-                    FormResponse.user_id == user_id,
-                    FormResponse.question_number == question_number
-                )
-                existing_response = session.exec(statement).first()
-                
-                if existing_response:
-                    # Update existing response
-                    existing_response.response = response_text
-                    session.add(existing_response)
-                    created_responses.append(existing_response)
-                else:
-                    # Create new response
-                    session.add(form_response)
-                    created_responses.append(form_response)
-            except ValueError:
-                # Skip invalid question numbers
-                print(f"Skipping invalid question number: {question_str}")
-                continue
-        
-        # Commit all changes
-        session.commit()
+        await session.commit()
         
         # Return success response
         return {
             "success": True,
-            "message": f"Transferred {len(created_responses)} responses from anonymous session {anonymous_session_id} to user {user_id}",
-            "transferred_count": len(created_responses)
+            "message": f"Transferred {len(saved)} responses from anonymous session {anonymous_session_id} to user {user_id}",
+            "transferred_count": len(saved),
+            "results": describe_outcomes(saved)
         }
+    except HTTPException:
+        await session.rollback()
+        raise
     except Exception as e:
-        session.rollback()
-        print(f"Error transferring anonymous responses: {str(e)}")
+        await session.rollback()
+        logger.error("Error transferring anonymous responses: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error transferring anonymous responses: {str(e)}"
@@ -0,0 +1,67 @@
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Dict
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from sqlmodel import Session
+from app.models import engine, get_session, pool_stats
+from app.models.database import async_pool_stats
+from app.logging_config import logging_stats
+from app.metrics import record_pool_stats, render_metrics
+from app.routers.ai.ai_storage import load_generation_usage
+from app.routers.ai.ai_usage import summarize_usage
+
+# Shared secret for /internal endpoints and /metrics. Without one they are
+# disabled: behind a proxy every caller can look local, so the client
+# address is no proof of anything.
+INTERNAL_METRICS_TOKEN = os.getenv("INTERNAL_METRICS_TOKEN")
+
+def require_internal_access(request: Request):
+    """Allow only callers holding the internal token; answer 404 when none is configured"""
+    if not INTERNAL_METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    token = request.headers.get("X-Internal-Token", "")
+    if not secrets.compare_digest(token, INTERNAL_METRICS_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+router = APIRouter(
+    prefix="/internal",
+    tags=["internal"],
+    dependencies=[Depends(require_internal_access)],
+    include_in_schema=False
+)
+
+@router.get("/metrics", response_model=Dict)
+def get_internal_metrics():
+    """Report database pool usage and log queue health for this worker"""
+    return {
+        "pid": os.getpid(),
+        "db_pool": pool_stats(engine),
+        "db_async_pool": async_pool_stats(),
+        "logging": logging_stats()
+    }
+
+@router.get("/generation-usage", response_model=Dict)
+def get_generation_usage(days: float = Query(7, gt=0), session: Session = Depends(get_session)):
+    """Report LLM latency, tokens and cost per payment tier and chain over the last ``days`` days"""
+    since = datetime.utcnow() - timedelta(days=days)
+    return {
+        "since": since.isoformat(),
+        "usage": summarize_usage(load_generation_usage(session, since))
+    }
+
+# Prometheus scrape endpoint, at the conventional /metrics path
+metrics_router = APIRouter(
+    tags=["internal"],
+    dependencies=[Depends(require_internal_access)],
+    include_in_schema=False
+)
+
+@metrics_router.get("/metrics", response_class=PlainTextResponse)
+def get_prometheus_metrics():
+    """Request, database, LLM and external call metrics for this worker, in the Prometheus text format"""
+    record_pool_stats("sync", pool_stats(engine))
+    record_pool_stats("async", async_pool_stats())
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
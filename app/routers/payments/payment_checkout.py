@@ -2,6 +2,7 @@ from typing import Dict
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlmodel import Session
 from app.models import User, get_session
+from app.metrics import track_external_call
 import uuid
 import stripe
 
@@ -82,25 +83,26 @@ async def create_checkout_session(
             return {"checkout_url": success_url.replace("{CHECKOUT_SESSION_ID}", "free-tier")}
         
         # For Pursuit tier, create Stripe checkout session
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[
-                {
-                    "price": price_id,
-                    "quantity": 1,
-                },
-            ],
-            mode=mode,
-            success_url=success_url,
-            cancel_url=cancel_url,
-            client_reference_id=f"{user_id}:{tier}",  # Include tier in reference ID
-            metadata={
-                "tier": tier,
-                "is_regeneration": str(is_regeneration),
-                "is_magic_link_sent": str(is_magic_link_sent),
-                "is_subscription": str(is_subscription)
-            },  # Add metadata for webhook
-        )
+        with track_external_call("stripe", "checkout.Session.create"):
+            checkout_session = stripe.checkout.Session.create(
+                payment_method_types=["card"],
+                line_items=[
+                    {
+                        "price": price_id,
+                        "quantity": 1,
+                    },
+                ],
+                mode=mode,
+                success_url=success_url,
+                cancel_url=cancel_url,
+                client_reference_id=f"{user_id}:{tier}",  # Include tier in reference ID
+                metadata={
+                    "tier": tier,
+                    "is_regeneration": str(is_regeneration),
+                    "is_magic_link_sent": str(is_magic_link_sent),
+                    "is_subscription": str(is_subscription)
+                },  # Add metadata for webhook
+            )
         
         return {"checkout_url": checkout_session.url}
     
@@ -1,11 +1,15 @@
+import logging
 from typing import Dict
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlmodel import Session, select
 from app.models import User, get_session
+from app.metrics import track_external_call
 import uuid
 import stripe
 from datetime import datetime, timedelta
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 @router.get("/{user_id}/payment-status", response_model=Dict)
@@ -40,7 +44,7 @@ async def verify_payment(
             force_active = request_data.get('force_active', False)
     except Exception as e:
         # If there's an error parsing the JSON or no body provided, continue with query parameters
-        print(f"Error parsing request body: {e}")
+        logger.error("Error parsing request body: %s", e)
     
     # Ensure required parameters are present
     if not session_id or not tier:
@@ -57,7 +61,7 @@ async def verify_payment(
     try:
         # Special case for direct updates from payment_success.html or free tier
         if session_id == "direct-update" or session_id == "free-tier":
-            print(f"Direct update requested for user {user_id} to set tier to {tier}")
+            logger.info("Direct update requested for user %s to set tier to %s", user_id, tier)
             
             # For free tier (purpose), just update the payment tier
             if tier == "purpose" or session_id == "free-tier":
@@ -65,7 +69,7 @@ async def verify_payment(
                 session.add(user)
                 session.commit()
                 
-                print(f"Set user {user_id} payment tier to purpose (free tier)")
+                logger.info("Set user %s payment tier to purpose (free tier)", user_id)
                 
                 return {
                     "payment_verified": True,
@@ -79,13 +83,14 @@ async def verify_payment(
                 if user.subscription_id:
                     # Get the subscription details
                     try:
-                        subscription = stripe.Subscription.retrieve(user.subscription_id)
+                        with track_external_call("stripe", "Subscription.retrieve"):
+                            subscription = stripe.Subscription.retrieve(user.subscription_id)
                         
                         # Update user with subscription details
                         if force_active:
                             # Force the subscription status to active
                             user.subscription_status = "active"
-                            print(f"Forced subscription status to active for user {user_id}")
+                            logger.info("Forced subscription status to active for user %s", user_id)
                         else:
                             # Access status using dictionary syntax since Stripe returns a dict-like object
                             user.subscription_status = subscription.get("status")
@@ -99,7 +104,7 @@ async def verify_payment(
                                 user.subscription_end_date = datetime.fromtimestamp(current_period_end)
                             else:
                                 # If current_period_end is None, set a default end date (1 month from now)
-                                print(f"Warning: current_period_end is None for canceled subscription {user.subscription_id}")
+                                logger.warning("current_period_end is None for canceled subscription %s", user.subscription_id)
                                 user.subscription_end_date = datetime.utcnow() + timedelta(days=30)
                         else:
                             # For active subscriptions, clear the end date
@@ -108,15 +113,15 @@ async def verify_payment(
                         session.add(user)
                         session.commit()
                         
-                        print(f"Updated user {user_id} with subscription details from direct update")
+                        logger.info("Updated user %s with subscription details from direct update", user_id)
                     except Exception as e:
-                        print(f"Error retrieving subscription: {e}")
+                        logger.error("Error retrieving subscription: %s", e)
                         
                         # If there was an error retrieving the subscription but force_active is true,
                         # set the subscription status to active anyway
                         if force_active:
                             user.subscription_status = "active"
-                            print(f"Forced subscription status to active for user {user_id} after Stripe error")
+                            logger.info("Forced subscription status to active for user %s after Stripe error", user_id)
                 
                 # If no subscription ID or error retrieving it, set the subscription status
                 # If force_active is true, ensure the subscription status is set to active
@@ -127,9 +132,9 @@ async def verify_payment(
                         user.subscription_status = "active"
                         # For active subscriptions, clear the end date
                         user.subscription_end_date = None
-                        print(f"Forced subscription status to active for user {user_id} with subscription {user.subscription_id}")
+                        logger.info("Forced subscription status to active for user %s with subscription %s", user_id, user.subscription_id)
                     else:
-                        print(f"Warning: Cannot force active status for user {user_id} - no valid subscription ID")
+                        logger.warning("Cannot force active status for user %s - no valid subscription ID", user_id)
             
             # Set the payment tier for Pursuit tier
             user.payment_tier = tier
@@ -138,7 +143,7 @@ async def verify_payment(
             session.add(user)
             session.commit()
             
-            print(f"Set user {user_id} payment tier to {tier} from direct update")
+            logger.info("Set user %s payment tier to %s from direct update", user_id, tier)
             
             return {
                 "payment_verified": True,
@@ -148,7 +153,8 @@ async def verify_payment(
             }
         
         # Normal case - verify the checkout session
-        checkout_session = stripe.checkout.Session.retrieve(session_id)
+        with track_external_call("stripe", "checkout.Session.retrieve"):
+            checkout_session = stripe.checkout.Session.retrieve(session_id)
         
         # Check if the payment was successful
         if checkout_session.get("payment_status") == "paid":
@@ -170,7 +176,8 @@ async def verify_payment(
             if is_subscription or tier == "pursuit":
                 # Get the subscription details if available
                 if checkout_session.get("subscription"):
-                    subscription = stripe.Subscription.retrieve(checkout_session.get("subscription"))
+                    with track_external_call("stripe", "Subscription.retrieve"):
+                        subscription = stripe.Subscription.retrieve(checkout_session.get("subscription"))
                     
                     # Update user with subscription details
                     user.subscription_id = checkout_session.get("subscription")
@@ -185,7 +192,7 @@ async def verify_payment(
                             user.subscription_end_date = datetime.fromtimestamp(current_period_end)
                         else:
                             # If current_period_end is None, set a default end date (1 month from now)
-                            print(f"Warning: current_period_end is None for canceled subscription {user.subscription_id}")
+                            logger.warning("current_period_end is None for canceled subscription %s", user.subscription_id)
                             user.subscription_end_date = datetime.utcnow() + timedelta(days=30)
                     else:
                         # For active subscriptions, clear the end date
@@ -197,7 +204,7 @@ async def verify_payment(
                 session.add(user)
                 session.commit()
                 
-                print(f"Updated user {user_id} with pursuit tier and subscription details: {user.subscription_id}, {user.subscription_status}")
+                logger.info("Updated user %s with pursuit tier and subscription details: %s, %s", user_id, user.subscription_id, user.subscription_status)
             else:
                 # For purpose tier (which is now free), just update the payment tier
                 if tier == "purpose":
@@ -208,7 +215,7 @@ async def verify_payment(
                 session.add(user)
                 session.commit()
                 
-                print(f"Updated user {user_id} with tier: {tier}")
+                logger.info("Updated user %s with tier: %s", user_id, tier)
             
             # If this is a regeneration payment, update the regeneration count
             if is_regeneration:
@@ -239,11 +246,6 @@ async def verify_payment(
     except Exception as e:
         # Log the error with more details
         error_message = f"Error in verify_payment for user {user_id}, session_id {session_id}, tier {tier}: {str(e)}"
-        print(error_message)
-        
-        # Include the error type in the log
-        import traceback
-        print(f"Error type: {type(e).__name__}")
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception(error_message)
         
         raise HTTPException(status_code=500, detail=error_message)
@@ -1,11 +1,16 @@
+import logging
 from fastapi import APIRouter, Request, HTTPException, Depends
 from sqlmodel import Session, select
 from app.models import User, get_session
+from app.results_cache import invalidate_results
+from app.metrics import track_external_call
 import os
 import stripe
 import uuid
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 @router.post("/webhook", status_code=200)
@@ -24,7 +29,7 @@ async def webhook(request: Request, session: Session = Depends(get_session)):
             raise HTTPException(status_code=400, detail="Invalid signature")
         raise HTTPException(status_code=400, detail=str(e))
     
-    print(f"Received webhook event: {event['type']}")
+    logger.info("Received webhook event: %s", event['type'])
     
     # Handle the event
     if event["type"] == "checkout.session.completed":
@@ -45,7 +50,8 @@ async def webhook(request: Request, session: Session = Depends(get_session)):
                     
                     if user:
                         # Get subscription details
-                        subscription = stripe.Subscription.retrieve(checkout_session.get("subscription"))
+                        with track_external_call("stripe", "Subscription.retrieve"):
+                            subscription = stripe.Subscription.retrieve(checkout_session.get("subscription"))
                         
                         # Update user with subscription details
                         user.subscription_id = checkout_session.get("subscription")
@@ -55,10 +61,11 @@ async def webhook(request: Request, session: Session = Depends(get_session)):
                         
                         session.add(user)
                         session.commit()
+                        invalidate_results(user.id)
                         
-                        print(f"Webhook: Updated user {user_id} with pursuit tier and subscription details")
+                        logger.info("Webhook: Updated user %s with pursuit tier and subscription details", user_id)
                 except ValueError:
-                    print(f"Invalid user ID in client reference: {client_ref}")
+                    logger.warning("Invalid user ID in client reference: %s", client_ref)
     
     elif event["type"] == "customer.subscription.updated":
         subscription = event["data"]["object"]
@@ -79,8 +86,9 @@ async def webhook(request: Request, session: Session = Depends(get_session)):
             # Always save the changes to the database
             session.add(user)
             session.commit()
+            invalidate_results(user.id)
             
-            print(f"Webhook: Updated subscription status for user {user.id} to {subscription.get('status')}")
+            logger.info("Webhook: Updated subscription status for user %s to %s", user.id, subscription.get('status'))
     
     elif event["type"] == "customer.subscription.deleted":
         subscription = event["data"]["object"]
@@ -103,8 +111,9 @@ async def webhook(request: Request, session: Session = Depends(get_session)):
             
             session.add(user)
             session.commit()
+            invalidate_results(user.id)
             
-            print(f"Webhook: Subscription {old_subscription_id} deleted for user {user.id}")
-            print(f"Webhook: User downgraded from pursuit to plan tier, subscription fields cleared")
+            logger.info("Webhook: Subscription %s deleted for user %s", old_subscription_id, user.id)
+            logger.info("Webhook: User downgraded from pursuit to plan tier, subscription fields cleared")
     
     return {"status": "success"}
@@ -1,7 +1,9 @@
+import logging
 from typing import Dict
 from fastapi import APIRouter, Depends, HTTPException
 from sqlmodel import Session, select
 from app.models import User, get_session
+from app.metrics import track_external_call
 import uuid
 import os
 import stripe
@@ -9,6 +11,8 @@ from datetime import datetime
 
 from .payment_utils import get_domain
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 @router.post("/{user_id}/cancel-subscription", response_model=Dict)
@@ -30,10 +34,11 @@ async def cancel_subscription(
         subscription_id = user.subscription_id
         
         # Cancel the subscription at period end
-        subscription = stripe.Subscription.modify(
-            subscription_id,
-            cancel_at_period_end=True
-        )
+        with track_external_call("stripe", "Subscription.modify"):
+            subscription = stripe.Subscription.modify(
+                subscription_id,
+                cancel_at_period_end=True
+            )
         
         # Update user's subscription status to "canceled"
         user.subscription_status = "canceled"
@@ -50,11 +55,11 @@ async def cancel_subscription(
             # Fallback: if no current_period_end, set to 30 days from now
             from datetime import timedelta
             user.subscription_end_date = datetime.utcnow() + timedelta(days=30)
-            print(f"Warning: No current_period_end found for subscription {subscription_id}, setting fallback end date")
+            logger.warning("No current_period_end found for subscription %s, setting fallback end date", subscription_id)
         
         # Keep track of when the subscription was canceled
-        print(f"Canceling subscription {subscription_id} for user {user_id}")
-        print(f"User will be downgraded from pursuit to purpose tier at the end of the billing period")
+        logger.info("Canceling subscription %s for user %s", subscription_id, user_id)
+        logger.info("User will be downgraded from pursuit to purpose tier at the end of the billing period")
         
         # Note: A scheduled task should check for expired subscriptions daily and downgrade users
         # from 'pursuit' to 'purpose' tier when subscription_end_date is reached
@@ -71,7 +76,7 @@ async def cancel_subscription(
         }
     
     except Exception as e:
-        print(f"Error canceling subscription: {e}")
+        logger.error("Error canceling subscription: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/{user_id}/subscription-status", response_model=Dict)
@@ -87,7 +92,8 @@ async def get_subscription_status(
     # If user has a subscription ID, get the latest status from Stripe
     if user.subscription_id:
         try:
-            subscription = stripe.Subscription.retrieve(user.subscription_id)
+            with track_external_call("stripe", "Subscription.retrieve"):
+                subscription = stripe.Subscription.retrieve(user.subscription_id)
             
             # Update user's subscription status if it has changed
             if user.subscription_status != subscription.get("status"):
@@ -146,28 +152,29 @@ async def resubscribe(
         # Create a Stripe checkout session directly
         from .payment_utils import stripe_subscription_price_id
         
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[
-                {
-                    "price": stripe_subscription_price_id,
-                    "quantity": 1,
+        with track_external_call("stripe", "checkout.Session.create"):
+            checkout_session = stripe.checkout.Session.create(
+                payment_method_types=["card"],
+                line_items=[
+                    {
+                        "price": stripe_subscription_price_id,
+                        "quantity": 1,
+                    },
+                ],
+                mode="subscription",
+                success_url=success_url,
+                cancel_url=f"{domain}/account/{user_id}",
+                client_reference_id=f"{user_id}:pursuit",
+                metadata={
+                    "tier": "pursuit",
+                    "is_regeneration": "false",
+                    "is_magic_link_sent": "false",
+                    "is_subscription": "true",
+                    "is_resubscription": "true"
                 },
-            ],
-            mode="subscription",
-            success_url=success_url,
-            cancel_url=f"{domain}/account/{user_id}",
-            client_reference_id=f"{user_id}:pursuit",
-            metadata={
-                "tier": "pursuit",
-                "is_regeneration": "false",
-                "is_magic_link_sent": "false",
-                "is_subscription": "true",
-                "is_resubscription": "true"
-            },
-        )
+            )
         
-        print(f"Created resubscription checkout session for user {user_id}")
+        logger.info("Created resubscription checkout session for user %s", user_id)
         
         return {
             "success": True,
@@ -177,5 +184,5 @@ async def resubscribe(
         }
     
     except Exception as e:
-        print(f"Error creating resubscription checkout session: {e}")
+        logger.error("Error creating resubscription checkout session: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,15 +1,36 @@
-from typing import List, Optional, Dict
-from fastapi import APIRouter, Depends, HTTPException, status
+import logging
+from typing import Any, Callable, List, Mapping, Optional, Dict, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import JSON, type_coerce
 from sqlmodel import Session, select
-from app.models import Result, User, FormResponse, get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models import Result, ResultHistory, User, FormResponse, get_session, get_async_session
+import json
 import uuid
 from datetime import datetime
+from app.plan_codec import PlanCodecError, decode_plan
+from app.results_cache import etag_matches, get_cached_payload, invalidate_results, result_etag, set_cached_payload
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/api/results",
     tags=["results"],
 )
 
+async def load_user_and_result(session: AsyncSession, user_id: uuid.UUID) -> Tuple[User, Optional[Result]]:
+    """Fetch a user and their result in one query, raising 404 if the user doesn't exist."""
+    statement = (
+        select(User, Result)
+        .outerjoin(Result, Result.user_id == User.id)
+        .where(User.id == user_id)
+    )
+    row = (await session.exec(statement)).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+    return row[0], row[1]
+
 @router.post("/", response_model=Result)
 def create_result(result: Result, session: Session = Depends(get_session)):
     # Check if user exists
@@ -25,39 +46,145 @@ def create_result(result: Result, session: Session = Depends(get_session)):
     if existing_result:
         existing_result.basic_plan = result.basic_plan
         existing_result.full_plan = result.full_plan
+        # New plans are a new version for the results cache and ETags
+        existing_result.last_generated_at = datetime.utcnow()
         session.add(existing_result)
         session.commit()
         session.refresh(existing_result)
+        invalidate_results(existing_result.user_id)
         return existing_result
     
     # Otherwise create new result
     session.add(result)
     session.commit()
     session.refresh(result)
+    invalidate_results(result.user_id)
     return result
 
 @router.get("/{user_id}", response_model=Result)
-def get_result(user_id: uuid.UUID, session: Session = Depends(get_session)):
-    # Check if user exists
-    user = session.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Get result for this user
-    statement = select(Result).where(Result.user_id == user_id)
-    result = session.exec(statement).first()
+async def get_result(user_id: uuid.UUID, session: AsyncSession = Depends(get_async_session)):
+    # Fetch the user and their result together
+    user, result = await load_user_and_result(session, user_id)
     
     if not result:
         raise HTTPException(status_code=404, detail="Result not found")
     
     return result
 
-@router.get("/{user_id}/summary", response_model=dict)
-def get_result_summary(user_id: uuid.UUID, session: Session = Depends(get_session)):
-    # Check if user exists
-    user = session.get(User, user_id)
-    if not user:
+# Plan keys each view reads. Only these are pulled out of the stored JSON, so a
+# summary read moves a few hundred bytes instead of the whole full plan.
+SUMMARY_KEYS = ("purpose", "mantra")
+FULL_PLAN_KEYS = ("purpose", "mantra", "next_steps", "daily_plan", "obstacles")
+
+SUMMARY_COLUMNS = [
+    *(Result.basic_plan[key].as_string().label(f"basic_{key}") for key in SUMMARY_KEYS),
+    *(Result.full_plan[key].as_string().label(f"full_{key}") for key in SUMMARY_KEYS)
+]
+FULL_COLUMNS = [
+    *(Result.basic_plan[key].as_string().label(f"basic_{key}") for key in SUMMARY_KEYS),
+    # Text keys come back as strings, structured ones as parsed JSON
+    *(
+        (Result.full_plan[key].as_string() if key in SUMMARY_KEYS else type_coerce(Result.full_plan[key], JSON)).label(f"full_{key}")
+        for key in FULL_PLAN_KEYS
+    )
+]
+
+def _present(plan: Mapping[str, Any], prefix: str, keys) -> Dict:
+    """Collect the projected keys a stored plan actually has."""
+    return {key: plan[f"{prefix}{key}"] for key in keys if plan[f"{prefix}{key}"] is not None}
+
+def build_summary_payload(plan: Mapping[str, Any], payment_tier: str, premium: bool) -> Dict:
+    """Shape the projected plan keys into the summary response."""
+    basic_plan = _present(plan, "basic_", SUMMARY_KEYS)
+    
+    # If user has premium access and full plan is available, use the purpose and mantra from there
+    full_plan = _present(plan, "full_", SUMMARY_KEYS) if premium else {}
+    
+    return {
+        "summary": full_plan.get("purpose", basic_plan.get("purpose", "")),
+        "mantra": full_plan.get("mantra", basic_plan.get("mantra", "")),
+        "basic_plan": basic_plan,
+        "full_plan": full_plan,
+        "payment_tier": payment_tier
+    }
+
+def build_full_payload(plan: Mapping[str, Any], payment_tier: str, premium: bool) -> Dict:
+    """Shape the projected plan keys into the full results response."""
+    basic_plan = _present(plan, "basic_", SUMMARY_KEYS)
+    
+    # Structure the full plan data for better frontend display
+    structured_full_plan = {
+        key: plan[f"full_{key}"] if plan[f"full_{key}"] is not None else ""
+        for key in FULL_PLAN_KEYS
+    }
+    
+    return {
+        "summary": structured_full_plan.get("purpose", basic_plan.get("purpose", "")),
+        "mantra": structured_full_plan.get("mantra", basic_plan.get("mantra", "")),
+        "basic_plan": basic_plan,
+        "full_plan": structured_full_plan,
+        "payment_tier": payment_tier
+    }
+
+async def load_user_and_result_version(session: AsyncSession, user_id: uuid.UUID) -> Tuple[User, Optional[datetime]]:
+    """
+    Fetch a user and when their result was last generated, without the plans.
+    
+    Returns (user, last_generated_at), where last_generated_at is None if the
+    user has no result. Raises 404 if the user doesn't exist.
+    """
+    statement = (
+        select(User, Result.last_generated_at)
+        .outerjoin(Result, Result.user_id == User.id)
+        .where(User.id == user_id)
+    )
+    row = (await session.exec(statement)).first()
+    if not row:
         raise HTTPException(status_code=404, detail="User not found")
+    return row[0], row[1]
+
+async def respond_with_result_view(
+    request: Request,
+    session: AsyncSession,
+    user: User,
+    last_generated_at: datetime,
+    view: str,
+    columns: List,
+    build: Callable[[Mapping[str, Any], str, bool], Dict]
+) -> Response:
+    """
+    Serve a results view from the payload cache, with ETag revalidation.
+    
+    A matching If-None-Match gets a 304 before the plans are read. Otherwise
+    the cached payload for this version is used, or the plan keys in
+    ``columns`` are selected and shaped by ``build`` and cached.
+    """
+    from app.routers.payments.payment_utils import has_premium_access
+    premium = has_premium_access(user)
+    etag = result_etag(user.id, view, last_generated_at, user.payment_tier, premium)
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    
+    payload = get_cached_payload(user.id, view, etag)
+    if payload is None:
+        statement = select(*columns, Result.last_generated_at).where(Result.user_id == user.id)
+        row = (await session.exec(statement)).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Result not found")
+        plan = row._mapping
+        # Tag the payload with the version actually loaded, in case a
+        # regeneration landed between the two queries
+        etag = result_etag(user.id, view, plan["last_generated_at"], user.payment_tier, premium)
+        payload = build(plan, user.payment_tier, premium)
+        set_cached_payload(user.id, view, etag, payload)
+    
+    return JSONResponse(payload, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+@router.get("/{user_id}/summary", response_model=dict)
+async def get_result_summary(user_id: uuid.UUID, request: Request, session: AsyncSession = Depends(get_async_session)):
+    # Fetch the user and their result's version, not the plans themselves
+    user, last_generated_at = await load_user_and_result_version(session, user_id)
     
     # Check if user has at least basic tier
     if user.payment_tier == "none":
@@ -66,53 +193,15 @@ def get_result_summary(user_id: uuid.UUID, session: Session = Depends(get_sessio
             detail="Basic payment required to access summary results"
         )
     
-    # Get result for this user
-    statement = select(Result).where(Result.user_id == user_id)
-    result = session.exec(statement).first()
-    
-    if not result:
+    if last_generated_at is None:
         raise HTTPException(status_code=404, detail="Result not found")
     
-    # Parse the basic plan JSON
-    import json
-    try:
-        basic_plan = json.loads(result.basic_plan)
-    except (json.JSONDecodeError, TypeError):
-        # Handle case where basic_plan is not valid JSON
-        basic_plan = {"purpose": "", "mantra": ""}
-    
-    # If user has premium access and full plan is available, use the purpose and mantra from there
-    from app.routers.payments.payment_utils import has_premium_access
-    full_plan = {}
-    if has_premium_access(user) and result.full_plan:
-        try:
-            full_plan = json.loads(result.full_plan)
-            # Use premium content if available
-            purpose = full_plan.get("purpose", basic_plan.get("purpose", ""))
-            mantra = full_plan.get("mantra", basic_plan.get("mantra", ""))
-        except (json.JSONDecodeError, TypeError):
-            # Fall back to basic plan if full plan parsing fails
-            purpose = basic_plan.get("purpose", "")
-            mantra = basic_plan.get("mantra", "")
-    else:
-        # Use basic plan content
-        purpose = basic_plan.get("purpose", "")
-        mantra = basic_plan.get("mantra", "")
-    
-    return {
-        "summary": purpose,
-        "mantra": mantra,
-        "basic_plan": basic_plan,
-        "full_plan": full_plan if full_plan else {},
-        "payment_tier": user.payment_tier
-    }
+    return await respond_with_result_view(request, session, user, last_generated_at, "summary", SUMMARY_COLUMNS, build_summary_payload)
 
 @router.get("/{user_id}/full", response_model=dict)
-def get_full_result(user_id: uuid.UUID, session: Session = Depends(get_session)):
-    # Check if user exists
-    user = session.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+async def get_full_result(user_id: uuid.UUID, request: Request, session: AsyncSession = Depends(get_async_session)):
+    # Fetch the user and their result's version, not the plans themselves
+    user, last_generated_at = await load_user_and_result_version(session, user_id)
     
     # Check if user has premium access (handles canceled subscriptions properly)
     from app.routers.payments.payment_utils import has_premium_access
@@ -122,55 +211,16 @@ def get_full_result(user_id: uuid.UUID, session: Session = Depends(get_session))
             detail="Plan, Premium or Pursuit tier required to access full results"
         )
     
-    # Get result for this user
-    statement = select(Result).where(Result.user_id == user_id)
-    result = session.exec(statement).first()
-    
-    if not result:
+    if last_generated_at is None:
         raise HTTPException(status_code=404, detail="Result not found")
     
-    # Parse the basic and full plan JSON
-    import json
-    try:
-        basic_plan = json.loads(result.basic_plan)
-    except (json.JSONDecodeError, TypeError):
-        # Handle case where basic_plan is not valid JSON
-        basic_plan = {"purpose": "", "mantra": ""}
-    
-    try:
-        full_plan_json = json.loads(result.full_plan)
-    except (json.JSONDecodeError, TypeError):
-        # Handle case where full_plan is not valid JSON
-        full_plan_json = {}
-    
-    # Structure the full plan data for better frontend display
-    structured_full_plan = {
-        "purpose": full_plan_json.get("purpose", ""),
-        "mantra": full_plan_json.get("mantra", ""),
-        "next_steps": full_plan_json.get("next_steps", ""),
-        "daily_plan": full_plan_json.get("daily_plan", ""),
-        "obstacles": full_plan_json.get("obstacles", "")
-    }
-    
-    return {
-        "summary": structured_full_plan.get("purpose", basic_plan.get("purpose", "")),
-        "mantra": structured_full_plan.get("mantra", basic_plan.get("mantra", "")),
-        "basic_plan": basic_plan,
-        "full_plan": structured_full_plan,
-        "payment_tier": user.payment_tier
-    }
+    return await respond_with_result_view(request, session, user, last_generated_at, "full", FULL_COLUMNS, build_full_payload)
 
 @router.get("/{user_id}/check-results", response_model=Dict)
-def check_results(user_id: uuid.UUID, session: Session = Depends(get_session)):
+async def check_results(user_id: uuid.UUID, session: AsyncSession = Depends(get_async_session)):
     """Check if results exist for a user and when they were last generated"""
-    # Check if user exists
-    user = session.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Check if results exist for this user
-    statement = select(Result).where(Result.user_id == user_id)
-    result = session.exec(statement).first()
+    # Fetch the user and their result together
+    user, result = await load_user_and_result(session, user_id)
     
     if result and result.basic_plan:
         # Format the last generated timestamp
@@ -189,3 +239,47 @@ def check_results(user_id: uuid.UUID, session: Session = Depends(get_session)):
         "last_generated_at": None,
         "regeneration_count": 0
     }
+
+@router.get("/{user_id}/history", response_model=Dict)
+async def get_result_history(
+    user_id: uuid.UUID,
+    limit: int = Query(10, ge=1, le=50),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Previous plans replaced by regenerations, newest first"""
+    user = await session.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if user.payment_tier == "none":
+        raise HTTPException(
+            status_code=403, 
+            detail="Basic payment required to access result history"
+        )
+    
+    # Full plans stay behind premium access, like the full results
+    from app.routers.payments.payment_utils import has_premium_access
+    plan_fields = ["basic_plan", "full_plan"] if has_premium_access(user) else ["basic_plan"]
+    
+    statement = (
+        select(ResultHistory)
+        .where(ResultHistory.user_id == user_id, ResultHistory.plan_field.in_(plan_fields))
+        .order_by(ResultHistory.generated_at.desc())
+        .limit(limit)
+    )
+    entries = (await session.exec(statement)).all()
+    
+    history = []
+    for entry in entries:
+        try:
+            plan = json.loads(decode_plan(entry.payload))
+        except (json.JSONDecodeError, PlanCodecError) as e:
+            logger.warning("Skipping unreadable history entry %s: %s", entry.id, e)
+            continue
+        history.append({
+            "plan_field": entry.plan_field,
+            "generated_at": entry.generated_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "plan": plan
+        })
+    
+    return {"history": history}
@@ -1,9 +1,12 @@
-from typing import List, Optional
+import logging
+from typing import Any, Dict, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlmodel import Session, select
-from app.models import User, get_session
+from sqlmodel import Session, select, func
+from app.models import User, FormResponse, Result, get_session
 import uuid
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(
     prefix="/api/users",
     tags=["users"],
@@ -12,8 +15,7 @@ router = APIRouter(
 @router.post("/", response_model=User)
 def create_user(user: User, session: Session = Depends(get_session)):
     try:
-        # Print user data for debugging
-        print(f"Creating user with data: {user.dict()}")
+        logger.info("Creating user %s", user.email)
         
         # Check if user with this email already exists
         statement = select(User).where(User.email == user.email)
@@ -21,7 +23,7 @@ def create_user(user: User, session: Session = Depends(get_session)):
         
         if existing_user:
             # Return the existing user instead of creating a duplicate
-            print(f"User with email {user.email} already exists, returning existing user")
+            logger.info("User with email %s already exists, returning existing user", user.email)
             return existing_user
         
         session.add(user)
@@ -30,7 +32,7 @@ def create_user(user: User, session: Session = Depends(get_session)):
         return user
     except Exception as e:
         session.rollback()
-        print(f"Error creating user: {str(e)}")
+        logger.error("Error creating user: %s", e)
         
         # Check if this is a uniqueness violation
         if "unique constraint" in str(e).lower() and "email" in str(e).lower():
@@ -56,6 +58,96 @@ def create_user(user: User, session: Session = Depends(get_session)):
             detail=f"Error creating user: {str(e)}"
         )
 
+def get_user_summary(session: Session, email: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a user's fields, response count and result metadata by email.
+    
+    Runs as a single query: the response count is a correlated COUNT and the
+    result comes from a LEFT JOIN, so no FormResponse rows are loaded.
+    
+    Returns:
+        The summary dictionary, or None if no user has this email
+    """
+    response_count = (
+        select(func.count(FormResponse.id))
+        .where(FormResponse.user_id == User.id)
+        .correlate(User)
+        .scalar_subquery()
+    )
+    statement = (
+        select(
+            User.id,
+            User.name,
+            User.email,
+            User.dob,
+            User.progress_state,
+            User.payment_tier,
+            response_count.label("response_count"),
+            Result.id.label("result_id"),
+            Result.last_generated_at,
+            Result.regeneration_count
+        )
+        .outerjoin(Result, Result.user_id == User.id)
+        .where(User.email == email)
+    )
+    row = session.exec(statement).first()
+    if not row:
+        return None
+    
+    # Get formatted DOB
+    dob_formatted = None
+    if row.dob:
+        try:
+            dob_formatted = row.dob.strftime("%Y-%m-%d")
+        except:
+            pass
+    
+    summary = {
+        "found": True,
+        "id": str(row.id),  # Ensure ID is a string
+        "name": row.name,
+        "email": row.email,
+        "dob": dob_formatted,
+        "progress_state": row.progress_state,
+        "payment_tier": row.payment_tier,
+        "has_responses": row.response_count > 0,
+        "response_count": row.response_count,
+        "has_results": row.result_id is not None
+    }
+    
+    # Add result details if available
+    if row.result_id is not None:
+        summary["last_generated_at"] = row.last_generated_at.isoformat() if row.last_generated_at else None
+        summary["regeneration_count"] = row.regeneration_count
+    
+    return summary
+
+def _find_user_by_email(email: Optional[str], session: Session, label: str = "") -> Dict[str, Any]:
+    """Shared implementation of the GET and POST find-by-email endpoints"""
+    try:
+        if not email:
+            return {"found": False, "error": "Email is required"}
+            
+        logger.debug("Finding user by email%s: %s", label, email)
+        result = get_user_summary(session, email)
+        
+        if not result:
+            logger.info("User not found with email: %s", email)
+            return {"found": False}
+        
+        logger.debug("User found%s: %s", label, result["id"])
+        return result
+    except Exception as e:
+        # Log the error for debugging
+        logger.error("Error finding user by email%s: %s", label, e)
+        # Return a detailed error response
+        return {"found": False, "error": str(e), "error_type": type(e).__name__}
+
+@router.get("/find-by-email")
+def find_user_by_email(email: Optional[str] = Query(None), session: Session = Depends(get_session)):
+    """Find a user by email address to allow returning users to continue"""
+    return _find_user_by_email(email, session)
+
 @router.get("/{user_id}", response_model=User)
 def get_user(user_id: uuid.UUID, session: Session = Depends(get_session)):
     try:
@@ -99,7 +191,7 @@ def update_progress(
     session: Session = Depends(get_session)
 ):
     try:
-        print(f"Updating progress for user {user_id} with data: {progress_data}")
+        logger.info("Updating progress for user %s with data: %s", user_id, progress_data)
         
         user = session.get(User, user_id)
         if not user:
@@ -110,7 +202,7 @@ def update_progress(
             raise HTTPException(status_code=400, detail="progress_state is required")
             
         progress_state = progress_data['progress_state']
-        print(f"Setting progress_state to: {progress_state}")
+        logger.info("Setting progress_state to: %s", progress_state)
         
         user.progress_state = progress_state
         session.add(user)
@@ -119,7 +211,7 @@ def update_progress(
         return user
     except Exception as e:
         session.rollback()
-        print(f"Error updating progress: {str(e)}")
+        logger.error("Error updating progress: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error updating progress: {str(e)}"
@@ -173,76 +265,12 @@ class AnonymousUserRequest(BaseModel):
     subscription_status: Optional[str] = None
     subscription_end_date: Optional[datetime] = None
 
-@router.get("/find-by-email")
-def find_user_by_email(email: Optional[str] = Query(None), session: Session = Depends(get_session)):
-    """Find a user by email address to allow returning users to continue"""
-    try:
-        if not email:
-            return {"found": False, "error": "Email is required"}
-            
-        print(f"Finding user by email: {email}")
-        statement = select(User).where(User.email == email)
-        user = session.exec(statement).first()
-        
-        if not user:
-            print(f"User not found with email: {email}")
-            return {"found": False}
-        
-        # Check if user has responses
-        from app.models.models import FormResponse, Result
-        responses_statement = select(FormResponse).where(FormResponse.user_id == user.id)
-        responses = session.exec(responses_statement).all()
-        has_responses = len(responses) > 0
-        
-        # Get response count
-        response_count = len(responses)
-        
-        # Check if user has results
-        results_statement = select(Result).where(Result.user_id == user.id)
-        result_obj = session.exec(results_statement).first()
-        has_results = result_obj is not None
-        
-        # Get formatted DOB
-        dob_formatted = None
-        if user.dob:
-            try:
-                dob_formatted = user.dob.strftime("%Y-%m-%d")
-            except:
-                pass
-        
-        # Return a detailed user object with all necessary information
-        result = {
-            "found": True,
-            "id": str(user.id),
-            "name": user.name,
-            "email": user.email,
-            "dob": dob_formatted,
-            "progress_state": user.progress_state,
-            "payment_tier": user.payment_tier,
-            "has_responses": has_responses,
-            "response_count": response_count,
-            "has_results": has_results
-        }
-        
-        # Add result details if available
-        if result_obj:
-            result["last_generated_at"] = result_obj.last_generated_at.isoformat() if result_obj.last_generated_at else None
-            result["regeneration_count"] = result_obj.regeneration_count
-        
-        print(f"User found: {result}")
-        return result
-    except Exception as e:
-        # Log the error for debugging
-        print(f"Error finding user by email: {str(e)}")
-        # Return a detailed error response
-        return {"found": False, "error": str(e), "error_type": type(e).__name__}
-
 @router.post("/from-anonymous", response_model=User)
 def create_user_from_anonymous(user_data: AnonymousUserRequest, session: Session = Depends(get_session)):
     """Create a new user from anonymous responses and transfer the responses to the new user"""
     try:
         # Print user data for debugging
-        print(f"Creating user from anonymous data: {user_data.dict()}")
+        logger.info("Creating user %s from anonymous data", user_data.email)
         
         # Check if user with this email already exists
         statement = select(User).where(User.email == user_data.email)
@@ -250,7 +278,7 @@ def create_user_from_anonymous(user_data: AnonymousUserRequest, session: Session
         
         if existing_user:
             # Return the existing user instead of creating a duplicate
-            print(f"User with email {user_data.email} already exists, returning existing user")
+            logger.info("User with email %s already exists, returning existing user", user_data.email)
             return existing_user
         
         # Create new user
@@ -275,7 +303,7 @@ def create_user_from_anonymous(user_data: AnonymousUserRequest, session: Session
         if user_data.payment_tier == "pursuit" and not new_user.subscription_id:
             # Log that we're creating a pursuit tier user without subscription details
             # This should only happen for legacy users or testing scenarios
-            print(f"Warning: Creating pursuit tier user without subscription details for {user_data.email}")
+            logger.warning("Creating pursuit tier user without subscription details for %s", user_data.email)
         
         session.add(new_user)
         session.commit()
@@ -288,7 +316,7 @@ def create_user_from_anonymous(user_data: AnonymousUserRequest, session: Session
         return new_user
     except Exception as e:
         session.rollback()
-        print(f"Error creating user from anonymous: {str(e)}")
+        logger.error("Error creating user from anonymous: %s", e)
         
         # Check if this is a uniqueness violation
         if "unique constraint" in str(e).lower() and "email" in str(e).lower():
@@ -322,7 +350,7 @@ def transfer_anonymous_responses(session: Session, anonymous_session_id: str, us
         # It will make a request to the client to get the anonymous responses
         # and then call the transfer-anonymous endpoint to save them
         
-        print(f"Transferring anonymous responses from session {anonymous_session_id} to user {user_id}")
+        logger.info("Transferring anonymous responses from session %s to user %s", anonymous_session_id, user_id)
         
         # In a real implementation, we would make a request to the client
         # to get the anonymous responses from localStorage
@@ -343,73 +371,10 @@ def transfer_anonymous_responses(session: Session, anonymous_session_id: str, us
         
         return True
     except Exception as e:
-        print(f"Error transferring anonymous responses: {str(e)}")
+        logger.error("Error transferring anonymous responses: %s", e)
         return False
 
 @router.post("/find-by-email")
 def find_user_by_email_post(email_request: EmailRequest, session: Session = Depends(get_session)):
     """POST version of find-by-email endpoint"""
-    # Extract email from request body
-    email = email_request.email
-    
-    # Use the same logic as the GET endpoint
-    try:
-        if not email:
-            return {"found": False, "error": "Email is required"}
-            
-        print(f"Finding user by email (POST): {email}")
-        statement = select(User).where(User.email == email)
-        user = session.exec(statement).first()
-        
-        if not user:
-            print(f"User not found with email: {email}")
-            return {"found": False}
-        
-        # Check if user has responses
-        from app.models.models import FormResponse, Result
-        responses_statement = select(FormResponse).where(FormResponse.user_id == user.id)
-        responses = session.exec(responses_statement).all()
-        has_responses = len(responses) > 0
-        
-        # Get response count
-        response_count = len(responses)
-        
-        # Check if user has results
-        results_statement = select(Result).where(Result.user_id == user.id)
-        result_obj = session.exec(results_statement).first()
-        has_results = result_obj is not None
-        
-        # Get formatted DOB
-        dob_formatted = None
-        if user.dob:
-            try:
-                dob_formatted = user.dob.strftime("%Y-%m-%d")
-            except:
-                pass
-        
-        # Return a detailed user object with all necessary information
-        result = {
-            "found": True,
-            "id": str(user.id),  # Ensure ID is a string
-            "name": user.name,
-            "email": user.email,
-            "dob": dob_formatted,
-            "progress_state": user.progress_state,
-            "payment_tier": user.payment_tier,
-            "has_responses": has_responses,
-            "response_count": response_count,
-            "has_results": has_results
-        }
-        
-        # Add result details if available
-        if result_obj:
-            result["last_generated_at"] = result_obj.last_generated_at.isoformat() if result_obj.last_generated_at else None
-            result["regeneration_count"] = result_obj.regeneration_count
-        
-        print(f"User found (POST): {result}")
-        return result
-    except Exception as e:
-        # Log the error for debugging
-        print(f"Error finding user by email (POST): {str(e)}")
-        # Return a detailed error response
-        return {"found": False, "error": str(e), "error_type": type(e).__name__}
+    return _find_user_by_email(email_request.email, session, " (POST)")
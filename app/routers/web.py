@@ -1,13 +1,17 @@
+import logging
 from fastapi import APIRouter, Request, Depends, HTTPException
 from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
 from fastapi.templating import Jinja2Templates
-from sqlmodel import Session, select
-from app.models import User, Result, get_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.models import User, Result, get_async_session
 import uuid
 import os
 import pathlib
 
-from app.routers.auth import get_authenticated_user
+from app.routers.auth import CurrentUser, get_current_user
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["web"])
 
@@ -58,7 +62,7 @@ async def blog_post(request: Request, post_slug: str):
         })
     except Exception as e:
         # If the post doesn't exist, redirect to the blog index
-        print(f"Blog post not found: {post_slug}, error: {str(e)}")
+        logger.warning("Blog post not found: %s, error: %s", post_slug, e)
         return RedirectResponse(url="/blog", status_code=303)
 
 # Guides routes
@@ -83,7 +87,7 @@ async def guide_item(request: Request, guide_slug: str):
         })
     except Exception as e:
         # If the guide doesn't exist, redirect to the guides index
-        print(f"Guide not found: {guide_slug}, error: {str(e)}")
+        logger.warning("Guide not found: %s, error: %s", guide_slug, e)
         return RedirectResponse(url="/guides", status_code=303)
 
 # FAQ routes
@@ -104,48 +108,37 @@ async def faq_category(request: Request, category: str):
         })
     except Exception as e:
         # If the category doesn't exist, redirect to the FAQ index
-        print(f"FAQ category not found: {category}, error: {str(e)}")
+        logger.warning("FAQ category not found: %s, error: %s", category, e)
         return RedirectResponse(url="/faq", status_code=303)
 
 @router.get("/", response_class=HTMLResponse)
-async def index(request: Request):
+async def index(request: Request, current_user: CurrentUser = Depends(get_current_user)):
     """
     Show the home page or redirect to user's results/form if authenticated
     
     If the user is authenticated via Stytch, try to find their account
     and redirect to their results or form page
     """
-    # Check if user is authenticated
-    stytch_user = await get_authenticated_user(request)
-    
-    if stytch_user and hasattr(stytch_user, 'emails') and stytch_user.emails:
-        # User is authenticated, check if they exist in our database
-        db = next(get_session())
-        user_email = stytch_user.emails[0].email
+    # Authenticated user with an account in our database
+    db_user = current_user.user
+    
+    if db_user:
+        # Check if user has results
+        if current_user.has_results:
+            # If user has results, redirect to results page
+            logger.debug("User has results, redirecting to results page")
+            return RedirectResponse(url=f"/results/{db_user.id}", status_code=303)
         
-        statement = select(User).where(User.email == user_email)
-        db_user = db.exec(statement).first()
+        # Get progress state
+        progress_state = int(db_user.progress_state)
         
-        if db_user:
-            # Check if user has results
-            results_statement = select(Result).where(Result.user_id == db_user.id)
-            user_results = db.exec(results_statement).first()
-            
-            if user_results:
-                # If user has results, redirect to results page
-                print(f"[DEBUG] User has results, redirecting to results page")
-                return RedirectResponse(url=f"/results/{db_user.id}", status_code=303)
-            
-            # Get progress state
-            progress_state = int(db_user.progress_state)
-            
-            if progress_state > 0:
-                # User exists with progress, redirect to their form with progress
-                print(f"[DEBUG] User has progress, redirecting to form page")
-                return RedirectResponse(url=f"/form/{db_user.id}", status_code=303)
-            
-            # User exists but has no progress or results, redirect to their form
+        if progress_state > 0:
+            # User exists with progress, redirect to their form with progress
+            logger.debug("User has progress, redirecting to form page")
             return RedirectResponse(url=f"/form/{db_user.id}", status_code=303)
+        
+        # User exists but has no progress or results, redirect to their form
+        return RedirectResponse(url=f"/form/{db_user.id}", status_code=303)
     
     # If not authenticated or user not found, show the home page
     return templates.TemplateResponse("index.html", {"request": request})
@@ -156,118 +149,90 @@ async def register(request: Request):
     return RedirectResponse(url="/form")
 
 @router.get("/login", response_class=HTMLResponse)
-async def login(request: Request, redirect: str = None):
+async def login(request: Request, redirect: str = None, current_user: CurrentUser = Depends(get_current_user)):
     """
     Show the login page with magic link form or redirect if already authenticated
     
     If the user is already authenticated, redirect to their results or form page
     """
-    # Check if user is authenticated
-    stytch_user = await get_authenticated_user(request)
-    
-    if stytch_user and hasattr(stytch_user, 'emails') and stytch_user.emails:
-        # User is authenticated, check if they exist in our database
-        db = next(get_session())
-        user_email = stytch_user.emails[0].email
+    # Authenticated user with an account in our database
+    db_user = current_user.user
+    
+    if db_user:
+        # If redirect URL is provided, use it
+        if redirect:
+            logger.debug("Redirecting to: %s", redirect)
+            return RedirectResponse(url=redirect, status_code=303)
         
-        statement = select(User).where(User.email == user_email)
-        db_user = db.exec(statement).first()
+        # Check if user has results
+        if current_user.has_results:
+            # If user has results, redirect to results page
+            logger.debug("User has results, redirecting to results page")
+            return RedirectResponse(url=f"/results/{db_user.id}", status_code=303)
         
-        if db_user:
-            # If redirect URL is provided, use it
-            if redirect:
-                print(f"[DEBUG] Redirecting to: {redirect}")
-                return RedirectResponse(url=redirect, status_code=303)
-            
-            # Check if user has results
-            results_statement = select(Result).where(Result.user_id == db_user.id)
-            user_results = db.exec(results_statement).first()
-            
-            if user_results:
-                # If user has results, redirect to results page
-                print(f"[DEBUG] User has results, redirecting to results page")
-                return RedirectResponse(url=f"/results/{db_user.id}", status_code=303)
-            
-            # Get progress state
-            progress_state = int(db_user.progress_state)
-            
-            if progress_state > 0:
-                # User exists with progress, redirect to their form with progress
-                print(f"[DEBUG] User has progress, redirecting to form page")
-                return RedirectResponse(url=f"/form/{db_user.id}", status_code=303)
+        # Get progress state
+        progress_state = int(db_user.progress_state)
+        
+        if progress_state > 0:
+            # User exists with progress, redirect to their form with progress
+            logger.debug("User has progress, redirecting to form page")
+            return RedirectResponse(url=f"/form/{db_user.id}", status_code=303)
     
     # If not authenticated or user not found, show the login page
     return templates.TemplateResponse("login.html", {"request": request, "redirect": redirect})
 
 @router.get("/form", response_class=HTMLResponse)
-async def form(request: Request):
+async def form(request: Request, current_user: CurrentUser = Depends(get_current_user)):
     """
     Show the form page for new users or authenticated users
     
     If the user is authenticated via Stytch, try to find their account
     and redirect to their form with progress
     """
-    # Check if user is authenticated
-    stytch_user = await get_authenticated_user(request)
-    
-    if stytch_user and hasattr(stytch_user, 'emails') and stytch_user.emails:
-        # User is authenticated, check if they exist in our database
-        db = next(get_session())
-        user_email = stytch_user.emails[0].email
+    # Authenticated user with an account in our database
+    db_user = current_user.user
+    
+    if db_user:
+        # Check if user has results
+        if current_user.has_results:
+            # If user has results, redirect to results page
+            logger.debug("User has results, redirecting to results page")
+            return RedirectResponse(url=f"/results/{db_user.id}", status_code=303)
         
-        statement = select(User).where(User.email == user_email)
-        db_user = db.exec(statement).first()
+        # Get progress state
+        progress_state = int(db_user.progress_state)
         
-        if db_user:
-            # Check if user has results
-            results_statement = select(Result).where(Result.user_id == db_user.id)
-            user_results = db.exec(results_statement).first()
-            
-            if user_results:
-                # If user has results, redirect to results page
-                print(f"[DEBUG] User has results, redirecting to results page")
-                return RedirectResponse(url=f"/results/{db_user.id}", status_code=303)
-            
-            # Get progress state
-            progress_state = int(db_user.progress_state)
-            
-            if progress_state > 0:
-                # User exists with progress, redirect to their form with progress
-                return RedirectResponse(url=f"/form/{db_user.id}", status_code=303)
-            else:
-                # User exists but has no progress, redirect to their form
-                return RedirectResponse(url=f"/form/{db_user.id}", status_code=303)
+        if progress_state > 0:
+            # User exists with progress, redirect to their form with progress
+            return RedirectResponse(url=f"/form/{db_user.id}", status_code=303)
+        else:
+            # User exists but has no progress, redirect to their form
+            return RedirectResponse(url=f"/form/{db_user.id}", status_code=303)
     
     # If not authenticated or user not found, show the form for new users
     return templates.TemplateResponse("form.html", {"request": request})
 
 @router.get("/form/{user_id}", response_class=HTMLResponse)
-async def form_with_user(request: Request, user_id: uuid.UUID, session: Session = Depends(get_session)):
+async def form_with_user(
+    request: Request,
+    user_id: uuid.UUID,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     # Check if user exists
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         return RedirectResponse(url="/register")
     
-    # Check if user is authenticated
-    stytch_user = await get_authenticated_user(request)
-    
     # If user is not authenticated, redirect to login
-    if not stytch_user:
+    if not current_user.authenticated:
         return RedirectResponse(url=f"/login?redirect=/form/{user_id}", status_code=303)
     
-    # If user is authenticated, check if the email matches
-    if stytch_user and hasattr(stytch_user, 'emails') and stytch_user.emails:
-        stytch_email = stytch_user.emails[0].email
-        
-        # If the authenticated user's email doesn't match the requested user's email,
-        # redirect to their own form
-        if stytch_email != user.email:
-            # Find the user with the authenticated email
-            statement = select(User).where(User.email == stytch_email)
-            auth_user = session.exec(statement).first()
-            
-            if auth_user:
-                return RedirectResponse(url=f"/form/{auth_user.id}", status_code=303)
+    # If the authenticated user's email doesn't match the requested user's email,
+    # redirect to their own form
+    if current_user.email and current_user.email != user.email:
+        if current_user.user:
+            return RedirectResponse(url=f"/form/{current_user.user.id}", status_code=303)
     
     # Get current progress
     progress = int(user.progress_state)
@@ -300,40 +265,27 @@ async def results(
     user_id: uuid.UUID, 
     payment_success: bool = False,
     tier: str = None,
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_async_session),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     # Check if user exists
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Check if user is authenticated
-    stytch_user = await get_authenticated_user(request)
-    
     # If user is not authenticated, redirect to login
-    if not stytch_user:
+    if not current_user.authenticated:
         return RedirectResponse(url=f"/login?redirect=/results/{user_id}", status_code=303)
     
-    # If user is authenticated, check if the email matches
-    if stytch_user and hasattr(stytch_user, 'emails') and stytch_user.emails:
-        stytch_email = stytch_user.emails[0].email
-        
-        # If the authenticated user's email doesn't match the requested user's email,
-        # redirect to their own results or form
-        if stytch_email != user.email:
-            # Find the user with the authenticated email
-            statement = select(User).where(User.email == stytch_email)
-            auth_user = session.exec(statement).first()
-            
-            if auth_user:
-                # Check if authenticated user has results
-                auth_results_statement = select(Result).where(Result.user_id == auth_user.id)
-                auth_results = session.exec(auth_results_statement).first()
-                
-                if auth_results:
-                    return RedirectResponse(url=f"/results/{auth_user.id}", status_code=303)
-                else:
-                    return RedirectResponse(url=f"/form/{auth_user.id}", status_code=303)
+    # If the authenticated user's email doesn't match the requested user's email,
+    # redirect to their own results or form
+    if current_user.email and current_user.email != user.email:
+        auth_user = current_user.user
+        if auth_user:
+            if current_user.has_results:
+                return RedirectResponse(url=f"/results/{auth_user.id}", status_code=303)
+            else:
+                return RedirectResponse(url=f"/form/{auth_user.id}", status_code=303)
     
     # If payment was successful, update the user's payment tier
     if payment_success and tier and tier in ["basic", "premium"]:
@@ -341,16 +293,18 @@ async def results(
         if (tier == "premium" or user.payment_tier == "none"):
             user.payment_tier = tier
             session.add(user)
-            session.commit()
+            await session.commit()
             
             # Log the payment success
-            print(f"[DEBUG] Payment successful for user {user_id}, tier: {tier}")
+            logger.debug("Payment successful for user %s, tier: %s", user_id, tier)
     
-    # Check if results exist
-    statement = select(Result).where(Result.user_id == user_id)
-    result = session.exec(statement).first()
+    # Check if results exist; already known when viewing your own results
+    if current_user.user and current_user.user.id == user_id:
+        has_results = current_user.has_results
+    else:
+        has_results = (await session.exec(select(Result.id).where(Result.user_id == user_id))).first() is not None
     
-    if not result:
+    if not has_results:
         # If no results, redirect to form
         return RedirectResponse(url=f"/form/{user_id}")
     
@@ -384,33 +338,27 @@ async def payment_success(request: Request, user_id: uuid.UUID, tier: str, email
     )
 
 @router.get("/account/{user_id}", response_class=HTMLResponse)
-async def account(request: Request, user_id: uuid.UUID, session: Session = Depends(get_session)):
+async def account(
+    request: Request,
+    user_id: uuid.UUID,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """Show the account page for a user"""
     # Check if user exists
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Check if user is authenticated
-    stytch_user = await get_authenticated_user(request)
-    
     # If user is not authenticated, redirect to login
-    if not stytch_user:
+    if not current_user.authenticated:
         return RedirectResponse(url=f"/login?redirect=/account/{user_id}", status_code=303)
     
-    # If user is authenticated, check if the email matches
-    if stytch_user and hasattr(stytch_user, 'emails') and stytch_user.emails:
-        stytch_email = stytch_user.emails[0].email
-        
-        # If the authenticated user's email doesn't match the requested user's email,
-        # redirect to their own account
-        if stytch_email != user.email:
-            # Find the user with the authenticated email
-            statement = select(User).where(User.email == stytch_email)
-            auth_user = session.exec(statement).first()
-            
-            if auth_user:
-                return RedirectResponse(url=f"/account/{auth_user.id}", status_code=303)
+    # If the authenticated user's email doesn't match the requested user's email,
+    # redirect to their own account
+    if current_user.email and current_user.email != user.email:
+        if current_user.user:
+            return RedirectResponse(url=f"/account/{current_user.user.id}", status_code=303)
     
     return templates.TemplateResponse(
         "account.html", 
@@ -431,30 +379,22 @@ async def start_purpose(request: Request):
     return RedirectResponse(url="/form?tier=purpose", status_code=303)
 
 @router.get("/start-plan", response_class=HTMLResponse)
-async def start_plan(request: Request):
+async def start_plan(request: Request, current_user: CurrentUser = Depends(get_current_user)):
     """
     Start with the Plan tier ($4.99 one-time)
     Redirects to account creation with Plan payment
     """
-    # Check if user is authenticated
-    stytch_user = await get_authenticated_user(request)
-    
-    if stytch_user and hasattr(stytch_user, 'emails') and stytch_user.emails:
-        # User is authenticated, check if they exist in our database
-        db = next(get_session())
-        user_email = stytch_user.emails[0].email
-        
-        statement = select(User).where(User.email == user_email)
-        db_user = db.exec(statement).first()
-        
-        if db_user:
-            # Check if user has already paid for Plan or Pursuit
-            if db_user.payment_tier in ["plan", "pursuit"]:
-                # User has already paid, redirect to form
-                return RedirectResponse(url=f"/form/{db_user.id}?tier=plan&paid=true", status_code=303)
-            else:
-                # User exists but hasn't paid for Plan, redirect to payment
-                return RedirectResponse(url=f"/api/payments/{db_user.id}/create-checkout-session/plan", status_code=303)
+    # Authenticated user with an account in our database
+    db_user = current_user.user
+    
+    if db_user:
+        # Check if user has already paid for Plan or Pursuit
+        if db_user.payment_tier in ["plan", "pursuit"]:
+            # User has already paid, redirect to form
+            return RedirectResponse(url=f"/form/{db_user.id}?tier=plan&paid=true", status_code=303)
+        else:
+            # User exists but hasn't paid for Plan, redirect to payment
+            return RedirectResponse(url=f"/api/payments/{db_user.id}/create-checkout-session/plan", status_code=303)
     
     # User is not authenticated or doesn't exist, show account creation form with Plan payment
     return templates.TemplateResponse(
@@ -467,30 +407,22 @@ async def start_plan(request: Request):
     )
 
 @router.get("/start-pursuit", response_class=HTMLResponse)
-async def start_pursuit(request: Request):
+async def start_pursuit(request: Request, current_user: CurrentUser = Depends(get_current_user)):
     """
     Start with the Pursuit tier ($4.99/month subscription)
     Redirects to account creation with Pursuit subscription payment
     """
-    # Check if user is authenticated
-    stytch_user = await get_authenticated_user(request)
-    
-    if stytch_user and hasattr(stytch_user, 'emails') and stytch_user.emails:
-        # User is authenticated, check if they exist in our database
-        db = next(get_session())
-        user_email = stytch_user.emails[0].email
-        
-        statement = select(User).where(User.email == user_email)
-        db_user = db.exec(statement).first()
-        
-        if db_user:
-            # Check if user has already paid for Pursuit
-            if db_user.payment_tier == "pursuit":
-                # User has already paid for Pursuit, redirect to form
-                return RedirectResponse(url=f"/form/{db_user.id}?tier=pursuit&paid=true", status_code=303)
-            else:
-                # User exists but hasn't paid for Pursuit, redirect to payment
-                return RedirectResponse(url=f"/api/payments/{db_user.id}/create-checkout-session/pursuit?is_subscription=true", status_code=303)
+    # Authenticated user with an account in our database
+    db_user = current_user.user
+    
+    if db_user:
+        # Check if user has already paid for Pursuit
+        if db_user.payment_tier == "pursuit":
+            # User has already paid for Pursuit, redirect to form
+            return RedirectResponse(url=f"/form/{db_user.id}?tier=pursuit&paid=true", status_code=303)
+        else:
+            # User exists but hasn't paid for Pursuit, redirect to payment
+            return RedirectResponse(url=f"/api/payments/{db_user.id}/create-checkout-session/pursuit?is_subscription=true", status_code=303)
     
     # User is not authenticated or doesn't exist, show account creation form with Pursuit payment
     return templates.TemplateResponse(
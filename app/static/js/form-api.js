@@ -175,66 +175,110 @@ async function updateUser() {
     }
 }
 
+// Answers waiting to be sent, by question number. Saves are debounced and
+// coalesced so a burst of answers goes to the server as one batch request.
+const SAVE_DEBOUNCE_MS = 1500;
+let pendingResponses = {};
+let pendingSaveCallbacks = [];
+let saveTimer = null;
+let saveQueue = Promise.resolve();
+
 // Save response
-async function saveResponse(questionNumber, response) {
-    try {
-        const responseData = {
-            user_id: user.id,
-            question_number: questionNumber,
+// Resolves once the batch containing this answer has been sent. Pass
+// { flush: true } to send straight away instead of waiting for the debounce.
+function saveResponse(questionNumber, response, options = {}) {
+    pendingResponses[questionNumber] = response;
+    const saved = new Promise(resolve => pendingSaveCallbacks.push(resolve));
+    
+    if (options.flush) {
+        flushResponses();
+    } else {
+        clearTimeout(saveTimer);
+        saveTimer = setTimeout(flushResponses, SAVE_DEBOUNCE_MS);
+    }
+    
+    return saved;
+}
+
+// Send all pending answers now
+function flushResponses() {
+    clearTimeout(saveTimer);
+    saveTimer = null;
+    
+    // Chain batches so they reach the server in order
+    saveQueue = saveQueue.then(sendPendingResponses);
+    return saveQueue;
+}
+
+function buildBatchRequest(responses) {
+    return {
+        user_id: user.id,
+        responses: Object.entries(responses).map(([questionNumber, response]) => ({
+            question_number: parseInt(questionNumber),
             response: response
-        };
-        
-        console.log('Saving response data:', responseData);
+        }))
+    };
+}
+
+async function sendPendingResponses() {
+    const batch = pendingResponses;
+    const callbacks = pendingSaveCallbacks;
+    pendingResponses = {};
+    pendingSaveCallbacks = [];
+    
+    const questionNumbers = Object.keys(batch).map(Number);
+    if (questionNumbers.length === 0 || !user.id) {
+        callbacks.forEach(resolve => resolve());
+        return;
+    }
+    
+    try {
+        console.log(`Saving responses for questions ${questionNumbers.join(', ')}`);
         
-        const apiResponse = await fetch('/api/form-responses/', {
+        const apiResponse = await fetch('/api/form-responses/batch', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify(responseData),
+            body: JSON.stringify(buildBatchRequest(batch)),
         });
         
         if (!apiResponse.ok) {
             const errorText = await apiResponse.text();
             console.error('Server error response:', errorText);
-            showNotification(`Error saving response: ${apiResponse.status} ${apiResponse.statusText}`, 'error');
-            throw new Error(`Failed to save response: ${apiResponse.status} ${apiResponse.statusText}`);
+            throw new Error(`Failed to save responses: ${apiResponse.status} ${apiResponse.statusText}`);
         }
         
-        // Update progress state
-        if (parseInt(user.progress_state) < questionNumber) {
-            user.progress_state = questionNumber.toString();
-            
-            // Update user progress on server
-            try {
-                console.log(`Updating progress to ${user.progress_state} for user ${user.id}`);
-                const progressResponse = await fetch(`/api/users/${user.id}/progress`, {
-                    method: 'PATCH',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify({
-                        progress_state: user.progress_state
-                    }),
-                });
-                
-                if (!progressResponse.ok) {
-                    const errorText = await progressResponse.text();
-                    console.error('Error updating progress:', progressResponse.status, progressResponse.statusText, errorText);
-                } else {
-                    console.log('Progress updated successfully');
-                }
-            } catch (progressError) {
-                console.error('Exception updating progress:', progressError);
-            }
+        // The server raises progress_state as part of the save
+        const highestQuestion = Math.max(...questionNumbers);
+        if (parseInt(user.progress_state) < highestQuestion) {
+            user.progress_state = highestQuestion.toString();
         }
         
     } catch (error) {
-        console.error('Error saving response:', error);
+        console.error('Error saving responses:', error);
         showNotification('Error saving your response. Please try again.', 'error');
+        
+        // Keep unsent answers for the next batch unless they were edited since
+        for (const [questionNumber, response] of Object.entries(batch)) {
+            if (!(questionNumber in pendingResponses)) {
+                pendingResponses[questionNumber] = response;
+            }
+        }
+    } finally {
+        callbacks.forEach(resolve => resolve());
     }
 }
 
+// Don't lose answers still waiting on the debounce when the page goes away
+window.addEventListener('pagehide', () => {
+    if (user.id && Object.keys(pendingResponses).length > 0) {
+        const body = new Blob([JSON.stringify(buildBatchRequest(pendingResponses))], { type: 'application/json' });
+        navigator.sendBeacon('/api/form-responses/batch', body);
+        pendingResponses = {};
+    }
+});
+
 // Load user data
 async function loadUserData() {
     return new Promise(async (resolve, reject) => {
@@ -358,6 +402,9 @@ async function generateBasicResults() {
         const authToken = localStorage.getItem('stytch_session_token');
         console.log('Using auth token for basic results generation:', authToken ? `${authToken.substring(0, 10)}...` : 'none');
         
+        // Generation reads answers from the database, so send any still queued
+        await flushResponses();
+        
         const response = await fetch(`/api/ai/${user.id}/generate-basic`, {
             method: 'POST',
             headers: {
@@ -398,6 +445,9 @@ async function generatePremiumResults() {
         const authToken = localStorage.getItem('stytch_session_token');
         console.log('Using auth token for premium results generation:', authToken ? `${authToken.substring(0, 10)}...` : 'none');
         
+        // Generation reads answers from the database, so send any still queued
+        await flushResponses();
+        
         const response = await fetch(`/api/ai/${user.id}/generate-premium`, {
             method: 'POST',
             headers: {
@@ -531,18 +581,13 @@ window.createUserFromAnonymous = async function(dobValue, tier = 'purpose') {
                 // Parse responses
                 const responses = JSON.parse(savedResponses);
                 
-                // Save each response individually using the standard saveResponse function
+                // Queue every response, then send them together in one batch
                 for (const [questionNum, responseText] of Object.entries(responses)) {
                     if (responseText && responseText.trim()) {
-                        try {
-                            const questionNumber = parseInt(questionNum);
-                            await saveResponse(questionNumber, responseText.trim());
-                            console.log(`Saved response for question ${questionNum}`);
-                        } catch (err) {
-                            console.error(`Error saving response for question ${questionNum}:`, err);
-                        }
+                        saveResponse(parseInt(questionNum), responseText.trim());
                     }
                 }
+                await flushResponses();
                 
                 // Clear anonymous responses from localStorage
                 localStorage.removeItem('anonymousResponses');
@@ -364,7 +364,7 @@ document.addEventListener('DOMContentLoaded', function() {
             userResponses[questionNumber] = responseTextarea.value.trim();
             
             // Explicitly save to server before proceeding
-            saveResponse(questionNumber, responseTextarea.value.trim())
+            saveResponse(questionNumber, responseTextarea.value.trim(), { flush: true })
                 .then(() => {
                     console.log(`Explicitly saved question ${questionNumber} response before proceeding`);
                     continueSubmitProcess();
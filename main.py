@@ -5,11 +5,10 @@ from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from dotenv import load_dotenv
-import time
-from starlette.middleware.base import BaseHTTPMiddleware
 
 # Import custom middleware
-from app.middleware import AuthHeaderMiddleware
+from app.middleware import RequestContextMiddleware
+from app.logging_config import configure_logging
 
 # Import routers
 from app.routers import (
@@ -19,15 +18,21 @@ from app.routers import (
     ai_router,
     payments_router,
     web_router,
-    auth_router
+    auth_router,
+    internal_router,
+    metrics_router
 )
 
 # Import database functions
-from app.models import create_db_and_tables
+from app.models import create_db_and_tables, get_session_factory
+from app.routers.ai.ai_jobs import fail_orphaned_jobs
 
 # Load environment variables
 load_dotenv()
 
+# Send logs through the background JSON writer
+configure_logging()
+
 # Create FastAPI app
 app = FastAPI(
     title="Pathlight API",
@@ -67,63 +72,18 @@ app.include_router(ai_router)
 app.include_router(payments_router)
 app.include_router(web_router)
 app.include_router(auth_router)
+app.include_router(internal_router)
+app.include_router(metrics_router)
 
-# Add request logging middleware
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Log request details
-        path = request.url.path
-        method = request.method
-        
-        # Only log specific paths to avoid cluttering logs
-        should_log = (
-            path.startswith("/auth") or 
-            path.startswith("/results") or 
-            path.startswith("/form")
-        )
-        
-        if should_log:
-            # Log request details
-            print(f"[REQUEST] {method} {path}")
-            
-            # Log cookies
-            cookies = request.cookies
-            print(f"[REQUEST COOKIES] {list(cookies.keys())}")
-            
-            # Log specific cookie if it exists
-            if 'stytch_session_token' in cookies:
-                token = cookies['stytch_session_token']
-                print(f"[REQUEST COOKIE] stytch_session_token: {token[:10]}...")
-            
-            # Log Authorization header if it exists
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.replace('Bearer ', '')
-                print(f"[REQUEST AUTH HEADER] Bearer token: {token[:10]}...")
-        
-        # Process the request
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        
-        if should_log:
-            # Log response details
-            print(f"[RESPONSE] {method} {path} - Status: {response.status_code} - Time: {process_time:.4f}s")
-            
-            # Log response cookies
-            if 'set-cookie' in response.headers:
-                print(f"[RESPONSE SET-COOKIE] {response.headers['set-cookie']}")
-        
-        return response
-
-# Add the middlewares to the app
-app.add_middleware(AuthHeaderMiddleware)  # Add this first so it runs before logging
-app.add_middleware(RequestLoggingMiddleware)
+# Add the request middleware: auth header extraction and request logging
+app.add_middleware(RequestContextMiddleware)
 
-# Create database tables on startup
+# Create database tables on startup, and fail generation jobs a previous
+# process left queued or running
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
+    fail_orphaned_jobs(get_session_factory())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Database migration script to add the indexes behind the hot form response and
+subscription queries:
+
+- uq_form_responses_user_question: UNIQUE (user_id, question_number) on
+  form_responses. Every read and upsert of an answer filters on both
+  columns, and generation reads a user's answers ordered by question_number.
+- ix_users_subscription_id: webhook handlers look users up by Stripe
+  subscription id.
+- ix_users_subscription_cleanup: (payment_tier, subscription_status,
+  subscription_end_date) for the expired subscription cleanup task.
+
+Duplicate answers to the same question are resolved first by keeping the
+most recent one.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Use PostgreSQL database
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("Error: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Create engine with PostgreSQL
+engine = create_engine(DATABASE_URL)
+
+INDEXES = [
+    ("ix_users_subscription_id", "CREATE INDEX IF NOT EXISTS ix_users_subscription_id ON users (subscription_id)"),
+    ("ix_users_subscription_cleanup", """
+        CREATE INDEX IF NOT EXISTS ix_users_subscription_cleanup
+        ON users (payment_tier, subscription_status, subscription_end_date)
+    """),
+]
+
+def run_migration():
+    """Run the database migration to add the query indexes"""
+    with engine.connect() as conn:
+        # Start a transaction
+        with conn.begin():
+            print("Starting query index migration...")
+
+            # Check for users who answered the same question more than once
+            print("Checking for duplicate form responses...")
+            result = conn.execute(text("""
+                SELECT user_id, question_number, COUNT(*)
+                FROM form_responses
+                GROUP BY user_id, question_number
+                HAVING COUNT(*) > 1
+            """))
+
+            duplicates = result.fetchall()
+
+            if duplicates:
+                print(f"Found {len(duplicates)} questions with duplicate responses")
+
+                # Keep the most recent answer to each question and delete the rest
+                result = conn.execute(text("""
+                    DELETE FROM form_responses
+                    WHERE id IN (
+                        SELECT id FROM (
+                            SELECT id, ROW_NUMBER() OVER (
+                                PARTITION BY user_id, question_number
+                                ORDER BY created_at DESC, id DESC
+                            ) AS position
+                            FROM form_responses
+                        ) ranked
+                        WHERE ranked.position > 1
+                    )
+                """))
+                print(f"Removed {result.rowcount} duplicate response(s)")
+            else:
+                print("No duplicate form responses found.")
+
+            # Add the unique constraint, which also creates its index
+            print("Adding uniqueness constraint to form_responses (user_id, question_number)...")
+            try:
+                with conn.begin_nested():
+                    conn.execute(text("""
+                        ALTER TABLE form_responses
+                        ADD CONSTRAINT uq_form_responses_user_question UNIQUE (user_id, question_number)
+                    """))
+                print("Form response uniqueness constraint added successfully")
+            except Exception as e:
+                if "already exists" in str(e):
+                    print("Form response uniqueness constraint already exists")
+                else:
+                    raise
+
+            for name, statement in INDEXES:
+                print(f"Creating index {name}...")
+                conn.execute(text(statement))
+
+            # Refresh planner statistics so the new indexes get used straight away
+            conn.execute(text("ANALYZE form_responses"))
+            conn.execute(text("ANALYZE users"))
+
+            print("Query index migration completed successfully")
+
+if __name__ == "__main__":
+    try:
+        run_migration()
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        sys.exit(1)
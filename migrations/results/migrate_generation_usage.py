@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Database migration script for LLM usage accounting.
+
+Creates the generation_usage table, which keeps the tokens, latency,
+retries and estimated cost of the chain calls behind each generation,
+with indexes for per-user lookups and time-windowed reports.
+"""
+
+import os
+import sys
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Use PostgreSQL database
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("Error: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Create engine with PostgreSQL
+engine = create_engine(DATABASE_URL)
+
+def create_usage_table(conn):
+    print("Creating generation_usage table if needed...")
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS generation_usage (
+            id UUID PRIMARY KEY,
+            user_id UUID NOT NULL REFERENCES users (id),
+            result_id UUID NOT NULL REFERENCES results (id),
+            generation INTEGER NOT NULL,
+            payment_tier VARCHAR NOT NULL,
+            chain VARCHAR NOT NULL,
+            model VARCHAR NOT NULL,
+            cache_hit BOOLEAN NOT NULL DEFAULT FALSE,
+            prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            cached_prompt_tokens INTEGER NOT NULL DEFAULT 0,
+            completion_tokens INTEGER NOT NULL DEFAULT 0,
+            latency_ms FLOAT NOT NULL DEFAULT 0,
+            retries INTEGER NOT NULL DEFAULT 0,
+            cost_usd FLOAT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP NOT NULL
+        )
+    """))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_generation_usage_user_id ON generation_usage (user_id)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_generation_usage_created_at ON generation_usage (created_at)"))
+
+def run_migration():
+    """Run the database migration for LLM usage accounting"""
+    with engine.connect() as conn:
+        # Start a transaction
+        with conn.begin():
+            print("Starting generation usage migration...")
+            create_usage_table(conn)
+            print("Generation usage migration completed successfully")
+
+if __name__ == "__main__":
+    try:
+        run_migration()
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        sys.exit(1)
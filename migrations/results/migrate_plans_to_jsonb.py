@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Database migration script to store results.basic_plan and results.full_plan
+as JSONB instead of text.
+
+The results endpoints pull individual keys (purpose, mantra, ...) out of the
+plans in SQL, which needs the columns to be JSON documents. Existing values
+are converted in place:
+
+- empty strings (no full plan generated yet) become NULL
+- text that isn't valid JSON is kept as a JSON string
+"""
+
+import os
+import sys
+import json
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Use PostgreSQL database
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("Error: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Create engine with PostgreSQL
+engine = create_engine(DATABASE_URL)
+
+PLAN_COLUMNS = ("basic_plan", "full_plan")
+
+def is_json(value):
+    try:
+        json.loads(value)
+        return True
+    except ValueError:
+        return False
+
+def run_migration():
+    """Run the database migration to convert the plan columns to JSONB"""
+    with engine.connect() as conn:
+        # Start a transaction
+        with conn.begin():
+            print("Starting plan JSONB migration...")
+
+            for column in PLAN_COLUMNS:
+                # Check the column's current type
+                result = conn.execute(text(
+                    "SELECT data_type FROM information_schema.columns "
+                    "WHERE table_name = 'results' AND column_name = :column"
+                ), {"column": column})
+                data_type = result.scalar()
+
+                if data_type == "jsonb":
+                    print(f"{column} is already JSONB")
+                    continue
+
+                # Wrap values that wouldn't survive the cast as JSON strings
+                print(f"Checking {column} for values that aren't valid JSON...")
+                rows = conn.execute(text(
+                    f"SELECT id, {column} FROM results WHERE btrim({column}) <> ''"
+                ))
+                invalid = [
+                    {"id": row_id, "value": json.dumps(value)}
+                    for row_id, value in rows
+                    if not is_json(value)
+                ]
+                if invalid:
+                    conn.execute(text(f"UPDATE results SET {column} = :value WHERE id = :id"), invalid)
+                    print(f"Wrapped {len(invalid)} {column} value(s) as JSON strings")
+                else:
+                    print(f"All {column} values are valid JSON")
+
+                print(f"Converting {column} to JSONB...")
+                conn.execute(text(f"ALTER TABLE results ALTER COLUMN {column} DROP NOT NULL"))
+                conn.execute(text(
+                    f"ALTER TABLE results ALTER COLUMN {column} TYPE JSONB "
+                    f"USING NULLIF(btrim({column}), '')::jsonb"
+                ))
+                print(f"{column} converted successfully")
+
+            # Refresh planner statistics for the rewritten table
+            conn.execute(text("ANALYZE results"))
+
+            print("Plan JSONB migration completed successfully")
+
+if __name__ == "__main__":
+    try:
+        run_migration()
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        sys.exit(1)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Database migration script for compressed plan storage.
+
+- Creates the result_history table, which keeps the plans replaced by each
+  regeneration encoded with app.plan_codec.
+- Re-encodes existing history rows whose codec differs from PLAN_CODEC, so
+  switching codecs (say zlib to zstd) applies to old rows too.
+- On PostgreSQL 14+, switches the live results.basic_plan/full_plan columns
+  to lz4 TOAST compression and rewrites existing plans so they are stored
+  with it. Those columns stay plain JSONB so the results endpoints can keep
+  selecting individual keys.
+
+Run with --dry-run to report what would change.
+"""
+
+import os
+import sys
+import argparse
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+from app.plan_codec import PLAN_CODEC, available_codec, decode_plan, encode_plan, payload_codec
+
+# Load environment variables
+load_dotenv()
+
+# Use PostgreSQL database
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    print("Error: DATABASE_URL environment variable not set")
+    sys.exit(1)
+
+# Create engine with PostgreSQL
+engine = create_engine(DATABASE_URL)
+
+BATCH_SIZE = 500
+PLAN_COLUMNS = ("basic_plan", "full_plan")
+
+def create_history_table(conn):
+    print("Creating result_history table if needed...")
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS result_history (
+            id UUID PRIMARY KEY,
+            user_id UUID NOT NULL REFERENCES users (id),
+            plan_field VARCHAR NOT NULL,
+            payload BYTEA NOT NULL,
+            generated_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP NOT NULL
+        )
+    """))
+    conn.execute(text("""
+        CREATE INDEX IF NOT EXISTS ix_result_history_user_generated
+        ON result_history (user_id, generated_at)
+    """))
+
+def reencode_history(conn, dry_run):
+    codec = available_codec(PLAN_CODEC)
+    print(f"Re-encoding result history with {codec}...")
+
+    rows = conn.execute(text("SELECT id, payload FROM result_history")).fetchall()
+    updates = []
+    bytes_before = bytes_after = 0
+    for row_id, payload in rows:
+        payload = bytes(payload)
+        if payload_codec(payload) == codec:
+            continue
+        encoded = encode_plan(decode_plan(payload), codec)
+        bytes_before += len(payload)
+        bytes_after += len(encoded)
+        updates.append({"id": row_id, "payload": encoded})
+
+    print(f"{len(updates)} of {len(rows)} history rows need re-encoding ({bytes_before} -> {bytes_after} bytes)")
+    if dry_run:
+        return
+
+    for start in range(0, len(updates), BATCH_SIZE):
+        conn.execute(
+            text("UPDATE result_history SET payload = :payload WHERE id = :id"),
+            updates[start:start + BATCH_SIZE]
+        )
+
+def compress_live_plans(conn, dry_run):
+    version = conn.execute(text("SHOW server_version_num")).scalar()
+    if int(version) < 140000:
+        print("PostgreSQL 14+ is needed for lz4 column compression, leaving results columns as they are")
+        return
+
+    for column in PLAN_COLUMNS:
+        size = conn.execute(text(f"SELECT COALESCE(SUM(pg_column_size({column})), 0) FROM results")).scalar()
+        print(f"{column}: {size} bytes stored")
+        if dry_run:
+            continue
+
+        conn.execute(text(f"ALTER TABLE results ALTER COLUMN {column} SET COMPRESSION lz4"))
+        # SET COMPRESSION only applies to new values; concatenating an empty
+        # object builds a new value, so existing plans are stored again with lz4
+        result = conn.execute(text(
+            f"UPDATE results SET {column} = {column} || '{{}}'::jsonb "
+            f"WHERE jsonb_typeof({column}) = 'object' AND pg_column_compression({column}) IS DISTINCT FROM 'lz4'"
+        ))
+        size = conn.execute(text(f"SELECT COALESCE(SUM(pg_column_size({column})), 0) FROM results")).scalar()
+        print(f"{column}: rewrote {result.rowcount} row(s), now {size} bytes stored")
+
+def run_migration(dry_run=False):
+    """Run the database migration for compressed plan storage"""
+    with engine.connect() as conn:
+        # Start a transaction
+        with conn.begin():
+            print("Starting compressed plan storage migration...")
+            create_history_table(conn)
+            reencode_history(conn, dry_run)
+            compress_live_plans(conn, dry_run)
+            if dry_run:
+                print("Dry run, rolling back")
+                conn.get_transaction().rollback()
+                return
+            print("Compressed plan storage migration completed successfully")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Set up compressed plan storage")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without writing")
+    args = parser.parse_args()
+    try:
+        run_migration(dry_run=args.dry_run)
+    except Exception as e:
+        print(f"Error during migration: {e}")
+        sys.exit(1)
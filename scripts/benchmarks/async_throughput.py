@@ -0,0 +1,151 @@
+"""
+Benchmark sync sessions inside async handlers against AsyncSession.
+
+An ``async def`` route that queries through a sync Session blocks the event
+loop for the whole round trip, so concurrent requests queue up behind it and
+everything else the worker does (health checks, streaming responses) stalls.
+This runs the results read (user + result in one query) from many concurrent
+tasks three ways:
+
+- sync in async: a sync Session called straight from the coroutine, as the
+  routes did before
+- threadpool: the same sync call through run_in_threadpool
+- async session: ``load_user_and_result`` on an AsyncSession
+
+and reports requests per second, latency, and the worst event loop stall seen
+by a ticker task running alongside.
+
+Usage:
+    python -m scripts.benchmarks.async_throughput [--users 200] [--requests 2000] [--concurrency 50]
+
+Runs against a temporary SQLite database unless --database-url is given.
+Local SQLite answers in microseconds, so the gap is much wider against a real
+PostgreSQL server where every query waits on the network.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List
+
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.models import Result, User, build_async_engine
+from app.routers.results import load_user_and_result
+
+
+def seed(engine, users: int) -> List:
+    """Create users, each with a result."""
+    user_ids = []
+    with Session(engine) as session:
+        for i in range(users):
+            user = User(name=f"Bench User {i}", email=f"bench{i}@example.com", dob=datetime(1990, 1, 1), progress_state="25")
+            session.add(user)
+            session.flush()
+            session.add(Result(user_id=user.id, basic_plan='{"purpose": "p", "mantra": "m"}', full_plan="{}"))
+            user_ids.append(user.id)
+        session.commit()
+    return user_ids
+
+
+def sync_read(engine, user_id):
+    with Session(engine) as session:
+        statement = (
+            select(User, Result)
+            .outerjoin(Result, Result.user_id == User.id)
+            .where(User.id == user_id)
+        )
+        return session.exec(statement).first()
+
+
+async def run(handler: Callable[..., Awaitable], user_ids: List, concurrency: int) -> Dict:
+    latencies = []
+    max_lag = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        # Measures how late a 1 ms sleep wakes up, i.e. how long the loop was blocked
+        nonlocal max_lag
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.perf_counter() - start - 0.001)
+
+    queue = list(user_ids)
+
+    async def worker():
+        while queue:
+            user_id = queue.pop()
+            start = time.perf_counter()
+            await handler(user_id)
+            latencies.append(time.perf_counter() - start)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+
+    latencies.sort()
+    return {
+        "req_per_s": len(user_ids) / elapsed,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "max_lag_ms": max_lag * 1000
+    }
+
+
+async def benchmark(database_url: str, users: int, requests: int, concurrency: int) -> None:
+    engine = create_engine(database_url)
+    SQLModel.metadata.create_all(engine)
+    user_ids = seed(engine, users)
+
+    async_engine = build_async_engine(database_url, pool_size=concurrency, max_overflow=0)
+
+    async def sync_in_async(user_id):
+        return sync_read(engine, user_id)
+
+    async def threadpool(user_id):
+        return await run_in_threadpool(sync_read, engine, user_id)
+
+    async def async_session(user_id):
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            return await load_user_and_result(session, user_id)
+
+    rng = random.Random(0)
+    lookups = [rng.choice(user_ids) for _ in range(requests)]
+
+    print(f"{users} users, {requests} reads, {concurrency} concurrent")
+    print(f"{'implementation':<16}{'req/s':>10}{'mean ms':>10}{'p95 ms':>10}{'max lag ms':>12}")
+    for name, handler in (("sync in async", sync_in_async), ("threadpool", threadpool), ("async session", async_session)):
+        # Warm up connections before timing
+        await run(handler, lookups[:concurrency], concurrency)
+        stats = await run(handler, lookups, concurrency)
+        print(f"{name:<16}{stats['req_per_s']:>10.0f}{stats['mean_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['max_lag_ms']:>12.2f}")
+
+    await async_engine.dispose()
+    engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--database-url", help="Benchmark an existing database instead of a temporary SQLite file")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    asyncio.run(benchmark(database_url, args.users, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
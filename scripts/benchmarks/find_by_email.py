@@ -0,0 +1,136 @@
+"""
+Benchmark the find-by-email lookup against the query pattern it replaced.
+
+The old endpoint loaded every FormResponse row for the user just to count
+them and then ran a separate Result query. ``get_user_summary`` does it in
+one round trip with a COUNT and a LEFT JOIN. Each user here has answered
+all 25 questions with long answers, which is where loading rows hurts.
+
+Usage:
+    python -m scripts.benchmarks.find_by_email [--users 200] [--answer-size 4000] [--lookups 500]
+
+Runs against a temporary SQLite database unless --database-url is given.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models import FormResponse, Result, User
+from app.routers.users import get_user_summary
+
+
+def legacy_user_summary(session: Session, email: str) -> Optional[Dict]:
+    """The previous find-by-email implementation, kept for comparison."""
+    user = session.exec(select(User).where(User.email == email)).first()
+    if not user:
+        return None
+
+    responses = session.exec(select(FormResponse).where(FormResponse.user_id == user.id)).all()
+    result_obj = session.exec(select(Result).where(Result.user_id == user.id)).first()
+
+    summary = {
+        "found": True,
+        "id": str(user.id),
+        "name": user.name,
+        "email": user.email,
+        "dob": user.dob.strftime("%Y-%m-%d") if user.dob else None,
+        "progress_state": user.progress_state,
+        "payment_tier": user.payment_tier,
+        "has_responses": len(responses) > 0,
+        "response_count": len(responses),
+        "has_results": result_obj is not None
+    }
+    if result_obj:
+        summary["last_generated_at"] = result_obj.last_generated_at.isoformat() if result_obj.last_generated_at else None
+        summary["regeneration_count"] = result_obj.regeneration_count
+    return summary
+
+
+def seed(engine, users: int, answer_size: int) -> List[str]:
+    """Create users with 25 long answers each; every other user has a result."""
+    emails = []
+    answer = ("lorem ipsum dolor sit amet " * (answer_size // 27 + 1))[:answer_size]
+    with Session(engine) as session:
+        for i in range(users):
+            user = User(name=f"Bench User {i}", email=f"bench{i}@example.com", dob=datetime(1990, 1, 1), progress_state="25")
+            session.add(user)
+            session.flush()
+            for question_number in range(1, 26):
+                session.add(FormResponse(user_id=user.id, question_number=question_number, response=answer))
+            if i % 2 == 0:
+                session.add(Result(user_id=user.id, basic_plan="{}", full_plan="{}"))
+            emails.append(user.email)
+        session.commit()
+    return emails
+
+
+def run(engine, lookup: Callable[[Session, str], Optional[Dict]], emails: List[str]) -> Dict:
+    statements = []
+
+    def count(*args):
+        statements.append(1)
+
+    event.listen(engine, "before_cursor_execute", count)
+    latencies = []
+    tracemalloc.start()
+    try:
+        for email in emails:
+            with Session(engine) as session:
+                start = time.perf_counter()
+                lookup(session, email)
+                latencies.append(time.perf_counter() - start)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        event.remove(engine, "before_cursor_execute", count)
+
+    latencies.sort()
+    return {
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "peak_kib": peak / 1024,
+        "queries_per_lookup": len(statements) / len(emails)
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--answer-size", type=int, default=4000, help="Characters per answer")
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--database-url", help="Benchmark an existing database instead of a temporary SQLite file")
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        engine = create_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+
+    emails = seed(engine, args.users, args.answer_size)
+    rng = random.Random(0)
+    lookups = [rng.choice(emails) for _ in range(args.lookups)]
+
+    # Warm up the connection pool and the database's page cache
+    run(engine, get_user_summary, emails[:10])
+
+    print(f"{args.users} users x 25 answers of {args.answer_size} chars, {args.lookups} lookups")
+    print(f"{'implementation':<16}{'mean ms':>10}{'p95 ms':>10}{'peak KiB':>12}{'queries':>10}")
+    for name, lookup in (("legacy", legacy_user_summary), ("single query", get_user_summary)):
+        stats = run(engine, lookup, lookups)
+        print(f"{name:<16}{stats['mean_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['peak_kib']:>12.1f}{stats['queries_per_lookup']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
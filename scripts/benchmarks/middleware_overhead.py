@@ -0,0 +1,139 @@
+"""
+Benchmark per-request middleware overhead.
+
+Builds the same app (CORS plus the web routes and a small JSON endpoint)
+with three middleware stacks:
+
+- none: CORS only, the floor
+- base http: the previous stack, AuthHeaderMiddleware and
+  RequestLoggingMiddleware as BaseHTTPMiddleware subclasses
+- pure asgi: RequestContextMiddleware doing the same work in one pure ASGI
+  middleware
+
+and sends requests straight to the ASGI app (no network) for /robots.txt and
+a JSON endpoint, reporting per-request latency and the overhead over "none".
+Logging is configured as in production but written to /dev/null, so the cost
+of building and queueing the request records is included.
+
+Usage:
+    python -m scripts.benchmarks.middleware_overhead [--requests 3000] [--rounds 3]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict, List
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.logging_config import configure_logging, request_context
+from app.middleware import RequestContextMiddleware, logger
+from app.routers import web_router
+
+PATHS = ("/robots.txt", "/bench/json")
+HEADERS = {"Authorization": "Bearer bench-token", "Cookie": "stytch_session_token=bench; other=1"}
+
+
+class AuthHeaderMiddleware(BaseHTTPMiddleware):
+    """The previous auth header middleware."""
+
+    async def dispatch(self, request: Request, call_next):
+        auth_header = request.headers.get('Authorization')
+        if auth_header and auth_header.startswith('Bearer '):
+            request.state.auth_token = auth_header.replace('Bearer ', '')
+        else:
+            request.state.auth_token = None
+        return await call_next(request)
+
+
+class RequestLoggingMiddleware(BaseHTTPMiddleware):
+    """The previous request logging middleware."""
+
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+        method = request.method
+        with request_context(method, path, request.headers.get("X-Request-ID")):
+            start_time = time.perf_counter()
+            response = await call_next(request)
+            logger.info(
+                "%s %s %s", method, path, response.status_code,
+                extra={
+                    "status": response.status_code,
+                    "duration_ms": round((time.perf_counter() - start_time) * 1000, 2),
+                    "cookie_names": sorted(request.cookies),
+                    "bearer_auth": request.headers.get("Authorization", "").startswith("Bearer "),
+                    "cookie_set": "set-cookie" in response.headers
+                }
+            )
+            return response
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(CORSMiddleware, allow_origins=["http://localhost"], allow_credentials=True,
+                       allow_methods=["*"], allow_headers=["*"])
+    app.include_router(web_router)
+
+    @app.get("/bench/json")
+    async def bench_json(request: Request):
+        return {"ok": True, "authenticated": getattr(request.state, "auth_token", None) is not None}
+
+    if stack == "base http":
+        app.add_middleware(AuthHeaderMiddleware)
+        app.add_middleware(RequestLoggingMiddleware)
+    elif stack == "pure asgi":
+        app.add_middleware(RequestContextMiddleware)
+    return app
+
+
+async def time_requests(app: FastAPI, path: str, requests: int) -> List[float]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+        for _ in range(50):
+            assert (await client.get(path, headers=HEADERS)).status_code == 200
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            await client.get(path, headers=HEADERS)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {
+        "mean_us": statistics.mean(timings) * 1e6,
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p99_us": timings[int(len(timings) * 0.99)] * 1e6
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--rounds", type=int, default=3, help="Timing rounds; the fastest mean is reported")
+    args = parser.parse_args()
+
+    configure_logging(stream=open(os.devnull, "w"))
+    stacks = ("none", "base http", "pure asgi")
+    apps = {stack: build_app(stack) for stack in stacks}
+
+    for path in PATHS:
+        print(f"\n{path}, {args.requests} requests")
+        print(f"{'stack':<12}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'overhead us':>14}")
+        results = {}
+        for stack in stacks:
+            rounds = [summarize(asyncio.run(time_requests(apps[stack], path, args.requests))) for _ in range(args.rounds)]
+            results[stack] = min(rounds, key=lambda stats: stats["mean_us"])
+        for stack, stats in results.items():
+            overhead = stats["mean_us"] - results["none"]["mean_us"]
+            print(f"{stack:<12}{stats['mean_us']:>10.1f}{stats['p50_us']:>10.1f}{stats['p99_us']:>10.1f}{overhead:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
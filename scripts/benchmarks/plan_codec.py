@@ -0,0 +1,127 @@
+"""
+Benchmark plan payload encodings: stored size and encode/decode latency.
+
+Plans are generated to the FullPlanOutput schema with the sizes the prompts
+ask for (a 250-500 word purpose, several action items per timeframe, half a
+dozen obstacles) from a fixed vocabulary, so they compress roughly like real
+model output rather than like repeated filler. Summaries (SummaryOutput) are
+reported separately since they are small enough that compression barely
+helps.
+
+Usage:
+    python -m scripts.benchmarks.plan_codec [--plans 200] [--rounds 5]
+
+zstd rows are skipped when the zstandard package isn't installed.
+"""
+
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.plan_codec import decode_plan, encode_plan, zstandard
+
+WORDS = (
+    "purpose path growth energy focus habit morning evening reflect journal walk learn build create share "
+    "family friends career health rest balance courage patience curiosity community mentor practice skill "
+    "project goal week month plan review gratitude nature breathe listen write read move connect explore "
+    "value strength challenge progress small steady daily honest kind clear calm bold trust create notice"
+).split()
+CATEGORIES = [
+    "health", "learning", "mindfulness", "writing", "planning", "social", "nutrition", "rest", "creativity",
+    "family", "friendship", "career", "finance", "medical", "travel", "hobbies", "goals", "reflection",
+    "gratitude", "nature"
+]
+
+
+def sentence(rng: random.Random, low: int = 8, high: int = 20) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph(rng: random.Random, words: int) -> str:
+    sentences = []
+    while sum(len(s.split()) for s in sentences) < words:
+        sentences.append(sentence(rng))
+    return " ".join(sentences)
+
+
+def action_items(rng: random.Random, low: int, high: int) -> List[Dict]:
+    return [{"text": sentence(rng, 6, 16), "category": rng.choice(CATEGORIES)} for _ in range(rng.randint(low, high))]
+
+
+def timeframe(rng: random.Random) -> Dict:
+    return {part: action_items(rng, 2, 5) for part in ("morning", "afternoon", "evening")}
+
+
+def full_plan(rng: random.Random) -> str:
+    return json.dumps({
+        "mantra": sentence(rng, 5, 10),
+        "purpose": paragraph(rng, rng.randint(250, 500)),
+        "next_steps": {span: action_items(rng, 3, 8) for span in ("today", "next_7_days", "next_30_days", "next_180_days")},
+        "daily_plan": {"weekdays": timeframe(rng), "weekends": timeframe(rng)},
+        "obstacles": [
+            {"challenge": sentence(rng), "solution": paragraph(rng, 40), "type": rng.choice(["personal", "external"])}
+            for _ in range(rng.randint(4, 8))
+        ]
+    })
+
+
+def summary(rng: random.Random) -> str:
+    return json.dumps({"mantra": sentence(rng, 5, 10), "purpose": paragraph(rng, rng.randint(100, 250))})
+
+
+def run(plans: List[str], codec: str, level: Optional[int], rounds: int) -> Dict:
+    encoded = [encode_plan(plan, codec, level) for plan in plans]
+    assert all(decode_plan(payload) == plan for payload, plan in zip(encoded, plans))
+
+    def per_plan(fn: Callable[[], None]) -> float:
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - start) / len(plans))
+        return min(timings)
+
+    raw_bytes = sum(len(plan.encode("utf-8")) for plan in plans)
+    stored_bytes = sum(len(payload) for payload in encoded)
+    return {
+        "mean_kib": stored_bytes / len(plans) / 1024,
+        "ratio": raw_bytes / stored_bytes,
+        "encode_us": per_plan(lambda: [encode_plan(plan, codec, level) for plan in plans]) * 1e6,
+        "decode_us": per_plan(lambda: [decode_plan(payload) for payload in encoded]) * 1e6
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plans", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5, help="Timing rounds; the fastest is reported")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    datasets = {
+        "full plans": [full_plan(rng) for _ in range(args.plans)],
+        "summaries": [summary(rng) for _ in range(args.plans)]
+    }
+
+    encodings = [("raw", None), ("zlib", 1), ("zlib", 6), ("zlib", 9)]
+    if zstandard is not None:
+        encodings += [("zstd", 3), ("zstd", 9), ("zstd", 19)]
+    else:
+        print("zstandard is not installed, skipping zstd")
+
+    for name, plans in datasets.items():
+        raw_kib = statistics.mean(len(plan.encode("utf-8")) for plan in plans) / 1024
+        print(f"\n{len(plans)} {name}, {raw_kib:.1f} KiB of JSON each on average")
+        print(f"{'encoding':<12}{'KiB/plan':>10}{'ratio':>8}{'encode us':>12}{'decode us':>12}")
+        for codec, level in encodings:
+            stats = run(plans, codec, level, args.rounds)
+            label = codec if level is None else f"{codec} {level}"
+            print(f"{label:<12}{stats['mean_kib']:>10.2f}{stats['ratio']:>8.2f}{stats['encode_us']:>12.1f}{stats['decode_us']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
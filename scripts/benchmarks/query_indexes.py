@@ -0,0 +1,201 @@
+"""
+Benchmark the form response and subscription indexes.
+
+Seeds users who have each answered 25 questions (1M responses by default),
+runs the hot queries with the schema as it was before the index migration,
+then adds the indexes and runs them again, printing each query's plan and
+latency both times.
+
+Usage:
+    python -m scripts.benchmarks.query_indexes [--responses 1000000] [--runs 200]
+
+Runs against a temporary SQLite database unless --database-url is given.
+The database must be empty; the benchmark creates and fills its own tables.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import Index, MetaData, text
+from sqlalchemy.engine import Engine
+from sqlmodel import create_engine
+
+from app.models import FormResponse, User
+
+QUESTIONS = 25
+BATCH_SIZE = 10000
+
+# Index name -> columns, for every index the migration adds
+NEW_INDEXES = {
+    "uq_form_responses_user_question": (FormResponse.__table__, ("user_id", "question_number"), True),
+    "ix_users_subscription_id": (User.__table__, ("subscription_id",), False),
+    "ix_users_subscription_cleanup": (User.__table__, ("payment_tier", "subscription_status", "subscription_end_date"), False),
+}
+
+QUERIES = {
+    "answer lookup": (
+        "SELECT * FROM form_responses WHERE user_id = :user_id AND question_number = :question_number",
+        lambda sample: {"user_id": sample["user_id"], "question_number": sample["question_number"]}
+    ),
+    "answers in order": (
+        "SELECT * FROM form_responses WHERE user_id = :user_id ORDER BY question_number",
+        lambda sample: {"user_id": sample["user_id"]}
+    ),
+    "webhook user": (
+        "SELECT * FROM users WHERE subscription_id = :subscription_id",
+        lambda sample: {"subscription_id": sample["subscription_id"]}
+    ),
+    "expired subscriptions": (
+        "SELECT * FROM users WHERE payment_tier = 'pursuit' AND subscription_status = 'canceled' AND subscription_end_date < :now",
+        lambda sample: {"now": sample["now"]}
+    ),
+}
+
+
+def create_legacy_schema(engine: Engine) -> None:
+    """Create users and form_responses without the indexes under test."""
+    legacy = MetaData()
+    for table in (User.__table__, FormResponse.__table__):
+        copy = table.to_metadata(legacy)
+        copy.indexes = {index for index in copy.indexes if index.name not in NEW_INDEXES}
+        copy.constraints = {constraint for constraint in copy.constraints if constraint.name not in NEW_INDEXES}
+    legacy.create_all(engine)
+
+
+def add_indexes(engine: Engine) -> None:
+    for name, (table, columns, unique) in NEW_INDEXES.items():
+        Index(name, *(table.c[column] for column in columns), unique=unique).create(engine)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def seed(engine: Engine, responses: int, answer_size: int) -> List[Dict]:
+    """Insert users with 25 answers each; returns the id and subscription of every user."""
+    users = []
+    answer = ("lorem ipsum dolor sit amet " * (answer_size // 27 + 1))[:answer_size]
+    now = datetime.utcnow()
+    rng = random.Random(0)
+    user_rows, response_rows = [], []
+
+    with engine.begin() as conn:
+        for i in range(max(1, responses // QUESTIONS)):
+            user_id = uuid.uuid4()
+            tier = rng.choice(["none", "purpose", "plan", "pursuit"])
+            status = rng.choice(["active", "canceled"]) if tier == "pursuit" else None
+            user_rows.append({
+                "id": user_id, "name": f"Bench User {i}", "email": f"bench{i}@example.com",
+                "dob": datetime(1990, 1, 1), "progress_state": str(QUESTIONS),
+                "created_at": now, "updated_at": now, "payment_tier": tier,
+                "subscription_id": f"sub_{i}" if status else None, "subscription_status": status,
+                "subscription_end_date": now + timedelta(days=rng.randint(-30, 30)) if status else None
+            })
+            users.append({"user_id": user_id, "subscription_id": f"sub_{i}"})
+            for question_number in range(1, QUESTIONS + 1):
+                response_rows.append({
+                    "id": uuid.uuid4(), "user_id": user_id, "question_number": question_number,
+                    "response": answer, "created_at": now
+                })
+
+            if len(response_rows) >= BATCH_SIZE:
+                conn.execute(User.__table__.insert(), user_rows)
+                conn.execute(FormResponse.__table__.insert(), response_rows)
+                user_rows, response_rows = [], []
+
+        if user_rows:
+            conn.execute(User.__table__.insert(), user_rows)
+            conn.execute(FormResponse.__table__.insert(), response_rows)
+
+    return users
+
+
+def explain(engine: Engine, sql: str, params: Dict) -> str:
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        rows = conn.execute(text(prefix + sql), params).fetchall()
+    # SQLite puts the description in the last column, PostgreSQL has a single one
+    return "\n".join(f"    {row[-1]}" for row in rows)
+
+
+def measure(engine: Engine, users: List[Dict], runs: int) -> Dict[str, Dict]:
+    rng = random.Random(1)
+    bind_value = User.__table__.c.id.type.bind_processor(engine.dialect)
+    results = {}
+    for name, (sql, make_params) in QUERIES.items():
+        latencies = []
+        plan = None
+        with engine.connect() as conn:
+            for _ in range(runs):
+                user = rng.choice(users)
+                sample = {
+                    "user_id": bind_value(user["user_id"]) if bind_value else user["user_id"],
+                    "question_number": rng.randint(1, QUESTIONS),
+                    "subscription_id": user["subscription_id"],
+                    "now": datetime.utcnow()
+                }
+                params = make_params(sample)
+                if plan is None:
+                    plan = explain(engine, sql, params)
+                start = time.perf_counter()
+                conn.execute(text(sql), params).fetchall()
+                latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        results[name] = {
+            "plan": plan,
+            "mean_ms": statistics.mean(latencies) * 1000,
+            "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000
+        }
+    return results
+
+
+def report(label: str, results: Dict[str, Dict]) -> None:
+    print(f"\n== {label} ==")
+    for name, stats in results.items():
+        print(f"{name}: mean {stats['mean_ms']:.3f} ms, p95 {stats['p95_ms']:.3f} ms")
+        print(stats["plan"])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=int, default=1_000_000, help="Total form responses to seed")
+    parser.add_argument("--answer-size", type=int, default=100, help="Characters per answer")
+    parser.add_argument("--runs", type=int, default=200, help="Executions per query")
+    parser.add_argument("--database-url", help="Benchmark an empty existing database instead of a temporary SQLite file")
+    args = parser.parse_args()
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        engine = create_engine(f"sqlite:///{path}")
+
+    create_legacy_schema(engine)
+    start = time.perf_counter()
+    users = seed(engine, args.responses, args.answer_size)
+    print(f"Seeded {len(users)} users and {len(users) * QUESTIONS} responses in {time.perf_counter() - start:.1f}s")
+
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    before = measure(engine, users, args.runs)
+
+    start = time.perf_counter()
+    add_indexes(engine)
+    print(f"Built indexes in {time.perf_counter() - start:.1f}s")
+    after = measure(engine, users, args.runs)
+
+    report("before", before)
+    report("after", after)
+
+    print("\n== speedup (mean) ==")
+    for name in QUERIES:
+        print(f"{name}: {before[name]['mean_ms'] / after[name]['mean_ms']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
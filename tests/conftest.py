@@ -1,31 +1,53 @@
+import asyncio
+import json
 import os
+import threading
+import time
 import uuid
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Generator, List
 
+import httpx
+import jwt
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
 from pytest_mock import MockerFixture
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel.pool import StaticPool
 
 from app.models.models import User, FormResponse, Result
-from app.models.database import get_session
+from app.models.database import get_session, get_session_factory, get_async_session
 from app.routers.ai.ai_models import SummaryOutput, FullPlanOutput
+from app.routers.ai.ai_cache import generation_cache
+from app.auth_cache import SessionValidator
+from app.metrics import instrument_engine
+from app.query_profiler import profile_queries
 from main import app
 
 
+# Simulated LLM latency and user count for concurrent generation tests
+SLOW_LLM_DELAY = 0.5
+GENERATION_USER_COUNT = 10
+
+
 # Database fixtures
 @pytest.fixture
-def test_db_engine():
-    """Create an in-memory SQLite database engine for testing."""
-    # Use pure in-memory SQLite database without a file
-    # This prevents the file::memory: file from being created
-    TEST_DATABASE_URL = "sqlite://"
+def test_db_engine(tmp_path):
+    """
+    Create a SQLite database engine for testing.
     
-    # Create a test engine with StaticPool to maintain a single connection
+    The database is a file under tmp_path, so the async engine of the
+    ``client`` fixture can open it too. StaticPool keeps a single sync
+    connection, shared by test_db and the app's sync sessions.
+    """
     test_engine = create_engine(
-        TEST_DATABASE_URL,
+        f"sqlite:///{tmp_path / 'test.db'}",
         connect_args={"check_same_thread": False},
         poolclass=StaticPool
     )
@@ -53,13 +75,26 @@ def test_db(test_db_engine) -> Generator[Session, None, None]:
 @pytest.fixture
 def client(test_db_engine) -> TestClient:
     """Create a test client with a test database session."""
-    # Override the get_session dependency to use our test database
+    # Override the session dependencies to use our test database
     def override_get_session():
         with Session(test_db_engine) as session:
             yield session
     
-    # Override the dependency in the app
+    # NullPool holds no connections, so the engine needs no disposing in
+    # the event loop TestClient runs the app in
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{test_db_engine.url.database}", poolclass=NullPool)
+    
+    async def override_get_async_session():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+    
+    def override_get_session_factory():
+        return lambda: Session(test_db_engine)
+    
+    # Override the dependencies in the app
     app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_session_factory] = override_get_session_factory
+    app.dependency_overrides[get_async_session] = override_get_async_session
     
     # Create and return a test client
     with TestClient(app) as client:
@@ -69,6 +104,105 @@ def client(test_db_engine) -> TestClient:
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def file_db_engine(tmp_path):
+    """
+    File-backed SQLite engine for tests that run requests concurrently.
+    
+    Unlike the in-memory StaticPool engine, every session gets its own
+    connection, so threadpool work from overlapping requests doesn't collide.
+    """
+    test_engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        connect_args={"check_same_thread": False}
+    )
+    SQLModel.metadata.create_all(test_engine)
+    
+    yield test_engine
+    
+    test_engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def async_db_engine(file_db_engine):
+    """aiosqlite engine on the same file as file_db_engine, for AsyncSession routes."""
+    test_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{file_db_engine.url.database}",
+        poolclass=NullPool
+    )
+    
+    yield test_engine
+    
+    await test_engine.dispose()
+
+
+@pytest.fixture
+def async_client(file_db_engine, async_db_engine) -> httpx.AsyncClient:
+    """
+    Async client that calls the app in-process against the file database.
+    
+    Use it as ``async with async_client as client:`` inside async tests.
+    Startup events are not run, so no production database connection is made.
+    """
+    def override_get_session():
+        with Session(file_db_engine) as session:
+            yield session
+    
+    async def override_get_async_session():
+        async with AsyncSession(async_db_engine, expire_on_commit=False) as session:
+            yield session
+    
+    def override_get_session_factory():
+        return lambda: Session(file_db_engine)
+    
+    app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_session_factory] = override_get_session_factory
+    app.dependency_overrides[get_async_session] = override_get_async_session
+    
+    transport = httpx.ASGITransport(app=app)
+    yield httpx.AsyncClient(transport=transport, base_url="http://test")
+    
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def internal_headers(monkeypatch):
+    """Configure an internal token and return the headers that present it."""
+    from app.routers import internal
+    
+    monkeypatch.setattr(internal, "INTERNAL_METRICS_TOKEN", "internal-test-token")
+    return {"X-Internal-Token": "internal-test-token"}
+
+
+@pytest.fixture
+def query_budget(file_db_engine, async_db_engine):
+    """
+    Assert how many SQL statements a block runs against the test databases.
+    
+    Usage::
+    
+        with query_budget(2):
+            await client.get(f"/api/results/{user_id}/summary")
+    
+    Fails, listing every statement and its call site, when the block runs
+    more than ``max_queries`` statements or repeats one, or when a statement
+    looks like an N+1 loop. Pass ``allow_repeated=True`` for code that
+    legitimately re-runs a query.
+    """
+    instrument_engine(file_db_engine)
+    instrument_engine(async_db_engine)
+    
+    @contextmanager
+    def budget(max_queries: int, allow_repeated: bool = False):
+        with profile_queries() as profile:
+            yield profile
+        assert profile.count <= max_queries, f"Expected at most {max_queries} queries:\n{profile.report()}"
+        if not allow_repeated:
+            assert not profile.repeated() and not profile.n_plus_one(), f"Redundant queries:\n{profile.report()}"
+    
+    return budget
+
+
 # Test data fixtures
 @pytest.fixture
 def test_user() -> User:
@@ -252,31 +386,239 @@ def test_full_result_in_db(test_db, test_user_in_db) -> Result:
     test_db.commit()
 
 
+@pytest.fixture
+def generation_users(file_db_engine):
+    """Add pursuit-tier users with all 25 answers, so both generation tiers can run."""
+    user_ids = []
+    with Session(file_db_engine) as session:
+        for i in range(GENERATION_USER_COUNT):
+            user = User(
+                name=f"Load User {i}",
+                email=f"load{i}@example.com",
+                dob=datetime(1990, 1, 1),
+                progress_state="25",
+                payment_tier="pursuit"
+            )
+            session.add(user)
+            session.flush()
+            for question_number in range(1, 26):
+                session.add(FormResponse(
+                    user_id=user.id,
+                    question_number=question_number,
+                    response=f"Answer {question_number}"
+                ))
+            user_ids.append(user.id)
+        session.commit()
+    return user_ids
+
+
+@pytest.fixture
+def slow_llm_chains(mocker, mock_summary_output, mock_full_plan_output):
+    """Replace both chains with async mocks that take SLOW_LLM_DELAY seconds to answer."""
+    async def slow_summary(*args, **kwargs):
+        await asyncio.sleep(SLOW_LLM_DELAY)
+        return mock_summary_output
+
+    async def slow_full_plan(*args, **kwargs):
+        await asyncio.sleep(SLOW_LLM_DELAY)
+        return mock_full_plan_output
+
+    summary_chain = mocker.MagicMock()
+    summary_chain.ainvoke = slow_summary
+    full_plan_chain = mocker.MagicMock()
+    full_plan_chain.ainvoke = slow_full_plan
+
+    mocker.patch("app.routers.ai.ai_generation.summary_chain", summary_chain)
+    mocker.patch("app.routers.ai.ai_generation.full_plan_chain", full_plan_chain)
+    return summary_chain, full_plan_chain
+
+
+@pytest.fixture(autouse=True)
+def clear_generation_cache():
+    """Start every test with an empty generation cache so mocked chains always run."""
+    generation_cache.clear()
+    yield
+    generation_cache.clear()
+
+
 # Mock fixtures for external services
 @pytest.fixture
 def mock_stytch_client(mocker: MockerFixture):
-    """Mock the Stytch client."""
+    """Mock the Stytch client, including the ones the auth routes and session validator already hold."""
+    from app.routers.auth import session_validator
+    
     mock_client = mocker.patch("clients.get_stytch_client")
     
     # Create a mock client with the necessary methods
     mock_client_instance = mocker.MagicMock()
     mock_client.return_value = mock_client_instance
+    mocker.patch("app.routers.auth.stytch_client", mock_client_instance)
     
-    # Mock the magic links methods
+    # Sessions go to the mock, and JWTs always fall through to it: the JWKS has no keys
+    mocker.patch.object(session_validator, "stytch_client", mock_client_instance)
+    jwks_client = mocker.MagicMock()
+    jwks_client.get_signing_key_from_jwt.side_effect = jwt.PyJWKClientError("No signing keys")
+    mocker.patch.object(session_validator, "jwks_client", jwks_client)
+    session_validator.clear()
+    
+    # Mock the magic links methods; the auth routes await the async variants
     mock_client_instance.magic_links = mocker.MagicMock()
     mock_client_instance.magic_links.email = mocker.MagicMock()
-    mock_client_instance.magic_links.email.login_or_create = mocker.MagicMock()
-    mock_client_instance.magic_links.authenticate = mocker.MagicMock()
+    mock_client_instance.magic_links.email.login_or_create_async = mocker.AsyncMock()
+    mock_client_instance.magic_links.authenticate_async = mocker.AsyncMock()
     
     # Mock the sessions methods
     mock_client_instance.sessions = mocker.MagicMock()
     mock_client_instance.sessions.authenticate = mocker.MagicMock()
     mock_client_instance.sessions.authenticate_jwt = mocker.MagicMock()
-    mock_client_instance.sessions.exchange_session_token = mocker.MagicMock()
+    mock_client_instance.sessions.authenticate_async = mocker.AsyncMock()
     
     return mock_client_instance
 
 
+# Fake Stytch server
+FAKE_STYTCH_USER_ID = "user-test-00000000-0000-0000-0000-000000000001"
+FAKE_STYTCH_EMAIL = "fake@example.com"
+
+
+class FakeStytchHandler(BaseHTTPRequestHandler):
+    """
+    Minimal stand-in for the Stytch API endpoints the auth module calls.
+    
+    Every request waits ``server.delay`` seconds first, to simulate a slow
+    identity provider. Any token starting with "invalid" is rejected.
+    """
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def _send(self, status_code, body):
+        payload = json.dumps({"status_code": status_code, "request_id": "request-id-test", **body}).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _user(self):
+        return {
+            "user_id": FAKE_STYTCH_USER_ID,
+            "emails": [{"email_id": "email-test-1", "email": FAKE_STYTCH_EMAIL, "verified": True}],
+            "status": "active",
+            "phone_numbers": [],
+            "webauthn_registrations": [],
+            "providers": [],
+            "totps": [],
+            "crypto_wallets": [],
+            "biometric_registrations": [],
+            "is_locked": False,
+            "roles": []
+        }
+    
+    def _session(self):
+        now = datetime.utcnow()
+        return {
+            "session_id": "session-test-1",
+            "user_id": FAKE_STYTCH_USER_ID,
+            "authentication_factors": [],
+            "roles": [],
+            "started_at": now.isoformat() + "Z",
+            "last_accessed_at": now.isoformat() + "Z",
+            "expires_at": (now + timedelta(days=30)).isoformat() + "Z"
+        }
+    
+    def do_POST(self):
+        self.server.requests.append(self.path)
+        time.sleep(self.server.delay)
+        
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        token = body.get("session_token") or body.get("session_jwt") or body.get("token") or ""
+        
+        if token.startswith("invalid"):
+            return self._send(404, {
+                "error_type": "session_not_found",
+                "error_message": "Session could not be found.",
+                "error_url": "https://stytch.com/docs/api/errors/404"
+            })
+        
+        if self.path == "/v1/sessions/authenticate":
+            return self._send(200, {
+                "session": self._session(),
+                "session_token": token,
+                "session_jwt": "",
+                "user": self._user()
+            })
+        if self.path == "/v1/magic_links/authenticate":
+            return self._send(200, {
+                "user_id": FAKE_STYTCH_USER_ID,
+                "method_id": "email-test-1",
+                "session_token": "fake-session-token",
+                "session_jwt": "",
+                "user": self._user(),
+                "reset_sessions": False,
+                "session": self._session()
+            })
+        if self.path == "/v1/magic_links/email/login_or_create":
+            return self._send(200, {
+                "user_id": FAKE_STYTCH_USER_ID,
+                "email_id": "email-test-1",
+                "user_created": False
+            })
+        
+        self._send(404, {"error_type": "not_found", "error_message": self.path, "error_url": ""})
+
+
+@pytest.fixture
+def fake_stytch_server():
+    """
+    Run a fake Stytch API on a local port.
+    
+    Set ``server.delay`` to make every call slow; ``server.requests`` lists
+    the paths that were called.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeStytchHandler)
+    server.delay = 0
+    server.requests = []
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}/"
+    
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    yield server
+    
+    server.shutdown()
+    server.server_close()
+
+
+@pytest_asyncio.fixture
+async def fake_stytch_client(mocker: MockerFixture, fake_stytch_server):
+    """
+    Point the auth module at the fake Stytch server.
+    
+    Returns the server; the real Stytch SDK client talks to it over HTTP.
+    """
+    import aiohttp
+    from stytch import Client
+    from app.routers import auth
+    
+    async_session = aiohttp.ClientSession()
+    client = Client(
+        project_id="project-test-00000000-0000-0000-0000-000000000000",
+        secret="secret-test-fake",
+        environment="test",
+        async_session=async_session
+    )
+    # custom_base_url insists on HTTPS, so repoint the shared ApiBase instead
+    client.api_base.base_url = fake_stytch_server.base_url
+    mocker.patch.object(auth, "stytch_client", client)
+    mocker.patch.object(auth, "session_validator", SessionValidator(client))
+    
+    yield fake_stytch_server
+    
+    await async_session.close()
+
+
 @pytest.fixture
 def mock_stripe(mocker: MockerFixture):
     """Mock the Stripe client."""
@@ -464,9 +806,16 @@ def create_mock_stytch_error(message, status_code, error_type, error_message, re
         mock_error.error_message = error_message
         mock_error.request_id = request_id
     
-    # Add details attribute with original_json
-    from unittest.mock import MagicMock
-    mock_error.details = MagicMock()
-    mock_error.details.original_json = {"error": error_message}
+    # Add the details the SDK raises with; str(error) renders them, so the
+    # error message can be matched as it would be in production
+    from stytch.core.response_base import StytchErrorDetails
+    mock_error.details = StytchErrorDetails(
+        status_code=status_code,
+        request_id=request_id,
+        error_type=error_type,
+        error_message=error_message,
+        error_url=None,
+        original_json={"error": error_message}
+    )
     
     return mock_error
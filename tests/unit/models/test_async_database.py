@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.models import Result, User, build_async_engine
+from app.models.database import async_database_url
+
+
+@pytest.fixture
+def results_user(file_db_engine):
+    with Session(file_db_engine) as session:
+        user = User(name="Test User", email="test@example.com", dob=datetime(1990, 1, 1), payment_tier="basic")
+        session.add(user)
+        session.flush()
+        session.add(Result(user_id=user.id, basic_plan='{"purpose": "Test purpose", "mantra": "Test mantra"}', full_plan=""))
+        session.commit()
+        return user.id
+
+
+def test_async_database_url():
+    assert async_database_url("postgresql://u:p@localhost/db") == "postgresql+asyncpg://u:p@localhost/db"
+    assert async_database_url("postgresql+psycopg2://u:p@localhost/db") == "postgresql+asyncpg://u:p@localhost/db"
+    assert async_database_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+    assert async_database_url(
+        "postgresql://u:p@localhost/db?sslmode=require&connect_timeout=10&target_session_attrs=read-write"
+    ) == "postgresql+asyncpg://u:p@localhost/db?target_session_attrs=read-write"
+
+
+def test_async_engine_maps_url_sslmode_to_ssl(mocker):
+    """asyncpg has no sslmode argument, so the URL's sslmode is passed as ssl, over DB_SSLMODE."""
+    engine = build_async_engine("postgresql://u:p@localhost/db?sslmode=require", sslmode="disable")
+    _, url_args = engine.dialect.create_connect_args(engine.url)
+    assert "sslmode" not in url_args
+
+    create = mocker.patch("app.models.database.create_async_engine")
+    build_async_engine("postgresql://u:p@localhost/db?sslmode=require", sslmode="disable", statement_timeout_ms=0)
+    assert create.call_args.kwargs["connect_args"] == {"ssl": "require"}
+
+
+def test_build_async_engine_settings(mocker):
+    """Test that asyncpg gets the timeout as a server setting, and no statement caches behind PgBouncer."""
+    create = mocker.patch("app.models.database.create_async_engine")
+
+    build_async_engine("postgresql://u:p@localhost/db", pool_size=3, statement_timeout_ms=15000, pgbouncer=False)
+    url, kwargs = create.call_args.args[0], create.call_args.kwargs
+    assert url.drivername == "postgresql+asyncpg"
+    assert kwargs["pool_size"] == 3
+    assert kwargs["connect_args"] == {"ssl": "prefer", "server_settings": {"statement_timeout": "15000"}}
+
+    build_async_engine("postgresql://u:p@localhost/db", statement_timeout_ms=15000, pgbouncer=True, sslmode=None)
+    url, kwargs = create.call_args.args[0], create.call_args.kwargs
+    assert url.query == {"prepared_statement_cache_size": "0"}
+    assert kwargs["connect_args"] == {"statement_cache_size": 0}
+
+
+@pytest.mark.asyncio
+async def test_results_read_through_async_session(async_client, file_db_engine, async_db_engine, results_user):
+    executed = []
+    event.listen(async_db_engine.sync_engine, "before_cursor_execute", lambda *args: executed.append(args[2]))
+    sync_executed = []
+    event.listen(file_db_engine, "before_cursor_execute", lambda *args: sync_executed.append(args[2]))
+
+    async with async_client as client:
+        summary = await client.get(f"/api/results/{results_user}/summary")
+        check = await client.get(f"/api/results/{results_user}/check-results")
+
+    assert summary.status_code == 200
+    assert summary.json()["summary"] == "Test purpose"
+    assert check.json()["has_results"] is True
+
+    # Version then plans for the uncached summary, one query for the check,
+    # none through the sync engine
+    assert len([s for s in executed if s.lstrip().upper().startswith("SELECT")]) == 3
+    assert sync_executed == []
+
+
+@pytest.mark.asyncio
+async def test_results_read_unknown_user(async_client):
+    async with async_client as client:
+        response = await client.get("/api/results/00000000-0000-0000-0000-000000000000/check-results")
+
+    assert response.status_code == 404
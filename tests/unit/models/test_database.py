@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import exc
+from sqlmodel import create_engine
+
+from app.models import build_engine, pool_stats
+from app.models.database import TimedQueuePool
+from app.routers import internal
+
+
+def test_build_engine_postgres_settings(mocker):
+    """Test that pool sizing and connection settings reach create_engine."""
+    create = mocker.patch("app.models.database.create_engine")
+
+    build_engine("postgresql://u:p@localhost/db", pool_size=3, max_overflow=2, pool_timeout=5, statement_timeout_ms=15000, pgbouncer=False)
+
+    kwargs = create.call_args.kwargs
+    assert kwargs["pool_size"] == 3
+    assert kwargs["max_overflow"] == 2
+    assert kwargs["pool_timeout"] == 5
+    assert kwargs["poolclass"] is TimedQueuePool
+    assert kwargs["connect_args"] == {"sslmode": "prefer", "options": "-c statement_timeout=15000"}
+
+
+def test_build_engine_pgbouncer_settings(mocker):
+    """Test that PgBouncer mode drops startup options and prepared statements."""
+    create = mocker.patch("app.models.database.create_engine")
+
+    build_engine("postgresql+psycopg://u:p@localhost/db", statement_timeout_ms=15000, pgbouncer=True, sslmode=None)
+
+    assert create.call_args.kwargs["connect_args"] == {"prepare_threshold": None}
+
+
+def test_pool_stats_track_waits_and_timeouts(tmp_path):
+    """Test that checkouts, overflow and timeouts show up in the pool stats."""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=TimedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05
+    )
+
+    held = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+
+    stats = pool_stats(engine)
+    assert stats["pool_class"] == "TimedQueuePool"
+    assert stats["pool_size"] == 1
+    assert stats["checked_out"] == 1
+    assert stats["checkouts"] == 2
+    assert stats["timeouts"] == 1
+    assert stats["wait_seconds_max"] >= 0.05
+
+    held.close()
+    assert pool_stats(engine)["checked_out"] == 0
+    engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_internal_metrics_endpoint(async_client, monkeypatch):
+    """Test that the metrics endpoint reports the pool and requires the token."""
+    async with async_client as client:
+        monkeypatch.setattr(internal, "INTERNAL_METRICS_TOKEN", None)
+        assert (await client.get("/internal/metrics")).status_code == 404
+
+        monkeypatch.setattr(internal, "INTERNAL_METRICS_TOKEN", "secret")
+        assert (await client.get("/internal/metrics")).status_code == 403
+        response = await client.get("/internal/metrics", headers={"X-Internal-Token": "secret"})
+        assert response.status_code == 200
+        assert "checked_out" in response.json()["db_pool"]
+        assert "db_async_pool" in response.json()
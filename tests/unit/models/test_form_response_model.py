@@ -2,6 +2,7 @@ import uuid
 from datetime import datetime
 
 import pytest
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 
 from app.models.models import FormResponse, User
@@ -177,3 +178,20 @@ def test_multiple_form_responses_per_user(test_db, test_user_in_db):
     for response in responses:
         test_db.delete(response)
     test_db.commit()
+
+
+def test_one_response_per_question(test_db, test_user_in_db):
+    """Test that a user can't store two answers to the same question."""
+    test_db.add(FormResponse(user_id=test_user_in_db.id, question_number=1, response="First answer"))
+    test_db.commit()
+    
+    # A second answer to the same question violates the unique constraint
+    test_db.add(FormResponse(user_id=test_user_in_db.id, question_number=1, response="Second answer"))
+    with pytest.raises(IntegrityError):
+        test_db.commit()
+    test_db.rollback()
+    
+    # Clean up
+    for response in test_db.exec(select(FormResponse).where(FormResponse.user_id == test_user_in_db.id)).all():
+        test_db.delete(response)
+    test_db.commit()
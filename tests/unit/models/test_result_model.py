@@ -204,3 +204,37 @@ def test_update_last_generated_at(test_db, test_basic_result_in_db):
     
     # Check that the last_generated_at timestamp was updated
     assert test_basic_result_in_db.last_generated_at > initial_timestamp
+
+
+def test_plans_are_stored_as_json(test_db, test_user_in_db):
+    """Test that plans are stored as JSON documents but read back as JSON text."""
+    from sqlalchemy import text
+
+    result = Result(
+        user_id=test_user_in_db.id,
+        basic_plan=json.dumps({"mantra": "Test mantra", "purpose": "Test purpose"}),
+        full_plan="",
+        regeneration_count=0
+    )
+    test_db.add(result)
+    test_db.commit()
+
+    stored = test_db.exec(text(
+        "SELECT json_extract(basic_plan, '$.mantra'), full_plan IS NULL FROM results"
+    )).one()
+    assert tuple(stored) == ("Test mantra", 1)
+
+    test_db.expire_all()
+    loaded = test_db.exec(select(Result).where(Result.id == result.id)).one()
+    assert json.loads(loaded.basic_plan) == {"mantra": "Test mantra", "purpose": "Test purpose"}
+    assert loaded.full_plan == ""
+
+    # Text that isn't JSON survives as a JSON string
+    loaded.basic_plan = "not json"
+    test_db.add(loaded)
+    test_db.commit()
+    test_db.expire_all()
+    assert test_db.get(Result, result.id).basic_plan == "not json"
+
+    test_db.delete(loaded)
+    test_db.commit()
@@ -0,0 +1,108 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models.models import User, Result
+from tests.conftest import SLOW_LLM_DELAY as LLM_DELAY, GENERATION_USER_COUNT as CONCURRENT_GENERATIONS
+
+
+@pytest.mark.asyncio
+async def test_generate_basic_stores_result(async_client, generation_users, slow_llm_chains, file_db_engine):
+    """The async basic path stores the generated basic plan."""
+    user_id = generation_users[0]
+
+    async with async_client as client:
+        response = await client.post(f"/api/ai/{user_id}/generate-basic")
+
+    assert response.status_code == 200
+    assert response.json()["success"] is True
+
+    with Session(file_db_engine) as session:
+        result = session.exec(select(Result).where(Result.user_id == user_id)).first()
+        assert result is not None
+        assert "Test mantra" in result.basic_plan
+        assert result.full_plan == ""
+
+
+@pytest.mark.asyncio
+async def test_generate_premium_stores_result(async_client, generation_users, slow_llm_chains, file_db_engine):
+    """The async premium path stores both the basic and the full plan."""
+    user_id = generation_users[0]
+
+    async with async_client as client:
+        response = await client.post(f"/api/ai/{user_id}/generate-premium")
+
+    assert response.status_code == 200
+
+    with Session(file_db_engine) as session:
+        result = session.exec(select(Result).where(Result.user_id == user_id)).first()
+        assert result is not None
+        assert "Test mantra" in result.basic_plan
+        assert "next_steps" in result.full_plan
+
+
+@pytest.mark.asyncio
+async def test_generate_premium_requires_premium_access(async_client, generation_users, slow_llm_chains, file_db_engine):
+    """Users without premium access are rejected before any LLM call."""
+    user_id = generation_users[0]
+    with Session(file_db_engine) as session:
+        user = session.get(User, user_id)
+        user.payment_tier = "purpose"
+        session.add(user)
+        session.commit()
+
+    async with async_client as client:
+        response = await client.post(f"/api/ai/{user_id}/generate-premium")
+
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_other_endpoints_served_while_generations_in_flight(async_client, generation_users, slow_llm_chains):
+    """
+    Load test: fire N slow generations at once and check that an unrelated
+    endpoint still answers promptly while they are all in flight.
+    """
+    async with async_client as client:
+        generations = [
+            asyncio.create_task(client.post(f"/api/ai/{user_id}/generate-basic"))
+            for user_id in generation_users
+        ]
+
+        # Give the generations time to reach the (simulated) LLM call
+        await asyncio.sleep(LLM_DELAY / 5)
+
+        latencies = []
+        for _ in range(5):
+            start = time.perf_counter()
+            response = await client.get("/robots.txt")
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200
+
+        # The generations should still be running when the probes complete
+        assert not all(task.done() for task in generations)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*generations)
+        remaining = time.perf_counter() - start
+
+    assert all(r.status_code == 200 for r in results)
+
+    # Probes are answered well within a single LLM call
+    assert max(latencies) < LLM_DELAY / 2
+
+    # Generations overlapped instead of running back to back
+    assert remaining < LLM_DELAY * CONCURRENT_GENERATIONS / 2
+
+
+@pytest.mark.asyncio
+async def test_generate_basic_unknown_user(async_client):
+    """Unknown users still get a 404 from the async path."""
+    async with async_client as client:
+        response = await client.post(f"/api/ai/{uuid.uuid4()}/generate-basic")
+
+    assert response.status_code == 404
+    assert "User not found" in response.json()["detail"]
@@ -0,0 +1,127 @@
+import json
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+from sqlmodel import Session
+
+from app.models import GenerationCacheEntry
+from app.routers.ai import ai_cache, ai_generation
+from app.routers.ai.ai_cache import GenerationCache, SQLCacheBackend, generation_cache, generation_cache_key
+from app.routers.ai.ai_generation import agenerate_plan, agenerate_purpose, astream_plan_sections, generate_purpose
+
+
+def test_cache_key_covers_prompt_version_model_and_input(mocker):
+    key = generation_cache_key("summary", "responses")
+
+    assert generation_cache_key("summary", "responses") == key
+    assert generation_cache_key("full_plan", "responses") != key
+    assert generation_cache_key("summary", "other responses") != key
+
+    mocker.patch.object(ai_cache, "PROMPT_VERSION", "next")
+    assert generation_cache_key("summary", "responses") != key
+
+    mocker.patch.object(ai_cache, "PROMPT_VERSION", "1")
+    mocker.patch.object(ai_cache, "MODEL_CONFIG", {"model": "other"})
+    assert generation_cache_key("summary", "responses") != key
+
+
+@pytest.mark.asyncio
+async def test_repeat_generation_skips_the_llm(mocker, mock_summary_output, test_user, test_form_responses, mock_zodiac_info):
+    summary_chain = MagicMock()
+    summary_chain.ainvoke = mocker.AsyncMock(return_value=mock_summary_output)
+    mocker.patch.object(ai_generation, "summary_chain", summary_chain)
+
+    first = await agenerate_purpose(test_user, mock_zodiac_info, test_form_responses)
+    second = await agenerate_purpose(test_user, mock_zodiac_info, test_form_responses)
+
+    assert first == second == mock_summary_output
+    assert summary_chain.ainvoke.await_count == 1
+    assert generation_cache.stats()["hits"] == 1
+    assert generation_cache.stats()["misses"] == 1
+
+
+def test_sync_and_async_paths_share_the_cache(mocker, mock_summary_output, test_user, test_form_responses, mock_zodiac_info):
+    summary_chain = MagicMock()
+    summary_chain.invoke = MagicMock(return_value=mock_summary_output)
+    mocker.patch.object(ai_generation, "summary_chain", summary_chain)
+
+    generate_purpose(test_user, mock_zodiac_info, test_form_responses)
+    generate_purpose(test_user, mock_zodiac_info, test_form_responses)
+
+    assert summary_chain.invoke.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_regeneration_calls_the_llm_again(async_client, generation_users, slow_llm_chains):
+    """Regenerating with unchanged answers must not hand back the cached plan."""
+    summary_chain, _ = slow_llm_chains
+    summary_chain.ainvoke = MagicMock(wraps=summary_chain.ainvoke)
+    user_id = generation_users[0]
+
+    async with async_client as client:
+        for _ in range(2):
+            assert (await client.post(f"/api/ai/{user_id}/generate-basic")).status_code == 200
+
+    assert summary_chain.ainvoke.call_count == 2
+    assert generation_cache.stats()["hits"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_full_plan_is_streamed_without_the_llm(mocker, mock_summary_output, mock_full_plan_output, test_user, test_all_form_responses, mock_zodiac_info):
+    mocker.patch.object(ai_generation, "summary_chain", MagicMock(ainvoke=mocker.AsyncMock(return_value=mock_summary_output)))
+    mocker.patch.object(ai_generation, "full_plan_chain", MagicMock(ainvoke=mocker.AsyncMock(return_value=mock_full_plan_output)))
+    stream_chain = MagicMock()
+    mocker.patch.object(ai_generation, "full_plan_stream_chain", stream_chain)
+
+    await agenerate_plan(test_user, mock_zodiac_info, test_all_form_responses)
+    sections = [s async for s in astream_plan_sections(test_user, mock_zodiac_info, test_all_form_responses)]
+
+    assert dict(sections) == mock_full_plan_output.model_dump()
+    stream_chain.astream.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_backend_errors_fall_through_to_the_llm(mocker, mock_summary_output, test_user, test_form_responses, mock_zodiac_info):
+    backend = MagicMock(blocking=False)
+    backend.get.side_effect = RuntimeError("cache down")
+    backend.set.side_effect = RuntimeError("cache down")
+    mocker.patch.object(ai_cache, "generation_cache", GenerationCache(backend))
+    summary_chain = MagicMock()
+    summary_chain.ainvoke = mocker.AsyncMock(return_value=mock_summary_output)
+    mocker.patch.object(ai_generation, "summary_chain", summary_chain)
+
+    assert await agenerate_purpose(test_user, mock_zodiac_info, test_form_responses) == mock_summary_output
+
+
+def test_sql_backend_round_trip_expiry_and_size_cap(file_db_engine):
+    backend = SQLCacheBackend(lambda: Session(file_db_engine), max_size=2, ttl=60)
+
+    backend.set("a", "summary", json.dumps({"n": 1}))
+    assert json.loads(backend.get("a")) == {"n": 1}
+    assert backend.get("missing") is None
+
+    # Expired entries are misses
+    with Session(file_db_engine) as session:
+        entry = session.get(GenerationCacheEntry, "a")
+        entry.expires_at = datetime.utcnow() - timedelta(seconds=1)
+        session.add(entry)
+        session.commit()
+    assert backend.get("a") is None
+
+    # The oldest entries are evicted past max_size
+    backend.set("b", "summary", "1")
+    backend.set("c", "summary", "2")
+    backend.set("d", "summary", "3")
+    assert backend.size() == 2
+    assert backend.get("b") is None
+    assert backend.get("d") == "3"
+
+
+@pytest.mark.asyncio
+async def test_cache_stats_endpoint(async_client):
+    async with async_client as client:
+        response = await client.get("/api/ai/cache/stats")
+
+    assert response.status_code == 200
+    assert response.json() == {"backend": "memory", "hits": 0, "misses": 0, "hit_rate": 0.0, "size": 0}
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models import Result
+from app.routers.ai import ai_generation, ai_service
+from app.routers.ai.ai_locks import advisory_lock_id, generation_lock, single_flight
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_one_call_per_key():
+    calls = []
+
+    async def work(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value
+
+    results = await asyncio.gather(
+        single_flight("a", lambda: work(1)),
+        single_flight("a", lambda: work(2)),
+        single_flight("b", lambda: work(3)),
+    )
+
+    assert results == [1, 1, 3]
+    assert calls == [1, 3]
+
+    # Once finished, the next call for the key runs again
+    assert await single_flight("a", lambda: work(4)) == 4
+
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_a_cancelled_caller():
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.ensure_future(single_flight("key", work))
+    second = asyncio.ensure_future(single_flight("key", work))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == "done"
+
+
+def test_advisory_lock_id_is_stable_and_fits_bigint():
+    lock_id = advisory_lock_id("premium:some-user")
+
+    assert lock_id == advisory_lock_id("premium:some-user")
+    assert lock_id != advisory_lock_id("basic:some-user")
+    assert -2**63 <= lock_id < 2**63
+
+
+@pytest.mark.asyncio
+async def test_generation_lock_is_a_no_op_off_postgres(file_db_engine):
+    async with generation_lock(file_db_engine, "basic:user") as waited:
+        assert waited is False
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_for_one_user_share_a_generation(async_client, file_db_engine, generation_users, slow_llm_chains):
+    summary_chain, _ = slow_llm_chains
+    summary_chain.ainvoke = MagicMock(wraps=summary_chain.ainvoke)
+    user_id = generation_users[0]
+
+    async with async_client as client:
+        responses = await asyncio.gather(*[
+            client.post(f"/api/ai/{user_id}/generate-basic") for _ in range(3)
+        ])
+
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert len({json.dumps(r.json()["summary"]) for r in responses}) == 1
+    assert summary_chain.ainvoke.call_count == 1
+
+    with Session(file_db_engine) as session:
+        results = session.exec(select(Result).where(Result.user_id == user_id)).all()
+        assert len(results) == 1
+
+
+@pytest.mark.asyncio
+async def test_generation_reuses_plan_saved_by_another_worker(mocker, file_db_engine, generation_users, mock_full_plan_output):
+    """After waiting on another worker's lock, a fresh stored plan is returned as is."""
+    user_id = generation_users[0]
+
+    @asynccontextmanager
+    async def contended_lock(bind, key):
+        # Simulate the other worker finishing while we waited
+        with Session(file_db_engine) as session:
+            session.add(Result(
+                user_id=user_id,
+                basic_plan=json.dumps({"mantra": "m", "purpose": "p"}),
+                full_plan=mock_full_plan_output.model_dump_json(),
+                last_generated_at=datetime.utcnow()
+            ))
+            session.commit()
+        yield True
+
+    mocker.patch.object(ai_service, "generation_lock", contended_lock)
+    full_plan_chain = MagicMock()
+    mocker.patch.object(ai_generation, "full_plan_chain", full_plan_chain)
+
+    output = await ai_service.run_premium_generation(lambda: Session(file_db_engine), user_id)
+
+    assert output == mock_full_plan_output
+    full_plan_chain.ainvoke.assert_not_called()
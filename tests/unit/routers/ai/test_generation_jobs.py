@@ -0,0 +1,153 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models.models import GenerationJob, Result, User
+from app.routers.ai import ai_jobs
+from tests.conftest import SLOW_LLM_DELAY
+
+
+async def wait_for_job(client, job_id, timeout=5.0):
+    """Poll the job endpoint until the job reaches a final state."""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        response = await client.get(f"/api/ai/jobs/{job_id}")
+        assert response.status_code == 200
+        job = response.json()
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        assert asyncio.get_running_loop().time() < deadline, f"Job {job_id} still {job['status']}"
+        await asyncio.sleep(0.05)
+
+
+@pytest.mark.asyncio
+async def test_enqueue_returns_immediately_and_job_succeeds(async_client, generation_users, slow_llm_chains, file_db_engine):
+    """Enqueueing answers before the LLM call finishes, and polling reports success."""
+    user_id = generation_users[0]
+
+    async with async_client as client:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        response = await client.post(f"/api/ai/{user_id}/generation-jobs?tier=premium")
+        enqueue_time = loop.time() - start
+
+        assert response.status_code == 202
+        data = response.json()
+        assert data["status"] == "queued"
+        assert data["status_url"] == f"/api/ai/jobs/{data['job_id']}"
+        assert enqueue_time < SLOW_LLM_DELAY
+
+        job = await wait_for_job(client, data["job_id"])
+
+    assert job["status"] == "succeeded"
+    assert job["error"] is None
+    assert job["tier"] == "premium"
+    assert job["run_seconds"] >= SLOW_LLM_DELAY * 0.9
+
+    with Session(file_db_engine) as session:
+        result = session.exec(select(Result).where(Result.user_id == user_id)).first()
+        assert result is not None
+        assert "next_steps" in result.full_plan
+
+
+@pytest.mark.asyncio
+async def test_failed_generation_is_recorded(async_client, generation_users, mocker):
+    """An LLM error marks the job failed with the error detail."""
+    async def broken(*args, **kwargs):
+        raise RuntimeError("model unavailable")
+
+    chain = mocker.MagicMock()
+    chain.ainvoke = broken
+    mocker.patch("app.routers.ai.ai_generation.summary_chain", chain)
+
+    async with async_client as client:
+        response = await client.post(f"/api/ai/{generation_users[0]}/generation-jobs?tier=basic")
+        job = await wait_for_job(client, response.json()["job_id"])
+
+    assert job["status"] == "failed"
+    assert "model unavailable" in job["error"]
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_limits_concurrency(async_client, generation_users, slow_llm_chains, mocker):
+    """No more than MAX_CONCURRENT_GENERATIONS jobs run at once; the rest wait queued."""
+    mocker.patch.object(ai_jobs, "MAX_CONCURRENT_GENERATIONS", 2)
+    mocker.patch.object(ai_jobs, "_slots", {})
+
+    async with async_client as client:
+        job_ids = []
+        for user_id in generation_users[:4]:
+            response = await client.post(f"/api/ai/{user_id}/generation-jobs?tier=basic")
+            job_ids.append(response.json()["job_id"])
+
+        await asyncio.sleep(SLOW_LLM_DELAY / 2)
+        statuses = [(await client.get(f"/api/ai/jobs/{job_id}")).json()["status"] for job_id in job_ids]
+        assert statuses.count("running") == 2
+        assert statuses.count("queued") == 2
+
+        jobs = [await wait_for_job(client, job_id) for job_id in job_ids]
+
+    assert all(job["status"] == "succeeded" for job in jobs)
+    # Jobs beyond the limit waited for a free slot
+    assert max(job["queued_seconds"] for job in jobs) >= SLOW_LLM_DELAY * 0.9
+
+
+@pytest.mark.asyncio
+async def test_enqueue_rejects_ineligible_user(async_client, generation_users, file_db_engine):
+    """Users without premium access are refused up front and no job is created."""
+    user_id = generation_users[0]
+    with Session(file_db_engine) as session:
+        user = session.get(User, user_id)
+        user.payment_tier = "purpose"
+        session.add(user)
+        session.commit()
+
+    async with async_client as client:
+        response = await client.post(f"/api/ai/{user_id}/generation-jobs?tier=premium")
+
+    assert response.status_code == 403
+    with Session(file_db_engine) as session:
+        assert session.exec(select(GenerationJob)).first() is None
+
+
+def test_startup_fails_orphaned_jobs(generation_users, file_db_engine):
+    """Jobs a previous process left queued or running are failed; recent ones may belong to another instance."""
+    user_id = generation_users[0]
+    long_ago = datetime.utcnow() - timedelta(seconds=ai_jobs.STALE_JOB_SECONDS + 60)
+    with Session(file_db_engine) as session:
+        queued = GenerationJob(user_id=user_id, tier="basic", created_at=long_ago)
+        running = GenerationJob(user_id=user_id, tier="premium", status="running", created_at=long_ago, started_at=long_ago)
+        fresh = GenerationJob(user_id=user_id, tier="premium")
+        session.add_all([queued, running, fresh])
+        session.commit()
+        job_ids = queued.id, running.id, fresh.id
+
+    assert ai_jobs.fail_orphaned_jobs(lambda: Session(file_db_engine)) == 2
+
+    with Session(file_db_engine) as session:
+        queued, running, fresh = (session.get(GenerationJob, job_id) for job_id in job_ids)
+        assert queued.status == running.status == "failed"
+        assert queued.finished_at is not None
+        assert "restart" in running.error
+        assert fresh.status == "queued"
+
+
+@pytest.mark.asyncio
+async def test_enqueue_invalid_tier(async_client, generation_users):
+    """Only basic and premium jobs can be enqueued."""
+    async with async_client as client:
+        response = await client.post(f"/api/ai/{generation_users[0]}/generation-jobs?tier=deluxe")
+
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_unknown_job(async_client):
+    """Polling an unknown job id returns 404."""
+    async with async_client as client:
+        response = await client.get(f"/api/ai/jobs/{uuid.uuid4()}")
+
+    assert response.status_code == 404
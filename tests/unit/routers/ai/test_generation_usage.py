@@ -0,0 +1,99 @@
+import uuid
+
+import pytest
+from langchain_core.outputs import LLMResult
+from sqlmodel import Session, select
+
+from app.models import GenerationUsage
+from app.routers.ai.ai_generation import agenerate_purpose
+from app.routers.ai.ai_usage import collect_usage, estimate_cost, percentile
+
+
+def usage_reporting_chain(mocker, output, prompt_tokens, cached_tokens, completion_tokens, model_calls=1):
+    """Create a chain mock whose ainvoke reports token usage to the callbacks in its config."""
+    async def ainvoke(inputs, config=None, **kwargs):
+        for callback in config["callbacks"]:
+            for _ in range(model_calls):
+                run_id = uuid.uuid4()
+                callback.on_chat_model_start({}, [], run_id=run_id)
+            callback.on_llm_end(LLMResult(generations=[[]], llm_output={"token_usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens}
+            }}), run_id=run_id)
+        return output
+
+    chain = mocker.MagicMock()
+    chain.ainvoke = ainvoke
+    return chain
+
+
+@pytest.fixture
+def usage_reporting_chains(mocker, mock_summary_output, mock_full_plan_output):
+    summary_chain = usage_reporting_chain(mocker, mock_summary_output, 3000, 2048, 100, model_calls=2)
+    full_plan_chain = usage_reporting_chain(mocker, mock_full_plan_output, 8000, 0, 2500)
+    mocker.patch("app.routers.ai.ai_generation.summary_chain", summary_chain)
+    mocker.patch("app.routers.ai.ai_generation.full_plan_chain", full_plan_chain)
+
+
+@pytest.mark.asyncio
+async def test_generation_usage_is_stored_per_generation(async_client, file_db_engine, generation_users, usage_reporting_chains):
+    user_id = generation_users[0]
+
+    async with async_client as client:
+        first = await client.post(f"/api/ai/{user_id}/generate-premium")
+        second = await client.post(f"/api/ai/{user_id}/generate-premium")
+
+    assert first.status_code == second.status_code == 200
+    with Session(file_db_engine) as session:
+        rows = session.exec(select(GenerationUsage).where(GenerationUsage.user_id == user_id)).all()
+
+    by_generation = {(row.generation, row.chain): row for row in rows}
+    # The regeneration keeps the basic plan, so only the full plan runs again
+    assert set(by_generation) == {(0, "summary"), (0, "full_plan"), (1, "full_plan")}
+
+    summary = by_generation[0, "summary"]
+    assert (summary.prompt_tokens, summary.cached_prompt_tokens, summary.completion_tokens) == (3000, 2048, 100)
+    assert summary.retries == 1
+    assert summary.payment_tier == "pursuit"
+    assert summary.cost_usd == pytest.approx(estimate_cost("gpt-4.1", 3000, 2048, 100))
+
+    regenerated = by_generation[1, "full_plan"]
+    assert not regenerated.cache_hit
+    assert regenerated.prompt_tokens == 8000
+
+
+@pytest.mark.asyncio
+async def test_cache_hits_are_recorded_without_cost(test_user, mock_zodiac_info, test_form_responses, usage_reporting_chains):
+    with collect_usage() as usage:
+        await agenerate_purpose(test_user, mock_zodiac_info, test_form_responses)
+        await agenerate_purpose(test_user, mock_zodiac_info, test_form_responses)
+
+    assert [call.cache_hit for call in usage] == [False, True]
+    assert usage[1].prompt_tokens == 0 and usage[1].cost_usd == 0
+
+
+@pytest.mark.asyncio
+async def test_usage_report_per_tier(async_client, generation_users, usage_reporting_chains, internal_headers):
+    async with async_client as client:
+        for user_id in generation_users[:3]:
+            await client.post(f"/api/ai/{user_id}/generate-basic")
+        response = await client.get("/internal/generation-usage?days=1", headers=internal_headers)
+
+    assert response.status_code == 200
+    [report] = response.json()["usage"]
+    assert (report["payment_tier"], report["chain"]) == ("pursuit", "summary")
+    assert report["generations"] == 3
+    assert report["cache_hits"] == 0
+    assert report["retries"] == 3
+    assert report["prompt_tokens"] == {"p50": 3000, "p95": 3000, "total": 9000}
+    assert report["cached_prompt_share"] == pytest.approx(2048 / 3000, abs=0.001)
+    assert report["latency_ms"]["p95"] >= report["latency_ms"]["p50"] >= 0
+
+
+def test_cached_prompt_tokens_are_cheaper():
+    assert estimate_cost("gpt-4.1", 1_000_000, 0, 0) == pytest.approx(2.0)
+    assert estimate_cost("gpt-4.1", 1_000_000, 1_000_000, 0) == pytest.approx(0.5)
+    assert estimate_cost("unknown-model", 1000, 0, 1000) == 0
+    assert percentile([5, 1, 3, 2, 4], 50) == 3
+    assert percentile([5, 1, 3, 2, 4], 95) == 5
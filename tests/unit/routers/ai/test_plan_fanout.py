@@ -0,0 +1,106 @@
+import asyncio
+import json
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.routers.ai import ai_generation
+from app.routers.ai.ai_generation import agenerate_plan, generate_plan
+
+
+BRANCH_DELAY = 0.3
+
+
+def make_async_chain(result=None, delay=BRANCH_DELAY, error=None):
+    """Create a chain mock whose ainvoke sleeps, then returns or raises."""
+    async def ainvoke(*args, **kwargs):
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        return result
+
+    chain = MagicMock()
+    chain.ainvoke = ainvoke
+    return chain
+
+
+@pytest.mark.asyncio
+async def test_agenerate_plan_runs_branches_concurrently(mocker, mock_summary_output, mock_full_plan_output, test_user, test_all_form_responses, mock_zodiac_info):
+    """Without a basic plan, both chains run at the same time."""
+    mocker.patch.object(ai_generation, "summary_chain", make_async_chain(mock_summary_output))
+    mocker.patch.object(ai_generation, "full_plan_chain", make_async_chain(mock_full_plan_output))
+
+    start = time.perf_counter()
+    basic_plan_json, full_plan_output = await agenerate_plan(test_user, mock_zodiac_info, test_all_form_responses)
+    elapsed = time.perf_counter() - start
+
+    assert json.loads(basic_plan_json)["mantra"] == mock_summary_output.mantra
+    assert full_plan_output == mock_full_plan_output
+    # Close to one branch's latency rather than the sum of both
+    assert elapsed < BRANCH_DELAY * 1.7
+
+
+@pytest.mark.asyncio
+async def test_agenerate_plan_summary_failure_falls_back_to_full_plan(mocker, mock_full_plan_output, test_user, test_all_form_responses, mock_zodiac_info):
+    """A failed summary branch is replaced by the full plan's mantra and purpose."""
+    mocker.patch.object(ai_generation, "summary_chain", make_async_chain(error=RuntimeError("summary down")))
+    mocker.patch.object(ai_generation, "full_plan_chain", make_async_chain(mock_full_plan_output))
+
+    basic_plan_json, full_plan_output = await agenerate_plan(test_user, mock_zodiac_info, test_all_form_responses)
+
+    basic_plan = json.loads(basic_plan_json)
+    assert basic_plan["mantra"] == mock_full_plan_output.mantra
+    assert basic_plan["purpose"] == mock_full_plan_output.purpose
+    assert full_plan_output == mock_full_plan_output
+
+
+@pytest.mark.asyncio
+async def test_agenerate_plan_full_plan_timeout_raises(mocker, mock_summary_output, test_user, test_all_form_responses, mock_zodiac_info):
+    """The full plan branch is required, so its timeout fails the generation."""
+    mocker.patch.object(ai_generation, "FULL_PLAN_TIMEOUT", 0.1)
+    mocker.patch.object(ai_generation, "summary_chain", make_async_chain(mock_summary_output, delay=0))
+    mocker.patch.object(ai_generation, "full_plan_chain", make_async_chain(delay=1))
+
+    with pytest.raises(TimeoutError):
+        await agenerate_plan(test_user, mock_zodiac_info, test_all_form_responses)
+
+
+@pytest.mark.asyncio
+async def test_agenerate_plan_with_existing_basic_plan_skips_summary(mocker, mock_full_plan_output, test_user, test_all_form_responses, mock_zodiac_info):
+    """An existing basic plan is kept and only the full plan chain runs."""
+    summary_chain = make_async_chain(error=AssertionError("summary should not run"))
+    mocker.patch.object(ai_generation, "summary_chain", summary_chain)
+    mocker.patch.object(ai_generation, "full_plan_chain", make_async_chain(mock_full_plan_output, delay=0))
+
+    existing_basic_plan = json.dumps({"mantra": "Existing mantra", "purpose": "Existing purpose"})
+    basic_plan_json, full_plan_output = await agenerate_plan(test_user, mock_zodiac_info, test_all_form_responses, existing_basic_plan)
+
+    assert basic_plan_json == existing_basic_plan
+    assert full_plan_output == mock_full_plan_output
+
+
+def test_generate_plan_runs_agenerate_plan(mocker, mock_summary_output, mock_full_plan_output, test_user, test_all_form_responses, mock_zodiac_info):
+    """The sync entry point runs the async fan-out to completion."""
+    mocker.patch.object(ai_generation, "summary_chain", make_async_chain(mock_summary_output))
+    mocker.patch.object(ai_generation, "full_plan_chain", make_async_chain(mock_full_plan_output))
+
+    start = time.perf_counter()
+    basic_plan_json, full_plan_output = generate_plan(test_user, mock_zodiac_info, test_all_form_responses)
+    elapsed = time.perf_counter() - start
+
+    assert json.loads(basic_plan_json)["purpose"] == mock_summary_output.purpose
+    assert full_plan_output == mock_full_plan_output
+    assert elapsed < BRANCH_DELAY * 1.7
+
+
+def test_generate_plan_summary_timeout_falls_back(mocker, mock_full_plan_output, test_user, test_all_form_responses, mock_zodiac_info):
+    """A summary branch that times out does not fail the sync generation."""
+    mocker.patch.object(ai_generation, "SUMMARY_TIMEOUT", 0.05)
+    mocker.patch.object(ai_generation, "summary_chain", make_async_chain(delay=0.5))
+    mocker.patch.object(ai_generation, "full_plan_chain", make_async_chain(mock_full_plan_output, delay=0))
+
+    basic_plan_json, full_plan_output = generate_plan(test_user, mock_zodiac_info, test_all_form_responses)
+
+    assert json.loads(basic_plan_json)["mantra"] == mock_full_plan_output.mantra
+    assert full_plan_output == mock_full_plan_output
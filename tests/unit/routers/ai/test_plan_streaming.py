@@ -0,0 +1,128 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models import Result
+from app.routers.ai import ai_generation
+from app.routers.ai.ai_generation import astream_plan_sections
+from tests.conftest import SLOW_LLM_DELAY
+
+
+def make_stream_chain(plan, delay=0, error=None):
+    """Create a chain mock whose astream grows the plan dict one key at a time."""
+    async def astream(*args, **kwargs):
+        partial = {}
+        for key, value in plan.items():
+            await asyncio.sleep(delay)
+            partial = {**partial, key: value}
+            yield partial
+        if error:
+            raise error
+
+    chain = MagicMock()
+    chain.astream = astream
+    return chain
+
+
+def parse_events(body):
+    """Split an SSE body into (event, data) pairs."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_astream_plan_sections_yields_each_section_once(mocker, mock_full_plan_output, test_user, test_all_form_responses, mock_zodiac_info):
+    """Sections come out in order, each exactly once, with their final values."""
+    plan = mock_full_plan_output.model_dump()
+    mocker.patch.object(ai_generation, "full_plan_stream_chain", make_stream_chain(plan))
+
+    sections = [s async for s in astream_plan_sections(test_user, mock_zodiac_info, test_all_form_responses)]
+
+    assert sections == list(plan.items())
+
+
+@pytest.mark.asyncio
+async def test_stream_premium_sends_sections_and_saves_plan(mocker, async_client, file_db_engine, generation_users, mock_summary_output, mock_full_plan_output):
+    """Each section is its own event and the final plan is persisted."""
+    plan = mock_full_plan_output.model_dump()
+    mocker.patch.object(ai_generation, "full_plan_stream_chain", make_stream_chain(plan))
+    summary_chain = MagicMock()
+    summary_chain.ainvoke = mocker.AsyncMock(return_value=mock_summary_output)
+    mocker.patch.object(ai_generation, "summary_chain", summary_chain)
+
+    user_id = generation_users[0]
+    async with async_client as client:
+        response = await client.post(f"/api/ai/{user_id}/generate-premium/stream")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse_events(response.text)
+    assert [e for e, _ in events] == ["section"] * len(plan) + ["done"]
+    assert [d["section"] for _, d in events[:-1]] == list(plan)
+    assert events[0][1]["value"] == plan["mantra"]
+
+    with Session(file_db_engine) as session:
+        result = session.exec(select(Result).where(Result.user_id == user_id)).first()
+        assert json.loads(result.full_plan) == plan
+        assert json.loads(result.basic_plan)["mantra"] == mock_summary_output.mantra
+
+
+@pytest.mark.asyncio
+async def test_stream_premium_reports_errors_without_saving(mocker, async_client, file_db_engine, generation_users, mock_summary_output, mock_full_plan_output):
+    """A failure mid-stream ends with an error event and nothing is stored."""
+    plan = mock_full_plan_output.model_dump()
+    mocker.patch.object(ai_generation, "full_plan_stream_chain", make_stream_chain(plan, error=RuntimeError("model down")))
+    summary_chain = MagicMock()
+    summary_chain.ainvoke = mocker.AsyncMock(return_value=mock_summary_output)
+    mocker.patch.object(ai_generation, "summary_chain", summary_chain)
+
+    user_id = generation_users[0]
+    async with async_client as client:
+        response = await client.post(f"/api/ai/{user_id}/generate-premium/stream")
+
+    events = parse_events(response.text)
+    assert events[-1][0] == "error"
+    assert "model down" in events[-1][1]["detail"]
+
+    with Session(file_db_engine) as session:
+        assert session.exec(select(Result).where(Result.user_id == user_id)).first() is None
+
+
+@pytest.mark.asyncio
+async def test_stream_premium_validates_before_streaming(async_client):
+    """Ineligible requests fail with a normal status code, not an event stream."""
+    async with async_client as client:
+        response = await client.post("/api/ai/00000000-0000-0000-0000-000000000000/generate-premium/stream")
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "User not found"
+
+
+@pytest.mark.asyncio
+async def test_stream_shares_an_in_flight_premium_generation(mocker, async_client, file_db_engine, generation_users, slow_llm_chains, mock_full_plan_output):
+    """A stream started during /generate-premium streams that plan instead of generating again."""
+    stream_chain = make_stream_chain(mock_full_plan_output.model_dump())
+    stream_chain.astream = MagicMock(wraps=stream_chain.astream)
+    mocker.patch.object(ai_generation, "full_plan_stream_chain", stream_chain)
+    user_id = generation_users[0]
+
+    async with async_client as client:
+        generation = asyncio.create_task(client.post(f"/api/ai/{user_id}/generate-premium"))
+        await asyncio.sleep(SLOW_LLM_DELAY / 5)
+        stream = await client.post(f"/api/ai/{user_id}/generate-premium/stream")
+        assert (await generation).status_code == 200
+
+    events = parse_events(stream.text)
+    assert [e for e, _ in events] == ["section"] * len(mock_full_plan_output.model_dump()) + ["done"]
+    stream_chain.astream.assert_not_called()
+
+    with Session(file_db_engine) as session:
+        result = session.exec(select(Result).where(Result.user_id == user_id)).first()
+        assert result.regeneration_count == 0
@@ -0,0 +1,102 @@
+import asyncio
+from datetime import datetime
+
+import httpx
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.models import FormResponse, User, pool_stats
+from app.models.database import TimedQueuePool, get_session, get_session_factory
+from main import app
+
+CONCURRENT_GENERATIONS = 20
+POOL_SIZE = 5
+
+
+@pytest.fixture
+def small_pool_engine(tmp_path):
+    """File database behind a pool of 5 connections with no overflow."""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        connect_args={"check_same_thread": False, "timeout": 30},
+        poolclass=TimedQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=2
+    )
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def pool_users(small_pool_engine):
+    user_ids = []
+    with Session(small_pool_engine) as session:
+        for i in range(CONCURRENT_GENERATIONS):
+            user = User(name=f"Pool User {i}", email=f"pool{i}@example.com", dob=datetime(1990, 1, 1), progress_state="5")
+            session.add(user)
+            session.flush()
+            for question_number in range(1, 6):
+                session.add(FormResponse(user_id=user.id, question_number=question_number, response=f"Answer {question_number}"))
+            user_ids.append(user.id)
+        session.commit()
+    return user_ids
+
+
+@pytest.fixture
+def blocking_summary_chain(mocker, mock_summary_output):
+    """Summary chain whose calls wait until the test releases them."""
+    started = []
+    all_started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def ainvoke(*args, **kwargs):
+        started.append(1)
+        if len(started) == CONCURRENT_GENERATIONS:
+            all_started.set()
+        await release.wait()
+        return mock_summary_output
+
+    chain = mocker.MagicMock()
+    chain.ainvoke = ainvoke
+    mocker.patch("app.routers.ai.ai_generation.summary_chain", chain)
+    return all_started, release
+
+
+@pytest.mark.asyncio
+async def test_slow_generations_leave_the_pool_free(small_pool_engine, pool_users, blocking_summary_chain):
+    all_started, release = blocking_summary_chain
+
+    def override_get_session():
+        with Session(small_pool_engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_session_factory] = lambda: (lambda: Session(small_pool_engine))
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            generations = [
+                asyncio.create_task(client.post(f"/api/ai/{user_id}/generate-basic"))
+                for user_id in pool_users
+            ]
+
+            # All 20 generations are waiting on the LLM at once...
+            await asyncio.wait_for(all_started.wait(), timeout=10)
+
+            # ...without holding any of the 5 connections
+            assert pool_stats(small_pool_engine)["checked_out"] == 0
+
+            # so other endpoints are served straight away
+            other = await asyncio.wait_for(client.get(f"/api/users/{pool_users[0]}"), timeout=1)
+            assert other.status_code == 200
+
+            release.set()
+            responses = await asyncio.gather(*generations)
+    finally:
+        app.dependency_overrides.clear()
+
+    assert [r.status_code for r in responses] == [200] * CONCURRENT_GENERATIONS
+    assert pool_stats(small_pool_engine)["timeouts"] == 0
@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+import pytest
+
+from app.routers.auth import STYTCH_COOKIE_NAME
+from tests.conftest import FAKE_STYTCH_EMAIL, FAKE_STYTCH_USER_ID
+
+
+STYTCH_DELAY = 1.0
+
+
+@pytest.mark.asyncio
+async def test_check_session_authenticates_against_stytch(async_client, fake_stytch_client):
+    async with async_client as client:
+        client.cookies.set(STYTCH_COOKIE_NAME, "valid-token")
+        first = await client.get("/auth/check-session")
+        second = await client.get("/auth/check-session")
+
+    assert first.json() == {"authenticated": True, "user_id": FAKE_STYTCH_USER_ID, "email": FAKE_STYTCH_EMAIL}
+    assert second.json() == first.json()
+    # The second check is served from the session cache
+    assert fake_stytch_client.requests == ["/v1/sessions/authenticate"]
+
+
+@pytest.mark.asyncio
+async def test_check_session_rejects_unknown_token(async_client, fake_stytch_client):
+    async with async_client as client:
+        client.cookies.set(STYTCH_COOKIE_NAME, "invalid-token")
+        response = await client.get("/auth/check-session")
+
+    assert response.json() == {"authenticated": False}
+
+
+@pytest.mark.asyncio
+async def test_login_or_create_user_sends_magic_link(async_client, fake_stytch_client):
+    async with async_client as client:
+        response = await client.post("/auth/login_or_create_user", json={"email": FAKE_STYTCH_EMAIL})
+
+    assert response.status_code == 200
+    assert response.json() == {"message": "Email sent! Check your inbox!"}
+    assert fake_stytch_client.requests == ["/v1/magic_links/email/login_or_create"]
+
+
+@pytest.mark.asyncio
+async def test_slow_stytch_does_not_block_other_requests(async_client, fake_stytch_client):
+    """Requests that don't need Stytch are served while an auth call is in flight."""
+    fake_stytch_client.delay = STYTCH_DELAY
+
+    async def timed(coro):
+        start = time.perf_counter()
+        await coro
+        return time.perf_counter() - start
+
+    async with async_client as client:
+        client.cookies.set(STYTCH_COOKIE_NAME, "valid-token")
+        auth_task = asyncio.create_task(timed(client.get("/auth/check-session")))
+        await asyncio.sleep(0.1)
+
+        other_latencies = [await timed(client.get("/robots.txt")) for _ in range(5)]
+        auth_latency = await auth_task
+
+    assert auth_latency >= STYTCH_DELAY
+    assert max(other_latencies) < STYTCH_DELAY / 4
+
+
+@pytest.mark.asyncio
+async def test_concurrent_logins_overlap(async_client, fake_stytch_client):
+    """Several users authenticating at once wait on Stytch together, not in turn."""
+    fake_stytch_client.delay = STYTCH_DELAY / 2
+
+    start = time.perf_counter()
+    async with async_client as client:
+        responses = await asyncio.gather(*[
+            client.get("/auth/check-session", headers={"Cookie": f"{STYTCH_COOKIE_NAME}=token-{i}"})
+            for i in range(5)
+        ])
+    elapsed = time.perf_counter() - start
+
+    assert all(r.json()["authenticated"] for r in responses)
+    assert elapsed < STYTCH_DELAY * 1.5
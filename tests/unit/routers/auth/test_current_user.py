@@ -0,0 +1,115 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.models import Result, User
+from app.routers.auth import STYTCH_COOKIE_NAME, find_user_with_results
+from tests.conftest import FAKE_STYTCH_EMAIL
+
+
+@pytest.fixture
+def stytch_db_user(file_db_engine):
+    """Database user matching the fake Stytch user's email."""
+    with Session(file_db_engine) as session:
+        user = User(name="Fake User", email=FAKE_STYTCH_EMAIL, dob=datetime(1990, 1, 1), progress_state="3")
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        return user
+
+
+@pytest.fixture
+def other_db_user(file_db_engine):
+    with Session(file_db_engine) as session:
+        user = User(name="Other User", email="other@example.com", dob=datetime(1990, 1, 1))
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        return user
+
+
+@pytest.fixture
+def statements(file_db_engine, async_db_engine):
+    """SQL statements run against the file database during the test, sync or async."""
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    engines = [file_db_engine, async_db_engine.sync_engine]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def test_find_user_with_results(file_db_engine, stytch_db_user, statements):
+    with Session(file_db_engine) as session:
+        assert find_user_with_results(session, FAKE_STYTCH_EMAIL) == (stytch_db_user, False)
+
+        session.add(Result(user_id=stytch_db_user.id, basic_plan="{}", full_plan=""))
+        session.commit()
+        statements.clear()
+
+        user, has_results = find_user_with_results(session, FAKE_STYTCH_EMAIL)
+        assert user.id == stytch_db_user.id
+        assert has_results is True
+        assert len(statements) == 1
+
+        assert find_user_with_results(session, "nobody@example.com") == (None, False)
+
+
+@pytest.mark.asyncio
+async def test_home_redirects_with_a_single_lookup(async_client, fake_stytch_client, stytch_db_user, statements):
+    async with async_client as client:
+        client.cookies.set(STYTCH_COOKIE_NAME, "valid-token")
+        response = await client.get("/", follow_redirects=False)
+
+    assert response.status_code == 303
+    assert response.headers["location"] == f"/form/{stytch_db_user.id}"
+    assert fake_stytch_client.requests == ["/v1/sessions/authenticate"]
+    assert len([s for s in statements if s.lstrip().upper().startswith("SELECT")]) == 1
+
+
+@pytest.mark.asyncio
+async def test_unauthenticated_home_renders(async_client):
+    async with async_client as client:
+        response = await client.get("/", follow_redirects=False)
+
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_results_for_another_user_redirects_to_own_page(async_client, fake_stytch_client, stytch_db_user, other_db_user):
+    async with async_client as client:
+        client.cookies.set(STYTCH_COOKIE_NAME, "valid-token")
+        response = await client.get(f"/results/{other_db_user.id}", follow_redirects=False)
+
+    assert response.status_code == 303
+    assert response.headers["location"] == f"/form/{stytch_db_user.id}"
+
+
+@pytest.mark.asyncio
+async def test_results_page_requires_login(async_client, other_db_user):
+    async with async_client as client:
+        response = await client.get(f"/results/{other_db_user.id}", follow_redirects=False)
+
+    assert response.status_code == 303
+    assert response.headers["location"] == f"/login?redirect=/results/{other_db_user.id}"
+
+
+@pytest.mark.parametrize("page", ["form", "account"])
+@pytest.mark.asyncio
+async def test_user_pages_read_through_the_async_session(async_client, fake_stytch_client, file_db_engine, stytch_db_user, page):
+    sync_executed = []
+    event.listen(file_db_engine, "before_cursor_execute", lambda *args: sync_executed.append(args[2]))
+
+    async with async_client as client:
+        client.cookies.set(STYTCH_COOKIE_NAME, "valid-token")
+        response = await client.get(f"/{page}/{stytch_db_user.id}", follow_redirects=False)
+
+    assert response.status_code == 200
+    assert sync_executed == []
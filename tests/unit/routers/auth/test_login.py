@@ -15,10 +15,10 @@ from main import app
 def test_login_or_create_user_success(client, mock_stytch_client):
     """Test successful login or user creation."""
     # Mock the Stytch client response
-    mock_stytch_client.magic_links.email.login_or_create.return_value = {
-        "status_code": 200,
-        "request_id": "request-id-123"
-    }
+    mock_stytch_client.magic_links.email.login_or_create_async.return_value = MagicMock(
+        status_code=200,
+        request_id="request-id-123"
+    )
     
     # Make the request
     response = client.post(
@@ -26,14 +26,16 @@ def test_login_or_create_user_success(client, mock_stytch_client):
         json={"email": "test@example.com"}
     )
     
-    # Check the response - the actual implementation returns 400 due to URL validation
-    # This is expected in the test environment
-    assert response.status_code == 400
-    assert "error_message" in response.json()
-    assert "magic_link_url" in response.json()["error_message"]
+    # Check the response
+    assert response.status_code == 200
+    assert response.json() == {"message": "Email sent! Check your inbox!"}
     
-    # In the test environment, the Stytch client might not be called due to validation errors
-    # So we don't assert that it was called
+    # The magic link points back at the authenticate endpoint
+    mock_stytch_client.magic_links.email.login_or_create_async.assert_awaited_once_with(
+        email="test@example.com",
+        login_magic_link_url="http://testserver/auth/authenticate",
+        signup_magic_link_url="http://testserver/auth/authenticate"
+    )
 
 
 def test_login_or_create_user_stytch_error(client, mock_stytch_client):
@@ -48,7 +50,7 @@ def test_login_or_create_user_stytch_error(client, mock_stytch_client):
         request_id="request-id-error"
     )
     
-    mock_stytch_client.magic_links.email.login_or_create.side_effect = mock_error
+    mock_stytch_client.magic_links.email.login_or_create_async.side_effect = mock_error
     
     # Make the request
     response = client.post(
@@ -81,29 +83,29 @@ def test_authenticate_success(client, mock_stytch_client, test_db):
     mock_user.user_id = str(user.id)
     mock_user.emails = [MagicMock(email="auth_test@example.com")]
     
-    mock_stytch_client.magic_links.authenticate.return_value = MagicMock(
+    # The magic link response carries the session JWT too
+    mock_stytch_client.magic_links.authenticate_async.return_value = MagicMock(
         session_token="test-session-token",
+        session_jwt="test-session-jwt",
         user=mock_user
     )
     
-    # Mock the session JWT exchange
-    mock_stytch_client.sessions.exchange_session_token.return_value = MagicMock(
-        session_jwt="test-session-jwt"
-    )
-    
     # Make the request
     response = client.get(
         "/auth/authenticate",
         params={"token": "test-magic-link-token"}
     )
     
-    # Check the response - the actual implementation returns 400 due to token validation
-    # This is expected in the test environment
-    assert response.status_code == 400
-    assert "application/json" in response.headers["content-type"]
-    
-    # In the test environment, the Stytch client might not be called due to validation errors
-    # So we don't assert that it was called
+    # Check the response: the page stores the session token and sends the
+    # user on to their form
+    assert response.status_code == 200
+    assert "text/html" in response.headers["content-type"]
+    assert "test-session-token" in response.text
+    assert f"/form/{user.id}" in response.text
+    mock_stytch_client.magic_links.authenticate_async.assert_awaited_once_with(
+        token="test-magic-link-token",
+        session_duration_minutes=43200
+    )
     
     # Clean up
     test_db.delete(user)
@@ -121,18 +123,18 @@ def test_authenticate_already_used_token(client, mock_stytch_client):
         error_message="Magic link already used or expired",
         request_id="request-id-error"
     )
-    mock_stytch_client.magic_links.authenticate.side_effect = mock_error
+    mock_stytch_client.magic_links.authenticate_async.side_effect = mock_error
     
     # Make the request
     response = client.get(
         "/auth/authenticate",
-        params={"token": "used-magic-link-token"}
+        params={"token": "used-magic-link-token"},
+        follow_redirects=False
     )
     
-    # Check the response - the actual implementation returns 400 due to token validation
-    # This is expected in the test environment
-    assert response.status_code == 400
-    assert "error" in response.json()
+    # Check the response - the user is sent back to the form to request a new link
+    assert response.status_code == 303
+    assert response.headers["location"].startswith("/form?error=Magic+link+expired")
 
 
 def test_authenticate_other_error(client, mock_stytch_client):
@@ -146,7 +148,7 @@ def test_authenticate_other_error(client, mock_stytch_client):
         error_message="Invalid token format",
         request_id="request-id-error"
     )
-    mock_stytch_client.magic_links.authenticate.side_effect = mock_error
+    mock_stytch_client.magic_links.authenticate_async.side_effect = mock_error
     
     # Make the request
     response = client.get(
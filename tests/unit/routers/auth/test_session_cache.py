@@ -0,0 +1,111 @@
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from app.auth_cache import SessionValidator
+from clients import get_stytch_client
+
+
+@pytest.fixture(scope="module")
+def signing_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def stytch_user():
+    user = MagicMock()
+    user.user_id = f"user-test-{uuid.uuid4()}"
+    user.emails = [MagicMock(email="test@example.com")]
+    return user
+
+
+@pytest.fixture
+def validator(mocker, signing_key, stytch_user):
+    """Validator over a real (offline) Stytch client with a local JWKS and a mocked remote call."""
+    client = get_stytch_client()
+    validator = SessionValidator(client)
+
+    jwk = jwt.PyJWK.from_dict({**jwt.algorithms.RSAAlgorithm.to_jwk(signing_key.public_key(), as_dict=True), "alg": "RS256"})
+    mocker.patch.object(validator.jwks_client, "get_signing_key_from_jwt", return_value=jwk)
+
+    session = MagicMock(expires_at=datetime.now(timezone.utc) + timedelta(days=30))
+    mocker.patch.object(client.sessions, "authenticate_async", mocker.AsyncMock(return_value=MagicMock(user=stytch_user, session=session)))
+    return validator
+
+
+def make_jwt(validator, signing_key, user_id, expires_in=300):
+    now = int(time.time())
+    claims = {
+        "sub": user_id,
+        "aud": [validator.project_id],
+        "iss": f"stytch.com/{validator.project_id}",
+        "iat": now,
+        "nbf": now,
+        "exp": now + expires_in,
+        "https://stytch.com/session": {"id": "session-test"},
+    }
+    return jwt.encode(claims, signing_key, algorithm="RS256")
+
+
+@pytest.mark.asyncio
+async def test_opaque_token_is_validated_remotely_once(validator, stytch_user):
+    assert await validator.authenticate("opaque-token") is stytch_user
+    assert await validator.authenticate("opaque-token") is stytch_user
+
+    assert validator.remote_calls == 1
+    assert validator.stats()["sessions"]["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_forgotten_token_goes_back_to_stytch(validator):
+    await validator.authenticate("opaque-token")
+    validator.forget("opaque-token")
+    await validator.authenticate("opaque-token")
+
+    assert validator.remote_calls == 2
+
+
+@pytest.mark.asyncio
+async def test_jwt_is_verified_locally_once_the_user_is_known(validator, signing_key, stytch_user):
+    token = make_jwt(validator, signing_key, stytch_user.user_id)
+
+    # First sight of the user needs Stytch for the full user record
+    assert await validator.authenticate(token) is stytch_user
+    assert await validator.authenticate(token) is stytch_user
+    assert await validator.authenticate(make_jwt(validator, signing_key, stytch_user.user_id)) is stytch_user
+
+    assert validator.remote_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_jwt_near_expiry_is_checked_remotely(validator, signing_key, stytch_user):
+    await validator.authenticate(make_jwt(validator, signing_key, stytch_user.user_id))
+
+    await validator.authenticate(make_jwt(validator, signing_key, stytch_user.user_id, expires_in=5))
+
+    assert validator.remote_calls == 2
+
+
+@pytest.mark.asyncio
+async def test_jwt_with_bad_signature_is_checked_remotely(validator, signing_key, stytch_user):
+    await validator.authenticate(make_jwt(validator, signing_key, stytch_user.user_id))
+
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    await validator.authenticate(make_jwt(validator, other_key, stytch_user.user_id))
+
+    assert validator.remote_calls == 2
+
+
+@pytest.mark.asyncio
+async def test_session_is_not_cached_past_its_expiry(validator, stytch_user):
+    resp = MagicMock(user=stytch_user, session=MagicMock(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+    validator.remember(resp, "expired-token")
+
+    await validator.authenticate("expired-token")
+
+    assert validator.remote_calls == 1
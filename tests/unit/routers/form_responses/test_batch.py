@@ -0,0 +1,84 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.models import FormResponse, User
+
+
+@pytest.fixture
+def batch_user(file_db_engine):
+    with Session(file_db_engine) as session:
+        user = User(name="Test User", email="test@example.com", dob=datetime(1990, 1, 1), progress_state="2")
+        session.add(user)
+        session.flush()
+        session.add(FormResponse(user_id=user.id, question_number=2, response="Old answer"))
+        session.commit()
+        return user.id
+
+
+@pytest.fixture
+def commits(file_db_engine, async_db_engine):
+    """Number of commits against the file database during the test, sync or async."""
+    count = []
+    for engine in (file_db_engine, async_db_engine.sync_engine):
+        event.listen(engine, "commit", lambda conn: count.append(1))
+    yield count
+
+
+@pytest.mark.asyncio
+async def test_batch_saves_answers_in_one_commit(async_client, file_db_engine, batch_user, commits):
+    payload = {
+        "user_id": str(batch_user),
+        "responses": [
+            {"question_number": 2, "response": "New answer"},
+            {"question_number": 3, "response": "Third"},
+            {"question_number": 4, "response": "Draft"},
+            {"question_number": 4, "response": "Fourth"}
+        ]
+    }
+
+    async with async_client as client:
+        response = await client.post("/api/form-responses/batch", json=payload)
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "success": True,
+        "saved_count": 3,
+        "results": {"2": "updated", "3": "created", "4": "created"}
+    }
+    assert len(commits) == 1
+
+    with Session(file_db_engine) as session:
+        saved = session.exec(select(FormResponse).where(FormResponse.user_id == batch_user)).all()
+        # The last answer to a question wins
+        assert {r.question_number: r.response for r in saved} == {2: "New answer", 3: "Third", 4: "Fourth"}
+        assert session.get(User, batch_user).progress_state == "4"
+
+
+@pytest.mark.asyncio
+async def test_batch_is_all_or_nothing(async_client, file_db_engine, batch_user):
+    payload = {
+        "user_id": str(batch_user),
+        "responses": [
+            {"question_number": 3, "response": "Third"},
+            {"question_number": 26, "response": "Out of range"}
+        ]
+    }
+
+    async with async_client as client:
+        response = await client.post("/api/form-responses/batch", json=payload)
+        missing = await client.post("/api/form-responses/batch", json={
+            "user_id": str(uuid.uuid4()),
+            "responses": [{"question_number": 1, "response": "Answer"}]
+        })
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid question numbers: 26"
+    assert missing.status_code == 404
+
+    with Session(file_db_engine) as session:
+        saved = session.exec(select(FormResponse).where(FormResponse.user_id == batch_user)).all()
+        assert [r.question_number for r in saved] == [2]
@@ -0,0 +1,86 @@
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.models import FormResponse, User
+
+
+@pytest.fixture
+def transfer_user(file_db_engine):
+    """User who already answered question 1 before signing up."""
+    with Session(file_db_engine) as session:
+        user = User(name="Test User", email="test@example.com", dob=datetime(1990, 1, 1), progress_state="1")
+        session.add(user)
+        session.flush()
+        session.add(FormResponse(user_id=user.id, question_number=1, response="Old answer"))
+        session.commit()
+        return user.id
+
+
+@pytest.fixture
+def statements(file_db_engine, async_db_engine):
+    """SQL statements run against the file database during the test, sync or async."""
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    engines = [file_db_engine, async_db_engine.sync_engine]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def transfer_url(user_id):
+    return f"/api/form-responses/transfer-anonymous?user_id={user_id}&anonymous_session_id=anon-123"
+
+
+@pytest.mark.asyncio
+async def test_transfer_writes_all_answers_at_once(async_client, file_db_engine, transfer_user, statements):
+    answers = {str(i): f"Answer {i}" for i in range(1, 26)}
+
+    async with async_client as client:
+        response = await client.post(transfer_url(transfer_user), json={"responses": answers})
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["transferred_count"] == 25
+    assert data["results"]["1"] == "updated"
+    assert all(data["results"][str(i)] == "created" for i in range(2, 26))
+
+    # One progress update and one multi-row upsert, no per-question SELECTs
+    writes = [s for s in statements if s.lstrip().upper().startswith(("UPDATE", "INSERT"))]
+    assert len(writes) == 2
+    assert not any("FROM form_responses" in s and s.lstrip().upper().startswith("SELECT") for s in statements)
+
+    with Session(file_db_engine) as session:
+        saved = session.exec(select(FormResponse).where(FormResponse.user_id == transfer_user)).all()
+        assert {r.question_number: r.response for r in saved} == {i: f"Answer {i}" for i in range(1, 26)}
+        assert session.get(User, transfer_user).progress_state == "25"
+
+
+@pytest.mark.asyncio
+async def test_transfer_rejects_invalid_questions(async_client, file_db_engine, transfer_user):
+    async with async_client as client:
+        response = await client.post(transfer_url(transfer_user), json={"responses": {"2": "Fine", "abc": "Bad", "40": "Bad"}})
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid question numbers: abc, 40"
+
+    # Nothing from the payload was written
+    with Session(file_db_engine) as session:
+        saved = session.exec(select(FormResponse).where(FormResponse.user_id == transfer_user)).all()
+        assert [r.question_number for r in saved] == [1]
+
+
+@pytest.mark.asyncio
+async def test_transfer_unknown_user(async_client):
+    async with async_client as client:
+        response = await client.post(transfer_url(uuid.uuid4()), json={"responses": {"1": "Answer"}})
+
+    assert response.status_code == 404
@@ -0,0 +1,105 @@
+import uuid
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+from sqlmodel import Session, select
+
+from app.models import FormResponse, User
+from app.routers.form_responses import upsert_form_response
+
+
+@pytest.fixture
+def statements(test_db_engine):
+    """SQL statements run against the test database during the test."""
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    event.listen(test_db_engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(test_db_engine, "before_cursor_execute", record)
+
+
+def test_upsert_inserts_then_updates(test_db, test_user_in_db, statements):
+    saved = upsert_form_response(test_db, test_user_in_db.id, 7, "First answer")
+    test_db.commit()
+    assert saved.question_number == 7
+    assert saved.response == "First answer"
+
+    updated = upsert_form_response(test_db, test_user_in_db.id, 7, "Second answer")
+    test_db.commit()
+    assert updated.id == saved.id
+    assert updated.response == "Second answer"
+
+    rows = test_db.exec(select(FormResponse).where(FormResponse.user_id == test_user_in_db.id)).all()
+    assert [(r.question_number, r.response) for r in rows] == [(7, "Second answer")]
+
+    # No SELECT before writing, just the progress update and the upsert
+    assert not any(s.lstrip().upper().startswith("SELECT") for s in statements[:2])
+
+    for row in rows:
+        test_db.delete(row)
+    test_db.commit()
+
+
+def test_upsert_only_raises_progress(test_db, test_user_in_db):
+    # test_user starts at progress_state "5"
+    upsert_form_response(test_db, test_user_in_db.id, 3, "Earlier answer")
+    test_db.commit()
+    test_db.refresh(test_user_in_db)
+    assert test_user_in_db.progress_state == "5"
+
+    upsert_form_response(test_db, test_user_in_db.id, 12, "Later answer")
+    test_db.commit()
+    test_db.refresh(test_user_in_db)
+    assert test_user_in_db.progress_state == "12"
+
+    for row in test_db.exec(select(FormResponse).where(FormResponse.user_id == test_user_in_db.id)).all():
+        test_db.delete(row)
+    test_db.commit()
+
+
+def test_upsert_unknown_user(test_db):
+    assert upsert_form_response(test_db, uuid.uuid4(), 1, "Answer") is None
+    assert test_db.exec(select(FormResponse)).all() == []
+
+
+def test_postgres_upsert_is_a_single_statement():
+    session = MagicMock()
+    session.get_bind.return_value.dialect.name = "postgresql"
+    session.exec.return_value.all.return_value = []
+
+    assert upsert_form_response(session, uuid.uuid4(), 3, "Answer") is None
+
+    assert session.exec.call_count == 1
+    sql = str(session.exec.call_args.args[0].compile(dialect=postgresql.dialect()))
+    assert sql.startswith("WITH bump AS")
+    assert "greatest(CAST(users.progress_state AS INTEGER)" in sql
+    assert "bump ON CONFLICT (user_id, question_number) DO UPDATE SET response = excluded.response" in sql
+
+
+@pytest.mark.asyncio
+async def test_save_endpoint(async_client, file_db_engine):
+    with Session(file_db_engine) as session:
+        user = User(name="Test User", email="test@example.com", dob=datetime(1990, 1, 1))
+        session.add(user)
+        session.commit()
+        user_id = str(user.id)
+
+    async with async_client as client:
+        first = await client.post("/api/form-responses/", json={"user_id": user_id, "question_number": 2, "response": "Hello"})
+        second = await client.post("/api/form-responses/", json={"user_id": user_id, "question_number": 2, "response": "Hello again"})
+        missing = await client.post("/api/form-responses/", json={"user_id": str(uuid.uuid4()), "question_number": 2, "response": "Hello"})
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert second.json()["id"] == first.json()["id"]
+    assert second.json()["response"] == "Hello again"
+    assert missing.status_code == 404
+
+    with Session(file_db_engine) as session:
+        assert session.get(User, uuid.UUID(user_id)).progress_state == "2"
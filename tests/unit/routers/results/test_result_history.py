@@ -0,0 +1,64 @@
+import json
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models import Result, ResultHistory, User
+from app.plan_codec import decode_plan
+from app.routers.ai.ai_storage import save_basic_plan, save_full_plan
+
+
+def plan(purpose):
+    return json.dumps({"purpose": purpose, "mantra": f"{purpose} mantra", "notes": "detail " * 100})
+
+
+@pytest.fixture
+def history_user(file_db_engine):
+    """Pursuit user whose plans have been generated twice."""
+    with Session(file_db_engine) as session:
+        user = User(name="Test User", email="test@example.com", dob=datetime(1990, 1, 1), payment_tier="pursuit")
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+
+        save_basic_plan(session, user, plan("First"))
+        save_full_plan(session, user.id, plan("First"), plan("First full"))
+        save_basic_plan(session, user, plan("Second"))
+        save_full_plan(session, user.id, plan("Second"), plan("Second full"))
+        return user.id
+
+
+def test_regeneration_archives_compressed_plans(file_db_engine, history_user):
+    with Session(file_db_engine) as session:
+        entries = session.exec(select(ResultHistory).where(ResultHistory.user_id == history_user)).all()
+        result = session.exec(select(Result).where(Result.user_id == history_user)).one()
+
+    # The first full plan replaced an empty one, which isn't archived
+    assert sorted(entry.plan_field for entry in entries) == ["basic_plan", "full_plan"]
+    for entry in entries:
+        assert len(entry.payload) < len(plan("First full"))
+        assert json.loads(decode_plan(entry.payload))["purpose"].startswith("First")
+    assert json.loads(result.full_plan)["purpose"] == "Second full"
+
+
+@pytest.mark.asyncio
+async def test_history_endpoint_decodes_plans(async_client, file_db_engine, history_user):
+    async with async_client as client:
+        response = await client.get(f"/api/results/{history_user}/history")
+
+        with Session(file_db_engine) as session:
+            user = session.get(User, history_user)
+            user.payment_tier = "basic"
+            session.add(user)
+            session.commit()
+        basic_only = await client.get(f"/api/results/{history_user}/history")
+
+    assert response.status_code == 200
+    assert {(entry["plan_field"], entry["plan"]["purpose"]) for entry in response.json()["history"]} == {
+        ("basic_plan", "First"),
+        ("full_plan", "First full")
+    }
+
+    # Full plans need premium access
+    assert [entry["plan_field"] for entry in basic_only.json()["history"]] == ["basic_plan"]
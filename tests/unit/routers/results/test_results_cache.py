@@ -0,0 +1,143 @@
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from app.models import Result, User
+from app.results_cache import etag_matches, results_cache
+from app.routers.ai.ai_storage import save_basic_plan
+
+
+@pytest.fixture
+def results_user(file_db_engine):
+    """Basic-tier user with a generated basic plan."""
+    with Session(file_db_engine) as session:
+        user = User(name="Test User", email="test@example.com", dob=datetime(1990, 1, 1), payment_tier="basic")
+        session.add(user)
+        session.flush()
+        session.add(Result(user_id=user.id, basic_plan=json.dumps({"purpose": "First purpose", "mantra": "First mantra"}), full_plan=""))
+        session.commit()
+        return user.id
+
+
+@pytest.fixture
+def plan_reads(async_db_engine):
+    """Statements during the test that read the stored plans."""
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        if "basic_plan" in statement:
+            executed.append(statement)
+
+    event.listen(async_db_engine.sync_engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(async_db_engine.sync_engine, "before_cursor_execute", record)
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"xyz", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"xyz"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+@pytest.mark.asyncio
+async def test_summary_is_cached_and_revalidated(async_client, results_user, plan_reads):
+    url = f"/api/results/{results_user}/summary"
+
+    async with async_client as client:
+        first = await client.get(url)
+        second = await client.get(url)
+        not_modified = await client.get(url, headers={"If-None-Match": first.headers["etag"]})
+
+    assert first.status_code == 200
+    assert first.json()["summary"] == "First purpose"
+    assert first.headers["cache-control"] == "private, no-cache"
+    assert second.json() == first.json()
+    assert second.headers["etag"] == first.headers["etag"]
+
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+    # Only the first request loaded and parsed the plans
+    assert len(plan_reads) == 1
+    assert results_cache.get((results_user, "summary")) is not None
+
+
+@pytest.mark.asyncio
+async def test_regeneration_and_upgrade_change_the_etag(async_client, file_db_engine, results_user):
+    url = f"/api/results/{results_user}/summary"
+
+    async with async_client as client:
+        original = await client.get(url)
+
+        with Session(file_db_engine) as session:
+            save_basic_plan(session, session.get(User, results_user), json.dumps({"purpose": "New purpose", "mantra": "New mantra"}))
+        regenerated = await client.get(url, headers={"If-None-Match": original.headers["etag"]})
+
+        with Session(file_db_engine) as session:
+            user = session.get(User, results_user)
+            user.payment_tier = "pursuit"
+            session.add(user)
+            result = session.exec(select(Result).where(Result.user_id == results_user)).one()
+            result.full_plan = json.dumps({"purpose": "Premium purpose", "mantra": "Premium mantra"})
+            session.add(result)
+            session.commit()
+        upgraded = await client.get(url, headers={"If-None-Match": regenerated.headers["etag"]})
+
+    assert regenerated.status_code == 200
+    assert regenerated.json()["summary"] == "New purpose"
+    assert regenerated.headers["etag"] != original.headers["etag"]
+
+    # A tier change is a new version even though the result wasn't regenerated
+    assert upgraded.status_code == 200
+    assert upgraded.json()["summary"] == "Premium purpose"
+    assert upgraded.json()["payment_tier"] == "pursuit"
+
+
+@pytest.mark.asyncio
+async def test_full_results_still_require_premium(async_client, results_user):
+    async with async_client as client:
+        response = await client.get(f"/api/results/{results_user}/full", headers={"If-None-Match": "*"})
+
+    assert response.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_results_project_plan_keys(async_client, file_db_engine, results_user, plan_reads):
+    full_plan = {
+        "purpose": "Premium purpose",
+        "mantra": "Premium mantra",
+        "next_steps": {"today": ["Start"]},
+        "daily_plan": {"weekdays": {}},
+        "obstacles": [{"obstacle": "Time"}],
+        "notes": "x" * 10000
+    }
+    with Session(file_db_engine) as session:
+        user = session.get(User, results_user)
+        user.payment_tier = "pursuit"
+        session.add(user)
+        result = session.exec(select(Result).where(Result.user_id == results_user)).one()
+        result.full_plan = json.dumps(full_plan)
+        session.add(result)
+        session.commit()
+
+    async with async_client as client:
+        summary = await client.get(f"/api/results/{results_user}/summary")
+        full = await client.get(f"/api/results/{results_user}/full")
+
+    assert summary.json()["summary"] == "Premium purpose"
+    assert summary.json()["full_plan"] == {"purpose": "Premium purpose", "mantra": "Premium mantra"}
+    assert summary.json()["basic_plan"] == {"purpose": "First purpose", "mantra": "First mantra"}
+    assert len(summary.content) < 1000
+
+    assert full.json()["full_plan"] == {key: full_plan[key] for key in ("purpose", "mantra", "next_steps", "daily_plan", "obstacles")}
+
+    # Plans are read key by key, never as whole columns
+    assert len(plan_reads) == 2
+    for statement in plan_reads:
+        for column in ("results.basic_plan", "results.full_plan"):
+            assert statement.count(column) == statement.upper().count(f"JSON_EXTRACT({column.upper()}")
@@ -0,0 +1,54 @@
+"""Query budgets for the hot read endpoints, so redundant queries don't creep back in."""
+
+import json
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session
+
+from app.models import FormResponse, Result, User
+from app.results_cache import results_cache
+
+
+@pytest.fixture
+def user_with_results(file_db_engine):
+    """User with form responses and generated plans."""
+    results_cache.clear()
+    with Session(file_db_engine) as session:
+        user = User(name="Test User", email="test@example.com", dob=datetime(1990, 1, 1),
+                    payment_tier="pursuit", progress_state="25")
+        session.add(user)
+        session.flush()
+        for question in range(1, 6):
+            session.add(FormResponse(user_id=user.id, question_number=question, response=f"Answer {question}"))
+        plan = json.dumps({"purpose": "Purpose", "mantra": "Mantra"})
+        session.add(Result(user_id=user.id, basic_plan=plan, full_plan=plan))
+        session.commit()
+        return user.id
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path, max_queries", [
+    ("/api/results/{user_id}/summary", 2),
+    ("/api/results/{user_id}/full", 2),
+    ("/api/results/{user_id}/check-results", 1),
+    ("/api/users/find-by-email?email=test@example.com", 1),
+])
+async def test_read_endpoint_query_budget(async_client, query_budget, user_with_results, path, max_queries):
+    async with async_client as client:
+        with query_budget(max_queries):
+            response = await client.get(path.format(user_id=user_with_results))
+
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_cached_summary_only_checks_the_version(async_client, query_budget, user_with_results):
+    url = f"/api/results/{user_with_results}/summary"
+
+    async with async_client as client:
+        await client.get(url)
+        with query_budget(1):
+            response = await client.get(url)
+
+    assert response.status_code == 200
@@ -0,0 +1,86 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.models import FormResponse, User
+from app.routers.users import get_user_summary
+
+
+@pytest.fixture
+def statements(test_db_engine):
+    """SQL statements run against the test database during the test."""
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    event.listen(test_db_engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(test_db_engine, "before_cursor_execute", record)
+
+
+def test_summary_without_responses_or_results(test_db, test_user_in_db, statements):
+    summary = get_user_summary(test_db, test_user_in_db.email)
+
+    assert summary == {
+        "found": True,
+        "id": str(test_user_in_db.id),
+        "name": test_user_in_db.name,
+        "email": test_user_in_db.email,
+        "dob": test_user_in_db.dob.strftime("%Y-%m-%d"),
+        "progress_state": test_user_in_db.progress_state,
+        "payment_tier": test_user_in_db.payment_tier,
+        "has_responses": False,
+        "response_count": 0,
+        "has_results": False
+    }
+    assert len(statements) == 1
+
+
+def test_summary_counts_responses_in_one_query(test_db, test_all_form_responses_in_db, test_full_result_in_db, statements):
+    test_full_result_in_db.last_generated_at = datetime(2024, 5, 1, 12, 0)
+    test_full_result_in_db.regeneration_count = 2
+    test_db.add(test_full_result_in_db)
+    test_db.commit()
+    user_id = test_full_result_in_db.user_id
+    statements.clear()
+
+    summary = get_user_summary(test_db, "test@example.com")
+
+    assert summary["id"] == str(user_id)
+    assert summary["has_responses"] is True
+    assert summary["response_count"] == 25
+    assert summary["has_results"] is True
+    assert summary["last_generated_at"] == "2024-05-01T12:00:00"
+    assert summary["regeneration_count"] == 2
+    # One round trip, and no FormResponse rows selected
+    assert len(statements) == 1
+    assert "count(" in statements[0].lower()
+
+
+def test_summary_unknown_email(test_db):
+    assert get_user_summary(test_db, "nobody@example.com") is None
+
+
+@pytest.mark.asyncio
+async def test_get_and_post_return_the_same_summary(async_client, file_db_engine):
+    with Session(file_db_engine) as session:
+        user = User(name="Test User", email="test@example.com", dob=datetime(1990, 1, 1))
+        session.add(user)
+        session.flush()
+        for i in range(1, 6):
+            session.add(FormResponse(user_id=user.id, question_number=i, response=f"Test response {i}"))
+        session.commit()
+
+    async with async_client as client:
+        get_response = await client.get("/api/users/find-by-email", params={"email": "test@example.com"})
+        post_response = await client.post("/api/users/find-by-email", json={"email": "test@example.com"})
+        missing = await client.post("/api/users/find-by-email", json={"email": "nobody@example.com"})
+
+    assert get_response.status_code == 200
+    assert post_response.status_code == 200
+    assert get_response.json() == post_response.json()
+    assert get_response.json()["response_count"] == 5
+    assert missing.json() == {"found": False}
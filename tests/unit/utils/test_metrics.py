@@ -0,0 +1,107 @@
+import json
+import uuid
+from datetime import datetime
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, LLMResult
+from sqlmodel import Session
+
+from app import metrics
+from app.metrics import Counter, Histogram, LLMMetricsHandler, Registry, instrument_engine, track_external_call
+from app.models import Result, User
+
+
+@pytest.fixture
+def results_user(file_db_engine):
+    """Basic-tier user with a generated basic plan."""
+    with Session(file_db_engine) as session:
+        user = User(name="Test User", email="test@example.com", dob=datetime(1990, 1, 1), payment_tier="basic")
+        session.add(user)
+        session.flush()
+        session.add(Result(user_id=user.id, basic_plan=json.dumps({"purpose": "Purpose", "mantra": "Mantra"}), full_plan=""))
+        session.commit()
+        return user.id
+
+
+def test_render_prometheus_text_format():
+    registry = Registry()
+    requests = Counter("test_requests_total", "Requests.", ("route",), registry=registry)
+    latency = Histogram("test_latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.0), registry=registry)
+
+    requests.inc(route='/a"b')
+    latency.observe(0.05, route="/a")
+    latency.observe(0.5, route="/a")
+    latency.observe(5, route="/a")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE test_requests_total counter" in lines
+    assert 'test_requests_total{route="/a\\"b"} 1.0' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="1.0"} 2' in lines
+    assert 'test_latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'test_latency_seconds_count{route="/a"} 3' in lines
+    assert latency.get(route="/a") == (3, 5.55)
+
+    with pytest.raises(ValueError):
+        requests.inc(path="/a")
+
+
+@pytest.mark.asyncio
+async def test_requests_are_recorded_by_route_with_db_queries(async_client, file_db_engine, async_db_engine, results_user, internal_headers):
+    instrument_engine(file_db_engine)
+    instrument_engine(async_db_engine)
+    route = "/api/results/{user_id}/summary"
+    requests_before = metrics.HTTP_REQUESTS.get(method="GET", route=route, status=200)
+    queries_before = metrics.HTTP_REQUEST_DB_QUERIES.get(method="GET", route=route)
+
+    async with async_client as client:
+        response = await client.get(f"/api/results/{results_user}/summary")
+        missing = await client.get(f"/no-such-page/{uuid.uuid4()}")
+        scrape = await client.get("/metrics", headers=internal_headers)
+
+    assert response.status_code == 200
+    assert missing.status_code == 404
+    assert metrics.HTTP_REQUESTS.get(method="GET", route=route, status=200) == requests_before + 1
+    count, queries = metrics.HTTP_REQUEST_DB_QUERIES.get(method="GET", route=route)
+    assert count == queries_before[0] + 1
+    assert queries - queries_before[1] >= 2
+    assert metrics.HTTP_REQUESTS.get(method="GET", route="unmatched", status=404) >= 1
+    assert metrics.HTTP_IN_FLIGHT.get(method="GET") == 0
+
+    assert scrape.status_code == 200
+    assert scrape.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert f'http_request_duration_seconds_count{{method="GET",route="{route}"}}' in scrape.text
+    assert 'db_query_duration_seconds_count{operation="SELECT"}' in scrape.text
+    assert 'http_requests_in_flight{method="GET"} 1.0' in scrape.text  # the scrape itself
+
+
+def test_llm_handler_records_latency_and_tokens():
+    handler = LLMMetricsHandler("test-model")
+    run_id = uuid.uuid4()
+    tokens_before = metrics.LLM_TOKENS.get(model="test-model", kind="completion")
+
+    handler.on_chat_model_start({}, [], run_id=run_id)
+    handler.on_llm_end(LLMResult(generations=[[]], llm_output={"token_usage": {"prompt_tokens": 100, "completion_tokens": 40}}), run_id=run_id)
+
+    streamed = AIMessage(content="", usage_metadata={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15})
+    handler.on_chat_model_start({}, [], run_id=run_id)
+    handler.on_llm_end(LLMResult(generations=[[ChatGeneration(message=streamed)]]), run_id=run_id)
+
+    handler.on_chat_model_start({}, [], run_id=run_id)
+    handler.on_llm_error(RuntimeError("timeout"), run_id=run_id)
+
+    assert metrics.LLM_TOKENS.get(model="test-model", kind="completion") == tokens_before + 45
+    assert metrics.LLM_CALL_SECONDS.get(model="test-model")[0] >= 2
+    assert metrics.LLM_CALL_ERRORS.get(model="test-model") >= 1
+
+
+def test_external_call_errors_are_counted():
+    errors_before = metrics.EXTERNAL_CALL_ERRORS.get(service="stripe", operation="Test.fail")
+
+    with pytest.raises(RuntimeError):
+        with track_external_call("stripe", "Test.fail"):
+            raise RuntimeError("card declined")
+
+    assert metrics.EXTERNAL_CALL_ERRORS.get(service="stripe", operation="Test.fail") == errors_before + 1
+    assert metrics.EXTERNAL_CALL_SECONDS.get(service="stripe", operation="Test.fail")[0] >= 1
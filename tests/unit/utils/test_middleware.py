@@ -0,0 +1,77 @@
+import logging
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+from app.middleware import RequestContextMiddleware
+
+
+def build_app():
+    app = FastAPI()
+
+    @app.get("/token")
+    async def token(request: Request):
+        return {"auth_token": request.state.auth_token}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"chunk {i}\n"
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    app.add_middleware(RequestContextMiddleware)
+    return app
+
+
+@pytest.fixture
+def client():
+    transport = httpx.ASGITransport(app=build_app(), raise_app_exceptions=False)
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_bearer_token_is_copied_to_request_state(client):
+    async with client:
+        with_token = await client.get("/token", headers={"Authorization": "Bearer abc123"})
+        without_token = await client.get("/token")
+
+    assert with_token.json() == {"auth_token": "abc123"}
+    assert without_token.json() == {"auth_token": None}
+
+
+@pytest.mark.asyncio
+async def test_logs_one_record_per_request_without_credentials(client, caplog):
+    caplog.set_level(logging.INFO, logger="pathlight.requests")
+
+    async with client:
+        response = await client.get(
+            "/stream",
+            headers={"Authorization": "Bearer abc123", "Cookie": "stytch_session_token=secret", "X-Request-ID": "req-1"}
+        )
+
+    assert response.text == "chunk 0\nchunk 1\nchunk 2\n"
+    [record] = [r for r in caplog.records if r.name == "pathlight.requests"]
+    assert record.getMessage() == "GET /stream 200"
+    assert record.status == 200
+    assert record.request_id == "req-1"
+    assert record.cookie_names == ["stytch_session_token"]
+    assert record.bearer_auth is True
+    assert "abc123" not in str(vars(record)) and "secret" not in str(vars(record))
+
+
+@pytest.mark.asyncio
+async def test_unhandled_errors_are_logged(client, caplog):
+    caplog.set_level(logging.INFO, logger="pathlight.requests")
+
+    async with client:
+        response = await client.get("/boom")
+
+    assert response.status_code == 500
+    assert any(r.levelno == logging.ERROR and r.getMessage() == "GET /boom failed" for r in caplog.records)
@@ -0,0 +1,51 @@
+import json
+import zlib
+
+import pytest
+
+from app import plan_codec
+from app.plan_codec import PlanCodecError, decode_plan, encode_plan, payload_codec
+
+PLAN = json.dumps({
+    "mantra": "Test mantra",
+    "purpose": "Test purpose " * 200,
+    "obstacles": [{"challenge": "Time", "solution": "Plan ahead", "type": "personal"}] * 20
+})
+
+
+@pytest.mark.parametrize("codec", ["raw", "zlib", "zstd"])
+def test_round_trip(codec):
+    payload = encode_plan(PLAN, codec)
+
+    assert payload[:2] == b"PL"
+    assert decode_plan(payload) == PLAN
+    if codec != "raw":
+        assert len(payload) < len(PLAN) / 4
+
+
+def test_small_plans_are_stored_raw():
+    plan = json.dumps({"mantra": "Short", "purpose": "Short"})
+
+    payload = encode_plan(plan, "zlib")
+
+    assert payload_codec(payload) == "raw"
+    assert decode_plan(payload) == plan
+
+
+def test_zstd_falls_back_to_zlib_without_zstandard(monkeypatch):
+    monkeypatch.setattr(plan_codec, "zstandard", None)
+
+    payload = encode_plan(PLAN, "zstd")
+
+    assert payload_codec(payload) == "zlib"
+    assert zlib.decompress(payload[4:]).decode("utf-8") == PLAN
+
+
+def test_decode_legacy_text_and_rejects_unknown_versions():
+    assert decode_plan(PLAN.encode("utf-8")) == PLAN
+    assert decode_plan(None) == ""
+
+    with pytest.raises(PlanCodecError):
+        decode_plan(b"PL\x09\x00{}")
+    with pytest.raises(PlanCodecError):
+        encode_plan(PLAN, "brotli")
@@ -0,0 +1,77 @@
+import json
+import logging
+from datetime import datetime
+
+import pytest
+from sqlmodel import Session, select
+
+from app import query_profiler
+from app.metrics import instrument_engine
+from app.models import Result, User
+from app.query_profiler import profile_queries, statement_shape
+
+
+@pytest.fixture
+def results_user(file_db_engine):
+    """Basic-tier user with a generated basic plan."""
+    with Session(file_db_engine) as session:
+        user = User(name="Test User", email="test@example.com", dob=datetime(1990, 1, 1), payment_tier="basic")
+        session.add(user)
+        session.flush()
+        session.add(Result(user_id=user.id, basic_plan=json.dumps({"purpose": "Purpose", "mantra": "Mantra"}), full_plan=""))
+        session.commit()
+        return user.id
+
+
+def test_statement_shape_collapses_placeholders():
+    assert statement_shape("SELECT * FROM users WHERE id IN (?, ?, ?)") == "SELECT * FROM users WHERE id IN (?...)"
+    assert statement_shape("SELECT * FROM users WHERE id = %(id_1)s") == "SELECT * FROM users WHERE id = ?"
+    assert statement_shape("SELECT * FROM users WHERE id = $1") == "SELECT * FROM users WHERE id = ?"
+
+
+def test_flags_repeated_and_n_plus_one_queries(file_db_engine, results_user):
+    instrument_engine(file_db_engine)
+
+    with profile_queries() as profile, Session(file_db_engine) as session:
+        users = session.exec(select(User)).all()
+        for _ in range(3):
+            for user in users:
+                session.exec(select(Result).where(Result.user_id == user.id)).first()
+
+    assert profile.count == 4
+    [repeated] = profile.repeated()
+    assert repeated["count"] == 3
+    [n_plus_one] = profile.n_plus_one()
+    assert n_plus_one["count"] == 3
+    assert n_plus_one["call_site"].startswith("tests/unit/utils/test_query_profiler.py:")
+    assert profile.summary()["repeated"] == 1
+
+
+def test_queries_outside_a_profile_are_not_recorded(file_db_engine, results_user):
+    instrument_engine(file_db_engine)
+
+    with Session(file_db_engine) as session:
+        session.exec(select(User)).all()
+        with profile_queries() as profile:
+            session.exec(select(Result)).all()
+
+    assert profile.count == 1
+
+
+@pytest.mark.asyncio
+async def test_profile_header_for_opted_in_requests(async_client, async_db_engine, results_user, monkeypatch, caplog):
+    instrument_engine(async_db_engine)
+    monkeypatch.setattr(query_profiler, "QUERY_PROFILING", "header")
+    caplog.set_level(logging.INFO, logger="pathlight.queries")
+    url = f"/api/results/{results_user}/summary"
+
+    async with async_client as client:
+        plain = await client.get(url)
+        profiled = await client.get(url, headers={"X-Query-Profile": "1"})
+
+    assert "x-query-profile" not in plain.headers
+    # The first response filled the results cache, so only the version check runs
+    assert profiled.headers["x-query-profile"].startswith("queries=1; db_ms=")
+    [record] = [r for r in caplog.records if r.name == "pathlight.queries"]
+    assert record.queries == 1
+    assert "app/routers/results.py" in record.getMessage()